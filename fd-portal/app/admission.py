@@ -0,0 +1,165 @@
+import contextvars
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from keystone import InvalidCredentials, KeystoneUnavailable
+
+# Admission priorities, lower goes first
+HIGH = 0    # clean LoginDefense history
+NORMAL = 1  # some failures, no captcha yet
+LOW = 2     # captcha phase or attacked username
+
+_PRIORITY = contextvars.ContextVar("fdp_admission_priority", default=NORMAL)
+
+
+@contextmanager
+def priority(level: int):
+    """Priority of the Keystone calls made inside the block (this request)."""
+    token = _PRIORITY.set(level)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+class _Waiter:
+    __slots__ = ("prio", "seq", "event", "granted", "shed")
+
+    def __init__(self, prio: int, seq: int):
+        self.prio = prio
+        self.seq = seq
+        self.event = threading.Event()
+        self.granted = False  # a slot was handed over
+        self.shed = False     # pushed out of a full queue by a higher priority
+
+
+class AdmissionControl:
+    """
+    Bounds the Keystone calls this worker has in flight (same
+    validate_password interface), so an attack cannot tie up every
+    greenlet/thread on a saturated Keystone while real users time out.
+
+    - At most `limit` calls run at once. With adaptive=True the limit
+      follows AIMD on observed latency: +1/limit per call that finished
+      within latency_target_sec while the limit was in use, x backoff per
+      call that was slower or failed upstream (timeout, 5xx). 401s are
+      healthy answers. Fast-fails from the breaker do not count.
+    - Calls over the limit wait in a queue of queue_size for at most
+      queue_timeout_sec, best priority first (see priority()), FIFO within
+      a priority. When the queue is full, a call either pushes out the
+      newest waiter of a lower priority or is rejected at once.
+    - Rejections raise KeystoneUnavailable with a Retry-After estimate; the
+      route turns that into a 503, not a failed attempt.
+    """
+
+    def __init__(self, client, limit: int = 8, min_limit: int = 1, max_limit: int = 10,
+                 adaptive: bool = True, latency_target_sec: float = 1.0, backoff: float = 0.9,
+                 queue_size: int = 16, queue_timeout_sec: float = 2.0):
+        self.client = client
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.adaptive = adaptive
+        self.latency_target_sec = latency_target_sec
+        self.backoff = backoff
+        self.queue_size = queue_size
+        self.queue_timeout_sec = queue_timeout_sec
+
+        self._limit = float(min(max(limit, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._queue = []  # _Waiter, at most queue_size
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._latency = 0.0  # EWMA of call latency, seconds
+
+        self.admitted = 0  # calls that ran
+        self.waited = 0    # ... after queueing
+        self.rejected = 0  # queue full
+        self.shed = 0      # pushed out of the queue
+        self.timeouts = 0  # waited queue_timeout_sec without a slot
+
+    def _unavailable(self, why: str) -> KeystoneUnavailable:
+        limit = max(1, int(self._limit))
+        wait = (len(self._queue) + 1) * (self._latency or self.latency_target_sec) / limit
+        return KeystoneUnavailable(f"Keystone admission: {why}", retry_after=max(1, math.ceil(wait)))
+
+    def _acquire(self, prio: int) -> None:
+        with self._lock:
+            if self._in_flight < int(self._limit) and not self._queue:
+                self._in_flight += 1
+                self.admitted += 1
+                return
+            if len(self._queue) >= self.queue_size:
+                worst = max(self._queue, key=lambda w: (w.prio, w.seq)) if self._queue else None
+                if worst is None or worst.prio <= prio:
+                    self.rejected += 1
+                    raise self._unavailable("queue full")
+                self._queue.remove(worst)
+                worst.shed = True
+                worst.event.set()
+            waiter = _Waiter(prio, next(self._seq))
+            self._queue.append(waiter)
+
+        waiter.event.wait(self.queue_timeout_sec)
+        with self._lock:
+            if waiter.granted:
+                self.admitted += 1
+                self.waited += 1
+                return
+            if waiter.shed:
+                self.shed += 1
+                raise self._unavailable("shed for higher priority")
+            self._queue.remove(waiter)
+            self.timeouts += 1
+            raise self._unavailable("queue timeout")
+
+    def _release(self, latency: float, overloaded: bool, called: bool) -> None:
+        with self._lock:
+            if called:
+                if self.adaptive:
+                    if overloaded or latency > self.latency_target_sec:
+                        self._limit = max(self.min_limit, self._limit * self.backoff)
+                    elif self._in_flight * 2 >= self._limit:
+                        # only grow a limit that is actually in use
+                        self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+                self._latency = latency if not self._latency else 0.8 * self._latency + 0.2 * latency
+            self._in_flight -= 1
+            while self._queue and self._in_flight < int(self._limit):
+                best = min(self._queue, key=lambda w: (w.prio, w.seq))
+                self._queue.remove(best)
+                best.granted = True
+                self._in_flight += 1
+                best.event.set()
+
+    def validate_password(self, username: str, password: str):
+        self._acquire(_PRIORITY.get())
+        started = time.monotonic()
+        overloaded, called = False, True
+        try:
+            return self.client.validate_password(username, password)
+        except InvalidCredentials:
+            raise
+        except KeystoneUnavailable:
+            called = False  # the breaker failed fast: says nothing about latency
+            raise
+        except Exception:
+            overloaded = True
+            raise
+        finally:
+            self._release(time.monotonic() - started, overloaded, called)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": self._limit,
+                "in_flight": self._in_flight,
+                "queued": len(self._queue),
+                "admitted": self.admitted,
+                "waited": self.waited,
+                "rejected": self.rejected,
+                "shed": self.shed,
+                "timeouts": self.timeouts,
+                "latency_seconds": self._latency,
+            }
@@ -1,12 +1,78 @@
+import dataclasses
 import os
 from flask import Flask
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from admission import AdmissionControl
+from assets import AssetPipeline, vendored_name
+from background import PeriodicTask
+from blocklist import Blocklist, BlocklistFiles
+from breaker import CircuitBreaker
+from captcha import GENERATORS, CaptchaTokens
 from config import Settings
+from edge import EdgeFilter, LockoutIndex, PrefixTable
+from health import HealthMiddleware, Readiness, breaker_check
 from keystone import KeystoneClient
+from keystone_cache import NegativeCache
+import metrics
 from security import configure_session, add_security_headers
 from routes import build_blueprint
-from ratelimit import LoginDefense
+from ratelimit import LoginDefense, MemoryBackend, RedisBackend, SharedMemoryBackend
+from render_cache import PageCache
+from sessions import MemorySessionStore, RedisSessionStore, ServerSideSessionInterface
+from sketch import UsernameSketch, username_label
+from snapshot import DefenseSnapshots
+from tokens import TokenVault
+
+
+def _defense_backend(settings: Settings, store: str = "defense", max_keys: int = None):
+    """
+    A DEFENSE_BACKEND store. `store` names a separate table (Redis key
+    prefix, shared memory file) for data with its own window, such as
+    burned captcha nonces.
+    """
+    max_keys = settings.defense_max_keys if max_keys is None else max_keys
+    if settings.defense_backend == "redis":
+        return RedisBackend.from_url(
+            settings.defense_redis_url,
+            prefix=f"fdp:{store}",
+            timeout_sec=settings.defense_redis_timeout_sec,
+            # fail open to per-worker counts while Redis is unreachable
+            fallback=MemoryBackend(max_keys=max_keys, algorithm=settings.defense_window_algo),
+        )
+    if settings.defense_backend == "memory":
+        return MemoryBackend(
+            max_keys=max_keys,
+            algorithm=settings.defense_window_algo,
+            stripes=settings.defense_lock_stripes,
+        )
+    if settings.defense_backend == "shared":
+        path = settings.defense_shm_path
+        return SharedMemoryBackend(
+            path if store == "defense" else f"{path}-{store}",
+            max_keys=max_keys,
+            stripes=settings.defense_lock_stripes,
+            sweep_gap_sec=settings.defense_sweep_interval_sec / 2,
+        )
+    raise ValueError(f"Unknown DEFENSE_BACKEND: {settings.defense_backend!r}")
+
+
+def _session_store(settings: Settings):
+    if settings.session_backend == "redis":
+        return RedisSessionStore.from_url(settings.session_redis_url, ttl_sec=settings.session_ttl_sec)
+    if settings.session_backend == "memory":
+        return MemorySessionStore(ttl_sec=settings.session_ttl_sec, max_entries=settings.session_max_entries)
+    raise ValueError(f"Unknown SESSION_BACKEND: {settings.session_backend!r}")
+
+
+def _use_vendored_images(settings: Settings, assets: AssetPipeline) -> Settings:
+    """Point brand image settings at local copies made by `python assets.py vendor`."""
+    local = {}
+    for field in ("logo_url", "bg_img_url", "accent_img_url", "hero_img_url"):
+        name = vendored_name(getattr(settings, field))
+        if assets.has(name):
+            local[field] = assets.url(name)
+    return dataclasses.replace(settings, **local)
 
 
 def create_app() -> Flask:
@@ -20,16 +86,162 @@ def create_app() -> Flask:
 
     settings = Settings()
 
+    # Fingerprinted, precompressed static assets served from memory
+    assets = AssetPipeline(app.static_folder)
+    assets.build()
+    assets.install(app)
+    if settings.vendor_brand_images:
+        settings = _use_vendored_images(settings, assets)
+
     configure_session(app, cookie_secure=settings.session_cookie_secure)
+    session_store = None
+    if settings.session_backend != "cookie":
+        # Cookie carries an opaque id only; data is loaded when a route reads it
+        session_store = _session_store(settings)
+        app.session_interface = ServerSideSessionInterface(session_store, app.secret_key.encode("utf-8"))
     add_security_headers(app)
 
-    keystone_client = KeystoneClient(settings.keystone_url, settings.user_domain)
+    keystone_client = base_client = KeystoneClient(
+        settings.keystone_url,
+        settings.user_domain,
+        pool_size=settings.keystone_pool_size,
+        connect_timeout=settings.keystone_connect_timeout,
+        read_timeout=settings.keystone_read_timeout,
+        connect_retries=settings.keystone_connect_retries,
+        retry_backoff=settings.keystone_retry_backoff,
+    )
+    breaker = None
+    if settings.keystone_breaker:
+        keystone_client = breaker = CircuitBreaker(
+            keystone_client,
+            error_rate=settings.keystone_breaker_error_rate,
+            slow_call_sec=settings.keystone_breaker_slow_call_sec,
+            min_calls=settings.keystone_breaker_min_calls,
+            window=settings.keystone_breaker_window,
+            open_sec=settings.keystone_breaker_open_sec,
+            half_open_probes=settings.keystone_breaker_half_open_probes,
+        )
+    admission = None
+    if settings.keystone_admission:
+        keystone_client = admission = AdmissionControl(
+            keystone_client,
+            limit=settings.keystone_concurrency_limit,
+            max_limit=settings.keystone_concurrency_max,
+            adaptive=settings.keystone_concurrency_adaptive,
+            latency_target_sec=settings.keystone_latency_target_sec,
+            queue_size=settings.keystone_queue_size,
+            queue_timeout_sec=settings.keystone_queue_timeout_sec,
+        )
+    negative_cache = None
+    if settings.keystone_negative_cache:
+        keystone_client = negative_cache = NegativeCache(
+            keystone_client,
+            ttl_sec=settings.keystone_negative_cache_ttl_sec,
+            max_entries=settings.keystone_negative_cache_max,
+        )
+
+    tokens = None
+    if settings.keystone_token_reuse:
+        if session_store is None:
+            raise ValueError("KEYSTONE_TOKEN_REUSE needs SESSION_BACKEND=memory or redis")
+        tokens = TokenVault(
+            base_client,
+            app.secret_key.encode("utf-8"),
+            revalidate_sec=settings.keystone_token_revalidate_sec,
+            expiry_skew_sec=settings.keystone_token_expiry_skew_sec,
+        )
 
     defense = LoginDefense(
         policy=settings.login_policy,
         window_sec=settings.defense_window_sec,
         soft_lockout_sec=settings.defense_soft_lockout_sec,
+        backend=_defense_backend(settings),
+    )
+
+    # Warm restore before the pod reports ready: lockouts survive rollouts
+    snapshots = None
+    if settings.defense_snapshot_path:
+        shared = settings.defense_backend == "shared"
+        snapshots = DefenseSnapshots(
+            defense,
+            settings.defense_snapshot_path,
+            # one writer per interval is enough for the pod-wide table
+            min_interval_sec=settings.defense_snapshot_interval_sec / 2 if shared else 0,
+        )
+        snapshots.restore()
+
+    if settings.captcha_generator not in GENERATORS:
+        raise ValueError(f"Unknown CAPTCHA_GENERATOR: {settings.captcha_generator!r}")
+    captchas = CaptchaTokens(
+        app.secret_key.encode("utf-8"),
+        ttl_sec=settings.captcha_ttl_sec,
+        generator=GENERATORS[settings.captcha_generator](),
+        # burned nonces get a table of their own, of the DEFENSE_BACKEND kind
+        # (shared across workers and replicas with "shared" or "redis")
+        replay=_defense_backend(settings, "captcha", settings.captcha_replay_cache),
     )
+
+    usernames = None
+    if settings.username_sketch:
+        usernames = UsernameSketch(
+            window_sec=settings.username_window_sec,
+            threshold=settings.username_captcha_threshold,
+            width=settings.username_sketch_width,
+            depth=settings.username_sketch_depth,
+            top_k=settings.username_top_k,
+        )
+
+    edge = lockouts = None
+    if settings.edge_filter:
+        lockouts = LockoutIndex(max_entries=settings.edge_max_keys, by_ip=settings.edge_lockout_by_ip)
+        edge = EdgeFilter(
+            None,  # wraps the finished WSGI stack below
+            allow=PrefixTable.parse(settings.edge_allow_cidrs),
+            deny=PrefixTable.parse(settings.edge_deny_cidrs),
+            trust_xff=settings.trust_x_forwarded_for,
+            window_sec=settings.edge_window_sec,
+            ip_limit=settings.edge_ip_limit,
+            prefix_limit=settings.edge_prefix_limit,
+            ipv4_prefix=settings.edge_ipv4_prefix,
+            ipv6_prefix=settings.edge_ipv6_prefix,
+            max_keys=settings.edge_max_keys,
+            lockouts=lockouts,
+            cookie_name=app.config["SESSION_COOKIE_NAME"],
+        )
+
+    blocklist = blocklist_files = None
+    if settings.blocklist_dir:
+        os.makedirs(settings.blocklist_dir, exist_ok=True)
+        blocklist = Blocklist(
+            ipv4_prefix=settings.blocklist_ipv4_prefix,
+            ipv6_prefix=settings.blocklist_ipv6_prefix,
+            allow=PrefixTable.parse(settings.edge_allow_cidrs),
+            max_entries=settings.edge_max_keys,
+        )
+        blocklist_files = BlocklistFiles(
+            blocklist, settings.blocklist_dir, lockout_sec=settings.defense_soft_lockout_sec
+        )
+
+    readiness = Readiness()
+    if breaker is not None:
+        readiness.checks.append(breaker_check(breaker))
+
+    # Per-worker background jobs; gunicorn hooks can restart them after fork
+    tasks = [
+        PeriodicTask("defense-sweeper", settings.defense_sweep_interval_sec, defense.sweep),
+        PeriodicTask("captcha-sweeper", settings.defense_sweep_interval_sec, captchas.sweep),
+        PeriodicTask("readiness", settings.readiness_interval_sec, readiness.refresh),
+    ]
+    if edge is not None:
+        tasks.append(PeriodicTask("edge-sweeper", settings.defense_sweep_interval_sec, edge.sweep))
+    if blocklist_files is not None:
+        tasks.append(PeriodicTask("blocklist-export", settings.blocklist_export_interval_sec, blocklist_files.export))
+    if snapshots is not None:
+        tasks.append(PeriodicTask("defense-snapshot", settings.defense_snapshot_interval_sec, snapshots.save))
+    for task in tasks:
+        task.start()
+    app.extensions["fd_tasks"] = tasks
+
     # Provide brand variables to all templates
     @app.context_processor
     def _brand():
@@ -42,7 +254,68 @@ def create_app() -> Flask:
             "hero_img_url": settings.hero_img_url,
         }
 
-    app.register_blueprint(build_blueprint(settings, keystone_client, defense))
+    if settings.metrics_enabled:
+        metrics.install(app)
+        reg = metrics.REGISTRY
+        reg.register_stats("fdp_keystone_pool", "Keystone connection pool reuse (this worker).", base_client.pool_stats)
+        reg.register_stats("fdp_defense", "LoginDefense tracked keys (this worker).", defense.stats)
+        reg.register_stats("fdp_captcha_replay", "Burned captcha nonces (this worker).", captchas.replay.stats)
+        if snapshots is not None:
+            reg.register_stats("fdp_defense_snapshot", "Defense state snapshots (this worker).", snapshots.stats)
+        if breaker is not None:
+            reg.register_stats("fdp_keystone_breaker", "Keystone circuit breaker (this worker).", breaker.stats)
+        reg.register_stats("fdp_readiness", "Cached /readyz verdict (this worker).", readiness.stats)
+        if admission is not None:
+            reg.register_stats("fdp_keystone_admission", "Keystone admission control (this worker).", admission.stats)
+        if negative_cache is not None:
+            reg.register_stats("fdp_keystone_negative_cache", "Failed-login cache (this worker).", negative_cache.stats)
+        if edge is not None:
+            reg.register_stats("fdp_edge", "Edge filter tracked IPs/prefixes (this worker).", edge.stats)
+        if blocklist is not None:
+            reg.register_stats("fdp_blocklist", "Exported blocklist of locked-out IPs (this worker).", blocklist.stats)
+        if usernames is not None:
+            reg.register_stats("fdp_username_sketch", "Per-username failure sketch (this worker).", usernames.stats)
+            # usernames are exported as keyed hashes, never in clear
+            label_secret = app.secret_key.encode("utf-8")
+            reg.register_labelled(
+                "fdp_username_failures",
+                "Estimated failed logins in the window for the top attacked usernames, by keyed hash (this worker).",
+                "username_hash",
+                lambda: {username_label(label_secret, name): n for name, n in usernames.top()},
+            )
+        if tokens is not None:
+            reg.register_stats("fdp_keystone_tokens", "Reused Keystone tokens (this worker).", tokens.stats)
+        if session_store is not None:
+            reg.register_stats("fdp_sessions", "Server-side session store (this worker).", session_store.stats)
+
+    pages = PageCache(app, enabled=settings.render_cache)
+    pages.register("login.html", ("alert_html", "captcha_html"))
+    pages.register(
+        "home.html",
+        ("username",),
+        horizon_url=settings.horizon_url,
+        skyline_url=settings.skyline_url,
+    )
+
+    app.register_blueprint(build_blueprint(
+        settings, keystone_client, defense, pages, captchas, lockouts, usernames, tokens, blocklist
+    ))
+
+    # Warm-up: render page shells before the worker takes traffic
+    pages.warm()
+
+    # First-tier IP/prefix filter rejects floods before ProxyFix and sessions
+    if edge is not None:
+        edge.app = app.wsgi_app
+        app.wsgi_app = edge
+
+    # Scrapes arrive on the internal metrics listener, ahead of the edge filter
+    if settings.metrics_enabled:
+        app.wsgi_app = metrics.MetricsEndpoint(app.wsgi_app, port=settings.metrics_port)
+
+    # Probes are answered ahead of ProxyFix, sessions and blueprints
+    app.wsgi_app = HealthMiddleware(app.wsgi_app, readiness)
+    readiness.refresh()
     return app
 
 
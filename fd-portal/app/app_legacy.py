@@ -1,6 +1,7 @@
+import hashlib
 import os
 import requests
-from flask import Flask, request, session, redirect, url_for, render_template_string
+from flask import Flask, Response, request, session, redirect, url_for
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET", "CHANGE_ME_LONG_RANDOM")
@@ -467,19 +468,38 @@ HOME_HTML = """
 """
 
 
-def _render(template: str, **ctx) -> str:
-    # Inject CSS and brand assets into the templates
-    css = (
-        BASE_CSS.replace("__BG_IMG_URL__", BG_IMG_URL)
-        .replace("__ACCENT_IMG_URL__", ACCENT_IMG_URL)
-        .replace("__HERO_IMG_URL__", HERO_IMG_URL)
-    )
-    t = (
-        template.replace("__BASE_CSS__", css)
+# Branding is substituted and templates are compiled once at import; the
+# stylesheet is served as a fingerprinted, long-cached asset instead of being
+# inlined into every page.
+BRAND_CSS = (
+    BASE_CSS.replace("__BG_IMG_URL__", BG_IMG_URL)
+    .replace("__ACCENT_IMG_URL__", ACCENT_IMG_URL)
+    .replace("__HERO_IMG_URL__", HERO_IMG_URL)
+    .strip()
+    .removeprefix("<style>")
+    .removesuffix("</style>")
+    .encode("utf-8")
+)
+CSS_HASH = hashlib.sha256(BRAND_CSS).hexdigest()[:16]
+CSS_PATH = f"/assets/base.{CSS_HASH}.css"
+
+
+def _compile(template: str):
+    source = (
+        template.replace("__BASE_CSS__", f'<link rel="stylesheet" href="{CSS_PATH}">')
         .replace("__LOGO_URL__", LOGO_URL)
         .replace("__BRAND_NAME__", BRAND_NAME)
     )
-    return render_template_string(t, **ctx)
+    return app.jinja_env.from_string(source)
+
+
+LOGIN_TEMPLATE = _compile(LOGIN_HTML)
+HOME_TEMPLATE = _compile(HOME_HTML)
+
+
+def _render(template, **ctx) -> str:
+    app.update_template_context(ctx)
+    return template.render(ctx)
 
 
 def keystone_password_auth(username: str, password: str) -> None:
@@ -515,24 +535,32 @@ def keystone_password_auth(username: str, password: str) -> None:
 def home():
     if not session.get("logged_in"):
         return redirect(url_for("login"))
-    return _render(HOME_HTML, username=session.get("username"), horizon_url=HORIZON_URL)
+    return _render(HOME_TEMPLATE, username=session.get("username"), horizon_url=HORIZON_URL)
+
+
+@app.get(CSS_PATH)
+def base_css():
+    resp = Response(BRAND_CSS, mimetype="text/css")
+    resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    resp.set_etag(CSS_HASH)
+    return resp.make_conditional(request)
 
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "GET":
-        return _render(LOGIN_HTML, error=None)
+        return _render(LOGIN_TEMPLATE, error=None)
 
     username = request.form.get("username", "").strip()
     password = request.form.get("password", "")
 
     if not username or not password:
-        return _render(LOGIN_HTML, error="Missing username/password"), 400
+        return _render(LOGIN_TEMPLATE, error="Missing username/password"), 400
 
     try:
         keystone_password_auth(username, password)
     except Exception:
-        return _render(LOGIN_HTML, error="Invalid credentials"), 401
+        return _render(LOGIN_TEMPLATE, error="Invalid credentials"), 401
 
     session.clear()
     session["logged_in"] = True
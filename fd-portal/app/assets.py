@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+from flask import Flask, Response, abort, request, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are built without it
+    brotli = None
+
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+VENDOR_DIR = "img/vendor"
+
+
+@dataclass(frozen=True)
+class Asset:
+    url_path: str   # e.g. css/main.3f2a9c1b0d4e5f67.css
+    mimetype: str
+    etag: str       # content hash
+    identity: bytes
+    gzip: bytes = None
+    br: bytes = None
+
+
+class AssetPipeline:
+    """
+    Startup asset pipeline for files under static/:
+
+    - every file gets a content-hashed name (css/main.<hash>.css);
+    - text assets are precompressed once (gzip, and brotli when installed);
+    - /assets/<hashed name> serves them from memory with
+      Cache-Control: immutable, a strong ETag per encoding and 304 support.
+
+    Templates call asset_url("css/main.css"); unknown files fall back to
+    the plain Flask static URL.
+    """
+
+    def __init__(self, static_dir: str, url_prefix: str = "/assets"):
+        self.static_dir = static_dir
+        self.url_prefix = url_prefix.rstrip("/")
+        self._by_name = {}  # original relative path -> Asset
+        self._by_url = {}   # hashed relative path -> Asset
+
+    def build(self) -> None:
+        for root, _dirs, files in os.walk(self.static_dir):
+            for fn in files:
+                full = os.path.join(root, fn)
+                rel = os.path.relpath(full, self.static_dir).replace(os.sep, "/")
+                with open(full, "rb") as f:
+                    data = f.read()
+                asset = _make_asset(rel, data)
+                self._by_name[rel] = asset
+                self._by_url[asset.url_path] = asset
+
+    def has(self, filename: str) -> bool:
+        return filename in self._by_name
+
+    def url(self, filename: str) -> str:
+        asset = self._by_name.get(filename)
+        if asset is None:
+            return url_for("static", filename=filename)
+        return f"{self.url_prefix}/{asset.url_path}"
+
+    def serve(self, path: str):
+        asset = self._by_url.get(path)
+        if asset is None:
+            abort(404)
+
+        # highest q-value wins, br on a tie; q=0 (e.g. "br;q=0") refuses a coding
+        body, encoding, best = asset.identity, None, 0
+        for name, variant in (("br", asset.br), ("gzip", asset.gzip)):
+            q = request.accept_encodings.quality(name) if variant is not None else 0
+            if q > best:
+                body, encoding, best = variant, name, q
+
+        resp = Response(body, mimetype=asset.mimetype)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        if asset.gzip is not None or asset.br is not None:
+            resp.headers["Vary"] = "Accept-Encoding"
+        resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        resp.set_etag(f"{asset.etag}-{encoding}" if encoding else asset.etag)
+        return resp.make_conditional(request)
+
+    def install(self, app: Flask) -> None:
+        app.add_url_rule(f"{self.url_prefix}/<path:path>", "assets", self.serve)
+        app.jinja_env.globals["asset_url"] = self.url
+
+
+def _make_asset(rel: str, data: bytes) -> Asset:
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    stem, ext = os.path.splitext(rel)
+    mimetype = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+
+    gz = br = None
+    if mimetype.startswith(_COMPRESSIBLE):
+        gz = gzip.compress(data, compresslevel=9, mtime=0)
+        if brotli is not None:
+            br = brotli.compress(data, quality=11)
+        # keep a variant only when it actually saves bytes
+        gz = gz if len(gz) < len(data) else None
+        br = br if br is not None and len(br) < len(data) else None
+
+    return Asset(
+        url_path=f"{stem}.{digest}{ext}",
+        mimetype=mimetype,
+        etag=digest,
+        identity=data,
+        gzip=gz,
+        br=br,
+    )
+
+
+def vendored_name(url: str) -> str:
+    """Deterministic static/ path for a remote brand image."""
+    ext = os.path.splitext(urlparse(url).path)[1].lower() or ".img"
+    return f"{VENDOR_DIR}/{hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]}{ext}"
+
+
+def vendor_images(urls, static_dir: str, timeout: float = 20.0) -> None:
+    """Download remote brand images into static/img/vendor (build time)."""
+    import requests
+
+    os.makedirs(os.path.join(static_dir, VENDOR_DIR), exist_ok=True)
+    for url in urls:
+        if not url.startswith(("http://", "https://")):
+            continue
+        dest = os.path.join(static_dir, vendored_name(url))
+        r = requests.get(url, timeout=timeout)
+        r.raise_for_status()
+        with open(dest, "wb") as f:
+            f.write(r.content)
+        print(f"vendored {url} -> {dest}")
+
+
+if __name__ == "__main__":
+    # Build-time helper: python assets.py vendor
+    if sys.argv[1:] != ["vendor"]:
+        sys.exit("usage: python assets.py vendor")
+    from config import Settings
+
+    s = Settings()
+    here = os.path.dirname(os.path.abspath(__file__))
+    vendor_images(
+        [s.logo_url, s.bg_img_url, s.accent_img_url, s.hero_img_url],
+        os.path.join(here, "static"),
+    )
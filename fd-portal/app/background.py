@@ -0,0 +1,42 @@
+import logging
+import os
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """
+    Runs fn() every interval seconds in a daemon thread.
+    Threads do not survive fork, so start() is idempotent per process and
+    can be called again in each gunicorn worker.
+    """
+
+    def __init__(self, name: str, interval: float, fn):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self._pid = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Ask the thread to exit; with a timeout, wait that long for it."""
+        self._stop.set()
+        if timeout is not None and self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.fn()
+            except Exception:
+                log.exception("background task %s failed", self.name)
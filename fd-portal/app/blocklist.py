@@ -0,0 +1,264 @@
+import ipaddress
+import json
+import math
+import os
+import re
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+
+from edge import PrefixTable, parse_ip
+
+# BlocklistFiles names: <host>.<pid>.<kind>, plus the .tmp of an interrupted rewrite
+_FILE_RE = re.compile(r"^(?P<host>.+)\.(?P<pid>\d+)\.(?:nft|ipset|feed)(?:\.tmp)?$")
+
+
+def _cidr(net) -> str:
+    bits, shifted, plen = net
+    addr = ipaddress.ip_address(shifted << (bits - plen))
+    return str(addr) if plen == bits else f"{addr}/{plen}"
+
+
+class Blocklist:
+    """
+    Addresses of clients LoginDefense has locked out, for the kernel to drop
+    their retries before TLS and Python see them.
+
+    The route calls block() whenever it answers with a lockout 429; the
+    entry lives as long as the lockout (at most DEFENSE_SOFT_LOCKOUT_SEC)
+    and is widened to a /ipv4_prefix or /ipv6_prefix network. Allow-listed
+    networks are never blocked. Every new entry, or an entry whose lockout
+    was extended, gets a sequence number in a bounded change feed.
+
+    Renderers produce an nftables script (`nft -f`) or an `ipset restore
+    -exist` file. Elements carry their remaining lifetime as a timeout, so
+    the kernel expires them by itself and nothing ever has to be deleted.
+    """
+
+    def __init__(self, ipv4_prefix: int = 32, ipv6_prefix: int = 64, allow: PrefixTable = None,
+                 max_entries: int = 100_000, feed_size: int = 10_000):
+        self.prefix = {32: ipv4_prefix, 128: ipv6_prefix}
+        self.allow = allow
+        self.max_entries = max_entries
+        self._until = OrderedDict()  # (bits, network >> host bits, prefix len) -> unix ts, last blocked last
+        self._feed = deque(maxlen=feed_size)  # (seq, net, until)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.blocked = 0  # block() calls that added or extended an entry
+
+    def block(self, ip: str, seconds: float, now: float = None) -> bool:
+        """True when the entry is new or now lasts longer."""
+        parsed = parse_ip(ip) if ip else None
+        if parsed is None or seconds <= 0:
+            return False
+        if self.allow and parsed in self.allow:
+            return False
+        bits, n = parsed
+        plen = self.prefix[bits]
+        net = (bits, n >> (bits - plen), plen)
+        until = (time.time() if now is None else now) + seconds
+        with self._lock:
+            prev = self._until.get(net)
+            if prev is not None and until < prev + 1:
+                return False  # already blocked at least this long
+            self._until[net] = until
+            self._until.move_to_end(net)
+            while len(self._until) > self.max_entries:
+                self._until.popitem(last=False)
+            self._seq += 1
+            self._feed.append((self._seq, net, until))
+            self.blocked += 1
+        return True
+
+    def sweep(self, now: float) -> int:
+        with self._lock:
+            expired = [net for net, until in self._until.items() if until <= now]
+            for net in expired:
+                del self._until[net]
+        return len(expired)
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def entries(self, now: float):
+        """[(cidr, seconds left)] for live entries, IPv4 first."""
+        with self._lock:
+            items = [(net, until) for net, until in self._until.items() if until > now]
+        items.sort(key=lambda item: (item[0][0], item[0][1]))
+        return [(_cidr(net), math.ceil(until - now)) for net, until in items]
+
+    def changes(self, since: int, now: float):
+        """
+        Feed entries after sequence number `since`: [(seq, cidr, seconds
+        left)], skipping ones that have already expired. None when the feed
+        no longer reaches back that far; the consumer then reloads the full
+        set.
+        """
+        with self._lock:
+            if self._feed and since < self._feed[0][0] - 1:
+                return None
+            feed = [item for item in self._feed if item[0] > since]
+        return [(seq, _cidr(net), math.ceil(until - now)) for seq, net, until in feed if until > now]
+
+    def render_nft(self, now: float, table: str = "fdportal") -> str:
+        lines = [
+            "# fd-portal login blocklist; apply with: nft -f <file>",
+            f"table inet {table} {{",
+            "\tset blocked_v4 {",
+            "\t\ttype ipv4_addr",
+            "\t\tflags interval, timeout",
+            "\t}",
+            "\tset blocked_v6 {",
+            "\t\ttype ipv6_addr",
+            "\t\tflags interval, timeout",
+            "\t}",
+            "}",
+        ]
+        v4, v6 = [], []
+        for cidr, ttl in self.entries(now):
+            (v6 if ":" in cidr else v4).append(f"{cidr} timeout {ttl}s")
+        for name, elems in (("blocked_v4", v4), ("blocked_v6", v6)):
+            if elems:  # an empty element list is a syntax error
+                lines.append(f"add element inet {table} {name} {{ {', '.join(elems)} }}")
+        return "\n".join(lines) + "\n"
+
+    def render_ipset(self, now: float, name: str = "fdportal", default_timeout: int = 300) -> str:
+        lines = [
+            f"create {name}-v4 hash:net family inet timeout {default_timeout}",
+            f"create {name}-v6 hash:net family inet6 timeout {default_timeout}",
+        ]
+        for cidr, ttl in self.entries(now):
+            family = "v6" if ":" in cidr else "v4"
+            lines.append(f"add {name}-{family} {cidr} timeout {ttl}")
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._until),
+            "max_entries": self.max_entries,
+            "blocked": self.blocked,
+            "seq": self._seq,
+        }
+
+
+class BlocklistFiles:
+    """
+    Exports a Blocklist to a directory shared with a node or ingress agent
+    (e.g. an emptyDir mounted into a sidecar). Each worker writes its own
+    files, named <host>.<pid>.*:
+
+      .nft   full nftables script  (nft -f)
+      .ipset full ipset file       (ipset restore -exist)
+      .feed  JSON lines, one per new or extended entry, to tail:
+             {"seq": 7, "op": "add", "cidr": "203.0.113.7", "timeout": 287}
+             A {"op": "reset"} line starts a rewritten feed (the in-memory
+             feed overflowed, the file grew past feed_max_bytes or it was
+             deleted); the entries after it are the complete live set.
+
+    Full files are rewritten only when something changed, atomically; an
+    idle worker touches them every half lockout instead. Files of this
+    scheme that nobody touched for a lockout are deleted, except this
+    worker's and those of a live process on this host. Other files in the
+    directory are left alone.
+    """
+
+    def __init__(self, blocklist: Blocklist, directory: str, lockout_sec: int = 300,
+                 feed_max_bytes: int = 1 << 20):
+        self.blocklist = blocklist
+        self.directory = directory
+        self.lockout_sec = lockout_sec
+        self.feed_max_bytes = feed_max_bytes
+        self._pid = None
+        self._seq = 0
+        self._touched = 0.0
+        self.exports = 0
+
+    def _base(self) -> str:
+        return os.path.join(self.directory, f"{socket.gethostname()}.{os.getpid()}")
+
+    @staticmethod
+    def _write(path: str, text: str) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _line(seq: int, op: str, cidr: str = None, ttl: int = None) -> str:
+        item = {"seq": seq, "op": op}
+        if cidr is not None:
+            item.update(cidr=cidr, timeout=ttl)
+        return json.dumps(item) + "\n"
+
+    def export(self) -> bool:
+        """Write whatever changed since the last call; True if anything was written."""
+        now = time.time()
+        bl = self.blocklist
+        expired = bl.sweep(now)
+        if self._pid != os.getpid():  # first call in this (forked) process
+            self._pid, self._seq, expired = os.getpid(), -1, 1
+        seq = bl.seq
+        if seq == self._seq and not expired:
+            if now - self._touched > self.lockout_sec / 2:
+                self._touch(now)
+            return False
+
+        base = self._base()
+        self._write(f"{base}.nft", bl.render_nft(now))
+        self._write(f"{base}.ipset", bl.render_ipset(now, default_timeout=self.lockout_sec))
+
+        feed = f"{base}.feed"
+        changes = bl.changes(self._seq, now) if self._seq >= 0 else None
+        try:
+            rewrite = os.path.getsize(feed) > self.feed_max_bytes
+        except FileNotFoundError:
+            rewrite = True  # a recreated feed must start with a reset, not mid-stream
+        if changes is None or rewrite:
+            lines = [self._line(seq, "reset")]
+            lines += [self._line(seq, "add", cidr, ttl) for cidr, ttl in bl.entries(now)]
+            self._write(feed, "".join(lines))
+        elif changes:
+            with open(feed, "a") as f:
+                f.write("".join(self._line(s, "add", cidr, ttl) for s, cidr, ttl in changes))
+        self._seq = seq
+        self._touched = now
+        self.exports += 1
+        self._prune(now)
+        return True
+
+    def _touch(self, now: float) -> None:
+        """Keep an idle worker's files from looking abandoned to _prune()."""
+        base = self._base()
+        try:
+            for kind in ("nft", "ipset", "feed"):
+                os.utime(f"{base}.{kind}", (now, now))
+        except FileNotFoundError:
+            self._seq = -1  # deleted under us: the next export() rewrites everything
+        self._touched = now
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _prune(self, now: float) -> None:
+        host, pid = socket.gethostname(), os.getpid()
+        for name in os.listdir(self.directory):
+            m = _FILE_RE.match(name)
+            if m is None:
+                continue
+            if m["host"] == host and (int(m["pid"]) == pid or self._alive(int(m["pid"]))):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.stat(path).st_mtime > self.lockout_sec:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,137 @@
+import math
+import threading
+import time
+from collections import deque
+
+from keystone import InvalidCredentials, KeystoneUnavailable
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker around a KeystoneClient (same validate_password interface).
+
+    closed    : calls go through; the outcome of the last `window` calls is
+                kept. A call is bad if it errored (timeout, connection error,
+                5xx) or took longer than slow_call_sec. A 401 is a healthy
+                answer. Once at least min_calls are recorded and the bad
+                share reaches error_rate, the breaker opens.
+    open      : calls fail fast with KeystoneUnavailable for open_sec.
+    half_open : up to half_open_probes calls are let through; if they all
+                succeed the breaker closes, any bad probe re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        client,
+        error_rate: float = 0.5,
+        slow_call_sec: float = 5.0,
+        min_calls: int = 10,
+        window: int = 50,
+        open_sec: float = 30.0,
+        half_open_probes: int = 3,
+    ):
+        self.client = client
+        self.error_rate = error_rate
+        self.slow_call_sec = slow_call_sec
+        self.min_calls = min_calls
+        self.open_sec = open_sec
+        self.half_open_probes = half_open_probes
+
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)  # True = bad call
+        self._bad = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_ok = 0
+
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def _maybe_half_open(self, now: float) -> None:
+        if self._state == self.OPEN and now - self._opened_at >= self.open_sec:
+            self._state = self.HALF_OPEN
+            self._probes_started = 0
+            self._probes_ok = 0
+
+    def _open(self, now: float) -> None:
+        self._state = self.OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self._bad = 0
+        self.trips += 1
+
+    def _admit(self) -> bool:
+        """Returns True if this call is a half-open probe; raises if rejected."""
+        now = time.monotonic()
+        with self._lock:
+            self._maybe_half_open(now)
+            if self._state == self.CLOSED:
+                return False
+            if self._state == self.HALF_OPEN and self._probes_started < self.half_open_probes:
+                self._probes_started += 1
+                return True
+            self.rejected += 1
+            left = self.open_sec - (now - self._opened_at) if self._state == self.OPEN else 1
+        raise KeystoneUnavailable("Keystone circuit open", retry_after=max(1, math.ceil(left)))
+
+    def _record(self, probe: bool, bad: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if probe:
+                if self._state != self.HALF_OPEN:
+                    return
+                if bad:
+                    self._open(now)
+                    return
+                self._probes_ok += 1
+                if self._probes_ok >= self.half_open_probes:
+                    self._state = self.CLOSED
+                return
+            if self._state != self.CLOSED:
+                return
+            if len(self._outcomes) == self._outcomes.maxlen:
+                self._bad -= self._outcomes[0]
+            self._outcomes.append(bad)
+            self._bad += bad
+            n = len(self._outcomes)
+            if n >= self.min_calls and self._bad / n >= self.error_rate:
+                self._open(now)
+
+    def validate_password(self, username: str, password: str):
+        probe = self._admit()
+        started = time.monotonic()
+        try:
+            result = self.client.validate_password(username, password)
+        except InvalidCredentials:
+            self._record(probe, bad=time.monotonic() - started > self.slow_call_sec)
+            raise
+        except Exception:
+            self._record(probe, bad=True)
+            raise
+        self._record(probe, bad=time.monotonic() - started > self.slow_call_sec)
+        return result
+
+    def stats(self) -> dict:
+        state = self.state
+        with self._lock:
+            n = len(self._outcomes)
+            return {
+                "state": state,
+                "open": int(state == self.OPEN),
+                "half_open": int(state == self.HALF_OPEN),
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "window_calls": n,
+                "window_error_rate": self._bad / n if n else 0.0,
+            }
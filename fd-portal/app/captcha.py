@@ -0,0 +1,105 @@
+import base64
+import hashlib
+import hmac
+import math
+import random
+import secrets
+import time
+
+from ratelimit import MemoryBackend
+
+
+class MathChallenge:
+    """Default challenge: 'What is a + b?'"""
+
+    def generate(self):
+        a = random.randint(2, 9)
+        b = random.randint(2, 9)
+        return f"What is {a} + {b}?", str(a + b)
+
+
+GENERATORS = {
+    "math": MathChallenge,
+}
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _unb64(s: str) -> bytes:
+    return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+
+class CaptchaTokens:
+    """
+    Stateless captcha: the challenge travels in the form as a signed,
+    expiring token instead of living in the session cookie.
+
+        token = nonce.expires.sig.answer_tag
+        sig        = HMAC(key, nonce|expires|client) -> token is ours, unexpired,
+                                                        issued to this client
+        answer_tag = HMAC(key, sig|answer)           -> answer is not readable
+
+    `client` is the browser's client_id, so a token solved in one session
+    (or by a captcha farm) is worthless in another. Verification is
+    constant-time and writes nothing to the session.
+
+    A token is single-use: its nonce is burned on the first attempt, right
+    or wrong, in `replay`, a LoginDefense backend of its own (the failure
+    counts use another one, with another window). With the shared or Redis
+    backend a burned token is refused by every worker and replica, not
+    just the one that saw it. The burn is one observe() of the nonce with
+    window ttl_sec and lock_after=1: only the first observer arms its
+    "lockout", atomically in every backend, and sweep() drops the record
+    once the token has expired.
+    """
+
+    def __init__(self, secret: bytes, ttl_sec: int = 300, generator=None, replay=None):
+        self._key = hmac.new(secret, b"fd-portal captcha v2", hashlib.sha256).digest()
+        self.ttl_sec = ttl_sec
+        self.generator = generator if generator is not None else MathChallenge()
+        self.replay = replay if replay is not None else MemoryBackend()
+
+    def _mac(self, *parts: bytes) -> bytes:
+        return hmac.new(self._key, b"|".join(parts), hashlib.sha256).digest()
+
+    @staticmethod
+    def _normalize(answer: str) -> bytes:
+        return answer.strip().lower().encode("utf-8")
+
+    def issue(self, client: str = ""):
+        """Returns (question, token) for the client_id `client`."""
+        question, answer = self.generator.generate()
+        nonce = secrets.token_bytes(16)
+        expires = str(int(time.time()) + self.ttl_sec).encode("ascii")
+        sig = self._mac(nonce, expires, client.encode("utf-8"))
+        tag = self._mac(sig, self._normalize(answer))
+        return question, ".".join((_b64(nonce), expires.decode("ascii"), _b64(sig), _b64(tag)))
+
+    def verify(self, token: str, answer: str, client: str = "") -> bool:
+        try:
+            n64, expires_s, sig64, tag64 = token.split(".")
+            nonce, sig, tag = _unb64(n64), _unb64(sig64), _unb64(tag64)
+            expires = int(expires_s)
+        except (ValueError, TypeError):
+            return False
+
+        now = time.time()
+        if expires < now:
+            return False
+        if not hmac.compare_digest(sig, self._mac(nonce, expires_s.encode("ascii"), client.encode("utf-8"))):
+            return False
+        if not self._burn(n64, expires, now):
+            return False
+        return hmac.compare_digest(tag, self._mac(sig, self._normalize(answer)))
+
+    def _burn(self, nonce: str, expires: int, now: float) -> bool:
+        """Mark nonce as used; False if it already was."""
+        # kept a second past the expiry, when the token is refused anyway
+        left = math.ceil(expires - now) + 1
+        return self.replay.observe(nonce, now, True, self.ttl_sec, 1, left)[2]
+
+    def sweep(self, now: float = None) -> int:
+        """Drop burned nonces of expired tokens."""
+        return self.replay.sweep(time.time() if now is None else now, self.ttl_sec)
@@ -19,6 +19,43 @@ class Settings:
     horizon_url: str = os.environ.get("HORIZON_URL", "https://opole.minizon.net/")
     skyline_url: str = os.environ.get("SKYLINE_URL", "https://opole.minizon.net:9999/")
 
+    # Keystone transport (pooled keep-alive connections, per worker)
+    keystone_pool_size: int = int(os.environ.get("KEYSTONE_POOL_SIZE", "10"))
+    keystone_connect_timeout: float = float(os.environ.get("KEYSTONE_CONNECT_TIMEOUT", "3.05"))
+    keystone_read_timeout: float = float(os.environ.get("KEYSTONE_READ_TIMEOUT", "10"))
+    keystone_connect_retries: int = int(os.environ.get("KEYSTONE_CONNECT_RETRIES", "2"))
+    keystone_retry_backoff: float = float(os.environ.get("KEYSTONE_RETRY_BACKOFF", "0.2"))
+
+    # Circuit breaker: fail fast (503) while Keystone is erroring or slow
+    keystone_breaker: bool = _env_bool("KEYSTONE_BREAKER", True)
+    keystone_breaker_error_rate: float = float(os.environ.get("KEYSTONE_BREAKER_ERROR_RATE", "0.5"))
+    keystone_breaker_slow_call_sec: float = float(os.environ.get("KEYSTONE_BREAKER_SLOW_CALL_SEC", "5"))
+    keystone_breaker_min_calls: int = int(os.environ.get("KEYSTONE_BREAKER_MIN_CALLS", "10"))
+    keystone_breaker_window: int = int(os.environ.get("KEYSTONE_BREAKER_WINDOW", "50"))
+    keystone_breaker_open_sec: float = float(os.environ.get("KEYSTONE_BREAKER_OPEN_SEC", "30"))
+    keystone_breaker_half_open_probes: int = int(os.environ.get("KEYSTONE_BREAKER_HALF_OPEN_PROBES", "3"))
+
+    # Admission control: bounded (optionally AIMD-adaptive) Keystone concurrency per worker
+    # plus a short priority queue; clean clients go first, overflow gets 503 + Retry-After
+    keystone_admission: bool = _env_bool("KEYSTONE_ADMISSION", True)
+    keystone_concurrency_limit: int = int(os.environ.get("KEYSTONE_CONCURRENCY_LIMIT", "8"))
+    keystone_concurrency_max: int = int(os.environ.get("KEYSTONE_CONCURRENCY_MAX", "10"))
+    keystone_concurrency_adaptive: bool = _env_bool("KEYSTONE_CONCURRENCY_ADAPTIVE", True)
+    keystone_latency_target_sec: float = float(os.environ.get("KEYSTONE_LATENCY_TARGET_SEC", "1.0"))
+    keystone_queue_size: int = int(os.environ.get("KEYSTONE_QUEUE_SIZE", "16"))
+    keystone_queue_timeout_sec: float = float(os.environ.get("KEYSTONE_QUEUE_TIMEOUT_SEC", "2.0"))
+
+    # Remember recent failed (username, password) pairs and coalesce identical attempts
+    keystone_negative_cache: bool = _env_bool("KEYSTONE_NEGATIVE_CACHE", True)
+    keystone_negative_cache_ttl_sec: float = float(os.environ.get("KEYSTONE_NEGATIVE_CACHE_TTL_SEC", "30"))
+    keystone_negative_cache_max: int = int(os.environ.get("KEYSTONE_NEGATIVE_CACHE_MAX", "50000"))
+
+    # Keep the Keystone token of a login (encrypted, server-side sessions only)
+    # and check "still logged in" with GET /auth/tokens instead of a password
+    keystone_token_reuse: bool = _env_bool("KEYSTONE_TOKEN_REUSE", False)
+    keystone_token_revalidate_sec: int = int(os.environ.get("KEYSTONE_TOKEN_REVALIDATE_SEC", "300"))
+    keystone_token_expiry_skew_sec: int = int(os.environ.get("KEYSTONE_TOKEN_EXPIRY_SKEW_SEC", "60"))
+
     # Branding (can point to your website, or host locally under /static/img)
     brand_name: str = os.environ.get("BRAND_NAME", "MINIZON")
     product_name: str = os.environ.get("PRODUCT_NAME", "Front Door")
@@ -39,16 +76,87 @@ class Settings:
         "https://www.minizon.net/wp-content/themes/bizboost/assets/images/hero-content.png",
     )
 
+    # Pre-render page shells at startup and only fill dynamic slots per request
+    render_cache: bool = _env_bool("RENDER_CACHE", True)
+
+    # Serve brand images from static/img/vendor when `python assets.py vendor` ran at build
+    vendor_brand_images: bool = _env_bool("VENDOR_BRAND_IMAGES", False)
+
     # Security / sessions
     session_cookie_secure: bool = _env_bool("SESSION_COOKIE_SECURE", True)
+    # "cookie" (signed cookie, default), "memory" (per worker LRU) or "redis" (shared)
+    session_backend: str = os.environ.get("SESSION_BACKEND", "cookie").strip().lower()
+    session_redis_url: str = os.environ.get("SESSION_REDIS_URL", "redis://localhost:6379/0")
+    session_ttl_sec: int = int(os.environ.get("SESSION_TTL_SEC", "43200"))
+    session_max_entries: int = int(os.environ.get("SESSION_MAX_ENTRIES", "100000"))
+
+    # How often /readyz's cached verdict is recomputed
+    readiness_interval_sec: float = float(os.environ.get("READINESS_INTERVAL_SEC", "5"))
+
+    # Prometheus text endpoint at /metrics (per worker), served only on this
+    # internal port (a second gunicorn bind); 0 serves it on every listener
+    metrics_enabled: bool = _env_bool("METRICS_ENABLED", True)
+    metrics_port: int = int(os.environ.get("METRICS_PORT", "9100"))
 
     # Trust X-Forwarded-For from LB/Ingress
     trust_x_forwarded_for: bool = _env_bool("TRUST_X_FORWARDED_FOR", True)
 
+    # First-tier edge filter (per client IP / network prefix), ahead of Flask
+    edge_filter: bool = _env_bool("EDGE_FILTER", True)
+    edge_allow_cidrs: str = os.environ.get("EDGE_ALLOW_CIDRS", "")
+    edge_deny_cidrs: str = os.environ.get("EDGE_DENY_CIDRS", "")
+    edge_window_sec: int = int(os.environ.get("EDGE_WINDOW_SEC", "60"))
+    edge_ip_limit: int = int(os.environ.get("EDGE_IP_LIMIT", "120"))
+    edge_prefix_limit: int = int(os.environ.get("EDGE_PREFIX_LIMIT", "1200"))
+    edge_ipv4_prefix: int = int(os.environ.get("EDGE_IPV4_PREFIX", "24"))
+    edge_ipv6_prefix: int = int(os.environ.get("EDGE_IPV6_PREFIX", "64"))
+    edge_max_keys: int = int(os.environ.get("EDGE_MAX_KEYS", "100000"))
+    # Also early-reject a locked-out client's IP (off: NATed users share IPs)
+    edge_lockout_by_ip: bool = _env_bool("EDGE_LOCKOUT_BY_IP", False)
+
+    # Kernel blocklist export for locked-out client IPs ("" = off): nftables/ipset files + diff feed
+    blocklist_dir: str = os.environ.get("BLOCKLIST_DIR", "").strip()
+    blocklist_ipv4_prefix: int = int(os.environ.get("BLOCKLIST_IPV4_PREFIX", "32"))
+    blocklist_ipv6_prefix: int = int(os.environ.get("BLOCKLIST_IPV6_PREFIX", "64"))
+    blocklist_export_interval_sec: int = int(os.environ.get("BLOCKLIST_EXPORT_INTERVAL_SEC", "5"))
+
     # Login defense (graduated warnings + captcha) - “global vars” via env
     defense_window_sec: int = int(os.environ.get("DEFENSE_WINDOW_SEC", "900"))
     defense_soft_lockout_sec: int = int(os.environ.get("DEFENSE_SOFT_LOCKOUT_SEC", "300"))
 
+    # Where defense counters live: "memory" (per worker), "shared" (all workers of a pod)
+    # or "redis" (shared by all pods)
+    defense_backend: str = os.environ.get("DEFENSE_BACKEND", "memory").strip().lower()
+    defense_redis_url: str = os.environ.get("DEFENSE_REDIS_URL", "redis://localhost:6379/0")
+    # Redis connect/read timeout; on errors the worker falls back to local counts
+    defense_redis_timeout_sec: float = float(os.environ.get("DEFENSE_REDIS_TIMEOUT_SEC", "0.5"))
+    # Table file for the shared backend; must be on tmpfs and local to the pod
+    defense_shm_path: str = os.environ.get("DEFENSE_SHM_PATH", "/dev/shm/fd-portal-defense")
+
+    # Memory backend bounds: max tracked keys per worker (LRU) and sweeper period
+    defense_max_keys: int = int(os.environ.get("DEFENSE_MAX_KEYS", "100000"))
+    defense_sweep_interval_sec: int = int(os.environ.get("DEFENSE_SWEEP_INTERVAL_SEC", "60"))
+    # Window record: "log" (exact timestamps) or "buckets" (fixed size, approximate)
+    defense_window_algo: str = os.environ.get("DEFENSE_WINDOW_ALGO", "log").strip().lower()
+    # Lock stripes for the memory backend (1 = one global lock)
+    defense_lock_stripes: int = int(os.environ.get("DEFENSE_LOCK_STRIPES", "16"))
+    # Snapshot file prefix for defense state on a persistent volume ("" = off), and period
+    defense_snapshot_path: str = os.environ.get("DEFENSE_SNAPSHOT_PATH", "").strip()
+    defense_snapshot_interval_sec: int = int(os.environ.get("DEFENSE_SNAPSHOT_INTERVAL_SEC", "30"))
+
+    # Per-username failure tracking (Count-Min sketch): captcha for attacked usernames
+    username_sketch: bool = _env_bool("USERNAME_SKETCH", True)
+    username_captcha_threshold: int = int(os.environ.get("USERNAME_CAPTCHA_THRESHOLD", "20"))
+    username_window_sec: int = int(os.environ.get("USERNAME_WINDOW_SEC", "900"))
+    username_sketch_width: int = int(os.environ.get("USERNAME_SKETCH_WIDTH", "65536"))
+    username_sketch_depth: int = int(os.environ.get("USERNAME_SKETCH_DEPTH", "4"))
+    username_top_k: int = int(os.environ.get("USERNAME_TOP_K", "10"))
+
+    # Captcha challenges: signed form tokens (no session state)
+    captcha_generator: str = os.environ.get("CAPTCHA_GENERATOR", "math").strip().lower()
+    captcha_ttl_sec: int = int(os.environ.get("CAPTCHA_TTL_SEC", "300"))
+    captcha_replay_cache: int = int(os.environ.get("CAPTCHA_REPLAY_CACHE", "100000"))
+
     # Optional: if you still keep these in your defense module; otherwise policy controls it.
     defense_captcha_after_failures: int = int(os.environ.get("DEFENSE_CAPTCHA_AFTER_FAILURES", "4"))
     defense_max_failures_before_block: int = int(os.environ.get("DEFENSE_MAX_FAILURES_BEFORE_BLOCK", "7"))
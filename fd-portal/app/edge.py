@@ -0,0 +1,258 @@
+import ipaddress
+import math
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import Counter
+from ratelimit import MemoryBackend
+
+EDGE_REJECTIONS = Counter(
+    "fdp_edge_rejections_total",
+    "Requests rejected by the edge filter before reaching Flask (this worker).",
+    ("reason",),
+)
+
+_FORBIDDEN = b"Forbidden\n"
+_TOO_MANY = b"Too many login attempts. Try again later.\n"
+_BASE_HEADERS = [
+    ("Content-Type", "text/plain; charset=utf-8"),
+    ("Cache-Control", "no-store"),
+]
+
+
+def parse_ip(addr: str):
+    """'192.0.2.1' / '2001:db8::1' -> (address bits, int); None if not an IP."""
+    try:
+        return 32, int.from_bytes(socket.inet_pton(socket.AF_INET, addr), "big")
+    except (OSError, TypeError):
+        pass
+    try:
+        n = int.from_bytes(socket.inet_pton(socket.AF_INET6, addr), "big")
+    except (OSError, TypeError):
+        return None
+    if n >> 32 == 0xFFFF:  # IPv4-mapped (::ffff:a.b.c.d)
+        return 32, n & 0xFFFFFFFF
+    return 128, n
+
+
+def client_ip(environ, trust_xff: bool) -> str:
+    """
+    Address the edge limits on. With a trusted proxy, the right-most
+    X-Forwarded-For entry (the one our proxy appended, as ProxyFix x_for=1
+    uses); left-most entries are client-supplied and trivially spoofed.
+    """
+    if trust_xff:
+        xff = environ.get("HTTP_X_FORWARDED_FOR")
+        if xff:
+            return xff.rsplit(",", 1)[-1].strip()
+    return environ.get("REMOTE_ADDR", "")
+
+
+class PrefixTable:
+    """
+    Set of IPv4/IPv6 CIDR blocks. A flattened CIDR trie: one hash set of
+    shifted network numbers per distinct prefix length, so a lookup costs
+    one shift + set probe per length in use (a handful in practice).
+    """
+
+    def __init__(self, cidrs=()):
+        self._nets = {32: {}, 128: {}}  # address bits -> {prefix len: {network >> host bits}}
+        self._levels = {32: (), 128: ()}
+        self._count = 0
+        for cidr in cidrs:
+            self.add(cidr)
+
+    @classmethod
+    def parse(cls, text: str) -> "PrefixTable":
+        """Comma/whitespace separated CIDRs or addresses (ConfigMap values)."""
+        return cls(text.replace(",", " ").split())
+
+    def add(self, cidr: str) -> None:
+        net = ipaddress.ip_network(cidr, strict=False)
+        if net.version == 6 and net.network_address.ipv4_mapped is not None and net.prefixlen >= 96:
+            net = ipaddress.ip_network(f"{net.network_address.ipv4_mapped}/{net.prefixlen - 96}")
+        bits, plen = net.max_prefixlen, net.prefixlen
+        nets = self._nets[bits].setdefault(plen, set())
+        shifted = int(net.network_address) >> (bits - plen)
+        if shifted not in nets:
+            nets.add(shifted)
+            self._count += 1
+        # longest prefixes first: the common case is a list of /32s and /24s
+        self._levels[bits] = tuple(
+            (bits - p, s) for p, s in sorted(self._nets[bits].items(), reverse=True)
+        )
+
+    def __contains__(self, ip) -> bool:
+        bits, n = ip
+        for shift, nets in self._levels[bits]:
+            if (n >> shift) in nets:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def _cookie(header: str, name: str):
+    """Raw value of one cookie from a Cookie header, without parsing the rest."""
+    for part in header.split(";"):
+        k, _, v = part.strip().partition("=")
+        if k == name:
+            return v
+    return None
+
+
+class LockoutIndex:
+    """
+    Clients LoginDefense has locked out, so the edge can answer their login
+    POSTs without entering Flask. Keyed by the raw session cookie value (it
+    holds client_id and does not change while the session is untouched)
+    and, with by_ip, by client IP as well. The route fills it whenever it
+    answers with a lockout 429; entries expire with the lockout.
+    """
+
+    def __init__(self, max_entries: int = 100_000, by_ip: bool = False):
+        self.max_entries = max_entries
+        self.by_ip = by_ip
+        self._until = OrderedDict()  # key -> lockout-until, oldest first
+        self._lock = threading.Lock()
+
+    def lock(self, cookie, ip, seconds: float) -> None:
+        until = time.time() + seconds
+        keys = [("cookie", cookie)] if cookie else []
+        if self.by_ip and ip:
+            keys.append(("ip", ip))
+        with self._lock:
+            for key in keys:
+                self._until[key] = until
+                self._until.move_to_end(key)
+            while len(self._until) > self.max_entries:
+                self._until.popitem(last=False)
+
+    def seconds_left(self, cookie, ip, now: float) -> float:
+        if not self._until:
+            return 0
+        for key in (("cookie", cookie), ("ip", ip)):
+            until = self._until.get(key)
+            if until is not None:
+                if now < until:
+                    return until - now
+                with self._lock:
+                    self._until.pop(key, None)
+        return 0
+
+    def sweep(self, now: float) -> int:
+        with self._lock:
+            expired = []
+            for key, until in self._until.items():
+                if now < until:
+                    break
+                expired.append(key)
+            for key in expired:
+                del self._until[key]
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._until)
+
+
+class EdgeFilter:
+    """
+    First-tier client filter, a WSGI layer ahead of ProxyFix and Flask:
+
+    - deny list  -> 403 for every path;
+    - allow list -> skips the limits below;
+    - login POSTs from clients in the LockoutIndex get a precomputed 429
+      + Retry-After (no session decode, defense lookup or page render);
+    - other login POSTs are counted per client IP and per network prefix
+      (/24 and /64 by default) and answered with the same 429 once either
+      passes its limit for the window.
+
+    Rejections never reach session decode, templates or Keystone. The
+    per-session graduated policy in LoginDefense stays the second tier.
+    Counts are per worker and use the fixed-size "buckets" window.
+    """
+
+    def __init__(self, app, allow: PrefixTable = None, deny: PrefixTable = None,
+                 trust_xff: bool = True, window_sec: int = 60,
+                 ip_limit: int = 120, prefix_limit: int = 1200,
+                 ipv4_prefix: int = 24, ipv6_prefix: int = 64,
+                 max_keys: int = 100_000, paths=("/login",),
+                 lockouts: LockoutIndex = None, cookie_name: str = "session"):
+        self.app = app
+        self.allow = allow if allow is not None else PrefixTable()
+        self.deny = deny if deny is not None else PrefixTable()
+        self.trust_xff = trust_xff
+        self.window_sec = window_sec
+        self.ip_limit = ip_limit
+        self.prefix_limit = prefix_limit
+        self._host_bits = {32: 32 - ipv4_prefix, 128: 128 - ipv6_prefix}
+        self.paths = frozenset(paths)
+        self.counters = MemoryBackend(max_keys=max_keys, algorithm="buckets")
+        self.lockouts = lockouts
+        self.cookie_name = cookie_name
+
+    def __call__(self, environ, start_response):
+        addr = client_ip(environ, self.trust_xff)
+        environ["fdp.client_ip"] = addr
+        ip = parse_ip(addr)
+        if ip is None or ip in self.allow:
+            return self.app(environ, start_response)
+        if ip in self.deny:
+            EDGE_REJECTIONS.inc("deny")
+            return self._reply(start_response, "403 Forbidden", _FORBIDDEN)
+        if environ.get("REQUEST_METHOD") == "POST" and environ.get("PATH_INFO") in self.paths:
+            now = time.time()
+            if self.lockouts:
+                cookie = _cookie(environ.get("HTTP_COOKIE", ""), self.cookie_name)
+                left = self.lockouts.seconds_left(cookie, addr, now)
+                if left:
+                    EDGE_REJECTIONS.inc("lockout")
+                    return self._reply(start_response, "429 Too Many Requests", _TOO_MANY, math.ceil(left))
+            reason, retry_after = self._over_limit(ip, now)
+            if reason:
+                EDGE_REJECTIONS.inc(reason)
+                return self._reply(start_response, "429 Too Many Requests", _TOO_MANY, retry_after)
+        return self.app(environ, start_response)
+
+    def _over_limit(self, ip, now: float):
+        """Count one attempt; returns (reason, retry_after) or (None, 0)."""
+        bits, n = ip
+        checks = (
+            ("ip", (bits, n), self.ip_limit),
+            ("prefix", (bits, n >> self._host_bits[bits], "net"), self.prefix_limit),
+        )
+        for reason, key, limit in checks:
+            if limit <= 0:
+                continue
+            # `limit` attempts pass; the next one arms a block for one window
+            _, until, _ = self.counters.observe(key, now, True, self.window_sec, limit + 1, self.window_sec)
+            if now < until:
+                # a rejected IP does not also burn its neighbours' prefix budget
+                return reason, math.ceil(until - now)
+        return None, 0
+
+    @staticmethod
+    def _reply(start_response, status: str, body: bytes, retry_after: int = 0):
+        headers = _BASE_HEADERS + [("Content-Length", str(len(body)))]
+        if retry_after:
+            headers.append(("Retry-After", str(retry_after)))
+        start_response(status, headers)
+        return [body]
+
+    def sweep(self) -> int:
+        now = time.time()
+        swept = self.counters.sweep(now, self.window_sec)
+        if self.lockouts is not None:
+            swept += self.lockouts.sweep(now)
+        return swept
+
+    def stats(self) -> dict:
+        s = self.counters.stats()
+        s["allow_prefixes"] = len(self.allow)
+        s["deny_prefixes"] = len(self.deny)
+        if self.lockouts is not None:
+            s["lockouts"] = len(self.lockouts)
+        return s
@@ -0,0 +1,144 @@
+"""
+Gunicorn settings for fd-portal:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Workers and threads are sized from the container's cgroup CPU quota, and
+the worker class comes from GUNICORN_WORKER_CLASS (gevent, gthread, sync
+or a worker class path). SESSION_BACKEND=memory runs a single worker. The app is created once in the master (preload_app), and its heap
+is frozen before the first fork, so workers share those pages
+copy-on-write instead of each building their own copy. Workers are
+recycled after max_requests (+ jitter, so they do not all restart at once).
+
+Every setting can still be overridden by GUNICORN_CMD_ARGS or on the
+command line.
+"""
+import gc
+import math
+import os
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    v = os.environ.get(name)
+    if v is None:
+        return default
+    return v.strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    v = os.environ.get(name, "").strip()
+    return int(v) if v else default
+
+
+def cgroup_cpus() -> float:
+    """CPUs this container may use: the cgroup quota, else the CPU affinity."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:  # cgroup v2: "<quota> <period>" or "max <period>"
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        try:  # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                quota = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if quota > 0:
+                return quota / period
+        except (OSError, ValueError):
+            pass
+    return float(len(os.sched_getaffinity(0)))
+
+
+cpus = cgroup_cpus()
+# The short names are case-insensitive; anything else is a worker class path
+# (uvicorn.workers.UvicornWorker) and passed on as it is.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "").strip() or "gevent"
+if worker_class.lower() in ("gevent", "gthread", "sync"):
+    worker_class = worker_class.lower()
+
+# gevent: one process per CPU, concurrency comes from greenlets
+# gthread: a few threads per process, one process per CPU plus one
+# sync: the classic 2 x CPUs + 1
+_default_workers = {
+    "gevent": math.ceil(cpus),
+    "gthread": math.ceil(cpus) + 1,
+    "sync": 2 * math.ceil(cpus) + 1,
+}.get(worker_class, math.ceil(cpus))
+# At least two, so a worker being recycled (max_requests) or stuck never
+# leaves the pod without one; without a CPU limit the node's CPU count is
+# used, so cap it.
+_default_workers = max(2, min(_default_workers, _env_int("GUNICORN_MAX_WORKERS", 8)))
+# SESSION_BACKEND=memory keeps sessions in the worker's own memory: a second
+# worker would not know them, and recycling the only one would drop them all.
+_memory_sessions = os.environ.get("SESSION_BACKEND", "cookie").strip().lower() == "memory"
+if _memory_sessions:
+    _default_workers = 1
+workers = _env_int("GUNICORN_WORKERS", _default_workers)
+# gthread: about 4 threads per CPU across the pod, at least 2 per worker
+threads = _env_int("GUNICORN_THREADS", max(2, math.ceil(4 * cpus / workers)) if worker_class == "gthread" else 1)
+worker_connections = _env_int("GUNICORN_WORKER_CONNECTIONS", 1000)
+
+bind = [os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")]
+# Prometheus scrapes /metrics on a listener of its own; the Service and the
+# Ingress only forward to the first one
+_metrics_port = _env_int("METRICS_PORT", 9100)
+if _env_bool("METRICS_ENABLED", True) and _metrics_port:
+    bind.append(f"0.0.0.0:{_metrics_port}")
+# Single PEM holding key + certificate chain; empty serves plain HTTP (local runs)
+certfile = keyfile = os.environ.get("TLS_PEM_FILE", "/tls/minizon.net.pem").strip() or None
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-").strip() or None  # empty: off
+errorlog = "-"
+
+preload_app = _env_bool("GUNICORN_PRELOAD", True)
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 0 if _memory_sessions else 10000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", max_requests // 10)
+
+if preload_app:
+    # The app is built once in the master. Keep the collector off until the
+    # workers start: collections during import and create_app() would free
+    # objects in between long-lived ones and leave every page of the heap
+    # half-written, so the first collection in each worker copies them all.
+    gc.disable()
+    if worker_class == "gevent":
+        # Patch before the app creates sockets, locks or threads, as the
+        # gevent worker would do itself after fork without preload.
+        from gevent import monkey
+        monkey.patch_all()
+
+
+def _tasks(server):
+    app = server.app.wsgi()
+    return getattr(app, "extensions", {}).get("fd_tasks", ())
+
+
+def on_starting(server):
+    # also catches --workers / GUNICORN_CMD_ARGS, which override the above
+    if _memory_sessions and server.cfg.workers != 1:
+        raise RuntimeError(
+            f"SESSION_BACKEND=memory needs a single worker, not {server.cfg.workers}; "
+            "use SESSION_BACKEND=redis to run more"
+        )
+
+
+def when_ready(server):
+    if preload_app:
+        # Background tasks belong to the workers; the master only forks.
+        # Waiting for them to exit keeps a lock from being held across fork().
+        for task in _tasks(server):
+            task.stop(timeout=5)
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        # Everything the master allocated goes to the permanent generation:
+        # the workers' collections never visit (and so never copy) it.
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    # After the worker's own setup (gevent re-inits its hub there)
+    if preload_app:
+        gc.enable()
+        for task in _tasks(worker):
+            task.start()
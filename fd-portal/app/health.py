@@ -0,0 +1,95 @@
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+_HEADERS = [
+    ("Content-Type", "text/plain; charset=utf-8"),
+    ("Cache-Control", "no-store"),
+]
+
+
+class Readiness:
+    """
+    Cached readiness verdict. Checks are callables returning (ok, reason);
+    they run from refresh() (startup and a background task), never per probe.
+    While ready, the reasons of all checks are kept as the verdict's detail
+    (e.g. the breaker state) and shown in the /readyz body.
+    """
+
+    def __init__(self, checks=()):
+        self.checks = list(checks)
+        self._lock = threading.Lock()
+        self._ready = False
+        self._reason = "starting"
+
+    def refresh(self) -> None:
+        ready, details = True, []
+        for check in self.checks:
+            try:
+                ok, why = check()
+            except Exception as e:
+                log.exception("readiness check failed")
+                ok, why = False, f"check error: {type(e).__name__}"
+            if not ok:
+                ready, details = False, [why]
+                break
+            details.append(why)
+        reason = "; ".join(details) or "ok"
+        with self._lock:
+            self._ready, self._reason = ready, reason
+
+    def status(self):
+        with self._lock:
+            return self._ready, self._reason
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"ready": int(self._ready)}
+
+
+def breaker_check(breaker):
+    """
+    Reports the Keystone circuit breaker state; never fails readiness. An
+    open breaker means Keystone is down for every pod at once: taking them
+    all out of the Service would turn the portal's fast 503 (with
+    Retry-After) into connection errors at the load balancer, and the pods
+    would not come back before the breaker probes Keystone again.
+    """
+    def _check():
+        return True, f"keystone breaker {breaker.state}"
+    return _check
+
+
+class HealthMiddleware:
+    """
+    WSGI layer in front of Flask that answers the probe paths itself, so
+    probes skip ProxyFix, session decode/encode, blueprints and the
+    after_request header hooks:
+
+      /healthz : process is alive and serving WSGI calls
+      /readyz  : cached Readiness verdict (503 until ready) and its detail
+    """
+
+    def __init__(self, app, readiness: Readiness,
+                 health_path: str = "/healthz", ready_path: str = "/readyz"):
+        self.app = app
+        self.readiness = readiness
+        self.health_path = health_path
+        self.ready_path = ready_path
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if path == self.health_path:
+            return self._reply(start_response, "200 OK", b"ok\n")
+        if path == self.ready_path:
+            ready, reason = self.readiness.status()
+            if ready:
+                return self._reply(start_response, "200 OK", f"ready: {reason}\n".encode())
+            return self._reply(start_response, "503 Service Unavailable", f"not ready: {reason}\n".encode())
+        return self.app(environ, start_response)
+
+    @staticmethod
+    def _reply(start_response, status: str, body: bytes):
+        start_response(status, _HEADERS + [("Content-Length", str(len(body)))])
+        return [body]
@@ -1,15 +1,144 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import Histogram
+
+KEYSTONE_LATENCY = Histogram(
+    "fdp_keystone_request_duration_seconds",
+    "Keystone POST /auth/tokens latency by outcome (HTTP status, timeout, connection_error).",
+    ("outcome",),
+)
+
+
+class InvalidCredentials(ValueError):
+    """Keystone rejected the username/password (HTTP 401)."""
+
+
+class KeystoneError(ValueError):
+    """Keystone answered, but not with a usable result (5xx, missing token, ...)."""
+
+
+class KeystoneUnavailable(Exception):
+    """Keystone was not called at all (breaker open, overloaded); not the user's fault."""
+
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class KeystoneToken:
+    """Token issued for a successful password login."""
+    token: str = field(repr=False)
+    expires_at: float  # unix ts, 0.0 if Keystone did not say
+    user_id: str = ""
+
+
+def _token_from(r, token: str) -> KeystoneToken:
+    try:
+        body = r.json()["token"]
+        expires_at = datetime.fromisoformat(body["expires_at"].replace("Z", "+00:00")).timestamp()
+        user_id = (body.get("user") or {}).get("id", "")
+    except (ValueError, KeyError, TypeError, AttributeError):
+        expires_at, user_id = 0.0, ""
+    return KeystoneToken(token=token, expires_at=expires_at, user_id=user_id)
+
 
 class KeystoneClient:
-    def __init__(self, keystone_url: str, user_domain: str):
+    def __init__(
+        self,
+        keystone_url: str,
+        user_domain: str,
+        pool_size: int = 10,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10.0,
+        connect_retries: int = 2,
+        retry_backoff: float = 0.2,
+    ):
         self.keystone_url = keystone_url.rstrip("/")
         self.user_domain = user_domain
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.connect_retries = connect_retries
+        self.retry_backoff = retry_backoff
+
+        # One keep-alive session per worker process (gunicorn forks workers,
+        # and pooled sockets must never be shared across a fork).
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+
+    def _new_session(self) -> requests.Session:
+        # Retry only failures that happen before the request is sent
+        # (DNS, refused, connect timeout). A read timeout or a 5xx may mean
+        # Keystone already processed the password, so those are never retried.
+        retry = Retry(
+            total=self.connect_retries,
+            connect=self.connect_retries,
+            read=0,
+            status=0,
+            other=0,
+            redirect=0,
+            allowed_methods=None,
+            backoff_factor=self.retry_backoff,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+        s = requests.Session()
+        s.mount("https://", adapter)
+        s.mount("http://", adapter)
+        return s
+
+    def _http(self) -> requests.Session:
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._session_lock:
+                if self._session is None or self._session_pid != pid:
+                    self._session = self._new_session()
+                    self._session_pid = pid
+        return self._session
+
+    def pool_stats(self) -> dict:
+        """
+        Connection reuse counters for this worker.
+        A "miss" is a newly opened TCP+TLS connection, a "hit" is a request
+        served over an already pooled keep-alive connection.
+        """
+        reqs = conns = 0
+        s = self._session if self._session_pid == os.getpid() else None
+        if s is not None:
+            adapters = {id(a): a for a in s.adapters.values()}.values()
+            for adapter in adapters:
+                pools = adapter.poolmanager.pools
+                for pool_key in pools.keys():
+                    pool = pools.get(pool_key)
+                    if pool is None:
+                        continue
+                    reqs += pool.num_requests
+                    conns += pool.num_connections
+        return {
+            "requests": reqs,
+            "hits": max(0, reqs - conns),
+            "misses": conns,
+        }
 
-    def validate_password(self, username: str, password: str) -> None:
+    def validate_password(self, username: str, password: str) -> KeystoneToken:
         """
         Validate Keystone credentials using POST /v3/auth/tokens.
         Success: HTTP 201 and X-Subject-Token header.
-        We do NOT store the token (this portal is a gate, not SSO).
+        The token is returned to the caller; it is only kept when token
+        reuse is enabled (see tokens.TokenVault).
         """
         url = f"{self.keystone_url}/auth/tokens"
         payload = {
@@ -27,8 +156,53 @@ class KeystoneClient:
             }
         }
 
-        r = requests.post(url, json=payload, timeout=10)
+        started = time.perf_counter()
+        try:
+            r = self._http().post(url, json=payload, timeout=self.timeout)
+        except requests.Timeout:
+            KEYSTONE_LATENCY.observe(time.perf_counter() - started, "timeout")
+            raise
+        except requests.ConnectionError:
+            KEYSTONE_LATENCY.observe(time.perf_counter() - started, "connection_error")
+            raise
+        KEYSTONE_LATENCY.observe(time.perf_counter() - started, str(r.status_code))
+
+        if r.status_code == 401:
+            raise InvalidCredentials("Invalid credentials")
         if r.status_code != 201:
-            raise ValueError("Invalid credentials")
+            raise KeystoneError(f"Unexpected Keystone status {r.status_code}")
         if not r.headers.get("X-Subject-Token"):
-            raise ValueError("Missing Keystone token header")
+            raise KeystoneError("Missing Keystone token header")
+        return _token_from(r, r.headers["X-Subject-Token"])
+
+    def _token_headers(self, token: str) -> dict:
+        # A token may validate or revoke itself
+        return {"X-Auth-Token": token, "X-Subject-Token": token}
+
+    def validate_token(self, token: str):
+        """
+        GET /v3/auth/tokens: is this token still valid? No password hashing
+        on the Keystone side. Returns a KeystoneToken, or None if Keystone
+        no longer accepts it (expired or revoked).
+        """
+        r = self._http().get(
+            f"{self.keystone_url}/auth/tokens",
+            params={"nocatalog": "1"},
+            headers=self._token_headers(token),
+            timeout=self.timeout,
+        )
+        if r.status_code in (401, 404):
+            return None
+        if r.status_code != 200:
+            raise KeystoneError(f"Unexpected Keystone status {r.status_code}")
+        return _token_from(r, token)
+
+    def revoke_token(self, token: str) -> None:
+        """DELETE /v3/auth/tokens (logout). 404 means already gone."""
+        r = self._http().delete(
+            f"{self.keystone_url}/auth/tokens",
+            headers=self._token_headers(token),
+            timeout=self.timeout,
+        )
+        if r.status_code not in (204, 404):
+            raise KeystoneError(f"Unexpected Keystone status {r.status_code}")
@@ -0,0 +1,132 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from keystone import InvalidCredentials
+
+
+class _Flight:
+    __slots__ = ("done", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class NegativeCache:
+    """
+    Sits in front of a KeystoneClient and absorbs credential-stuffing retries:
+
+    - failed attempts (HTTP 401 only) are remembered for ttl_sec, so the
+      same username/password pair is rejected locally without a Keystone call;
+    - concurrent identical attempts are coalesced into one upstream call
+      (single-flight) and share its failure. If that call succeeds, each
+      waiter logs in with its own call: a Keystone token belongs to one
+      session and is revoked when that session logs out.
+
+    Attempts are keyed by HMAC-SHA256 over username and password with a
+    random per-process key: no plaintext is kept, and digests are
+    meaningless outside this worker. A worker forked from a preloaded
+    master draws its own key (and drops what it inherited) on first use.
+    """
+
+    def __init__(self, client, ttl_sec: float = 30.0, max_entries: int = 50_000):
+        self.client = client
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+
+        self._pid = None
+        self._hmac_key = None
+        self._failed = OrderedDict()  # digest -> expires_at (monotonic), oldest first
+        self._inflight = {}           # digest -> _Flight
+        self._lock = threading.Lock()
+
+        self.hits = 0       # rejected from cache
+        self.misses = 0     # went upstream
+        self.coalesced = 0  # waited on an identical in-flight attempt
+
+    def _key(self) -> bytes:
+        pid = os.getpid()
+        if self._pid != pid:  # first call in this (forked) process
+            with self._lock:
+                if self._pid != pid:
+                    self._hmac_key = secrets.token_bytes(32)
+                    self._failed.clear()
+                    self._inflight.clear()
+                    self._pid = pid
+        return self._hmac_key
+
+    def _digest(self, username: str, password: str) -> bytes:
+        u = username.encode("utf-8")
+        msg = len(u).to_bytes(4, "big") + u + password.encode("utf-8")
+        return hmac.new(self._key(), msg, hashlib.sha256).digest()
+
+    def validate_password(self, username: str, password: str):
+        digest = self._digest(username, password)
+        now = time.monotonic()
+
+        with self._lock:
+            expires = self._failed.get(digest)
+            if expires is not None:
+                if now < expires:
+                    self.hits += 1
+                    raise InvalidCredentials("Invalid credentials")
+                del self._failed[digest]
+
+            flight = self._inflight.get(digest)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[digest] = _Flight()
+                self.misses += 1
+
+        if not leader:
+            flight.done.wait()
+            with self._lock:
+                if flight.error is not None:
+                    self.coalesced += 1
+                else:
+                    self.misses += 1
+            if flight.error is not None:
+                raise flight.error
+            # the password is right: this login gets a token of its own
+            return self.client.validate_password(username, password)
+
+        try:
+            return self.client.validate_password(username, password)
+        except InvalidCredentials as e:
+            flight.error = e
+            self._remember_failure(digest)
+            raise
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(digest, None)
+            flight.done.set()
+
+    def _remember_failure(self, digest: bytes) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._failed.pop(digest, None)
+            self._failed[digest] = now + self.ttl_sec
+            # Constant TTL keeps the dict ordered by expiry: trim from the front
+            while self._failed:
+                oldest, expires = next(iter(self._failed.items()))
+                if expires > now and len(self._failed) <= self.max_entries:
+                    break
+                del self._failed[oldest]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._failed),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
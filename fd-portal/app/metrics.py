@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Flask, g, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, doc: str, labelnames=(), registry=None):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def header(self):
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        yield from self.header()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, v in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {v}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        super().__init__(name, doc, labelnames, registry)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 2)
+            s[i] += 1
+            s[-1] += value
+
+    def collect(self):
+        yield from self.header()
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for labels, s in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), s):
+                cumulative += n
+                le = _labels(self.labelnames, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            lbl = _labels(self.labelnames, labels)
+            yield f"{self.name}_sum{lbl} {s[-1]}"
+            yield f"{self.name}_count{lbl} {cumulative}"
+
+
+class Registry:
+    """
+    Per-process metric registry. Metrics are module-level objects updated
+    in place; callbacks turn existing stats() dicts into gauges at scrape
+    time, so nothing extra runs on the request path.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._callbacks = {}  # prefix -> (doc, fn returning {name: value})
+        self._labelled = {}   # metric name -> (doc, label name, fn returning {label value: value})
+
+    def register(self, metric) -> None:
+        self._metrics.append(metric)
+
+    def register_stats(self, prefix: str, doc: str, fn) -> None:
+        # keyed by prefix: a re-created app replaces its previous callbacks
+        self._callbacks[prefix] = (doc, fn)
+
+    def register_labelled(self, name: str, doc: str, labelname: str, fn) -> None:
+        """One gauge family computed at scrape time, one series per label value."""
+        self._labelled[name] = (doc, labelname, fn)
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.collect())
+        for prefix, (doc, fn) in list(self._callbacks.items()):
+            for key, value in fn().items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# HELP {prefix}_{key} {doc}")
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+        for name, (doc, labelname, fn) in list(self._labelled.items()):
+            lines.append(f"# HELP {name} {doc}")
+            lines.append(f"# TYPE {name} gauge")
+            for label, value in fn().items():
+                lines.append(f"{name}{_labels((labelname,), (label,))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_LATENCY = Histogram(
+    "fdp_http_request_duration_seconds",
+    "Request latency by route and method (this worker).",
+    ("route", "method"),
+)
+HTTP_REQUESTS = Counter(
+    "fdp_http_requests_total",
+    "Requests by route, method and status (this worker).",
+    ("route", "method", "status"),
+)
+IN_FLIGHT = Gauge("fdp_http_in_flight", "Requests currently being served by this worker.")
+
+
+def install(app: Flask) -> None:
+    """Instrument every request; MetricsEndpoint serves the result."""
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_t0 = time.perf_counter()
+        g._metrics_in_flight = True
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    def _metrics_observe(resp):
+        t0 = g.pop("_metrics_t0", None)
+        if t0 is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - t0, rule, request.method)
+            HTTP_REQUESTS.inc(rule, request.method, str(resp.status_code))
+        return resp
+
+    @app.teardown_request
+    def _metrics_done(exc):
+        if g.pop("_metrics_in_flight", False):
+            IN_FLIGHT.dec()
+
+
+class MetricsEndpoint:
+    """
+    WSGI layer ahead of the edge filter that serves the registry at `path`
+    on the internal metrics listener only: a second gunicorn bind on `port`
+    that neither the Service nor the Ingress exposes. On the public listener
+    `path` is an ordinary 404 from Flask, so defense counters, username
+    labels and worker pids are not readable from the internet. On the
+    metrics listener every other path is a 404, so it cannot be used to
+    reach the portal around the Ingress.
+
+    The listener is recognised by SERVER_PORT, which gunicorn takes from
+    the listening socket (before ProxyFix can rewrite it from a header).
+    port=0 serves `path` on every listener, for local runs.
+    """
+
+    def __init__(self, app, port: int = 9100, registry: Registry = REGISTRY, path: str = "/metrics"):
+        self.app = app
+        self.port = str(port) if port else ""
+        self.registry = registry
+        self.path = path
+
+    def __call__(self, environ, start_response):
+        internal = environ.get("SERVER_PORT") == self.port
+        if not internal and self.port:
+            return self.app(environ, start_response)
+        if environ.get("PATH_INFO") == self.path:
+            return self._reply(start_response, "200 OK", self.registry.render().encode("utf-8"))
+        if internal:
+            return self._reply(start_response, "404 Not Found", b"Not Found\n")
+        return self.app(environ, start_response)
+
+    @staticmethod
+    def _reply(start_response, status: str, body: bytes):
+        start_response(status, [
+            ("Content-Type", "text/plain; version=0.0.4; charset=utf-8"),
+            ("Content-Length", str(len(body))),
+            ("Cache-Control", "no-store"),
+            ("X-Worker-Pid", str(os.getpid())),
+        ])
+        return [body]
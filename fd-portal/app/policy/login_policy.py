@@ -13,6 +13,7 @@ class LoginPolicy:
     msg_invalid_generic: str = "Invalid credentials."
     msg_captcha_next: str = "Invalid credentials. Next attempt will require a captcha."
     msg_captcha_required: str = "Captcha is now required."
-    msg_would_block: str = "Too many incorrect attempts. Your IP would be blocked now (blocking module later)."
+    msg_would_block: str = "Too many incorrect attempts. Sign-in is blocked for now."
     msg_block_countdown: str = "{n} more incorrect attempt(s) and your IP will be blocked."
+    msg_unavailable: str = "Sign-in is temporarily unavailable. Please try again in a moment."
 
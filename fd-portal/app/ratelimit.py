@@ -1,6 +1,32 @@
+import errno
+import fcntl
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
 import time
+import uuid
+from array import array
 from dataclasses import dataclass
-from collections import defaultdict, deque
+from collections import OrderedDict, deque
+
+from metrics import Counter
+
+try:
+    from redis import RedisError
+except ImportError:  # optional: only needed with DEFENSE_BACKEND=redis
+    RedisError = None
+
+log = logging.getLogger(__name__)
+
+DEFENSE_TRANSITIONS = Counter(
+    "fdp_defense_transitions_total",
+    "Clients entering the captcha or lockout phase (this worker).",
+    ("phase",),
+)
 
 @dataclass(frozen=True)
 class DefenseState:
@@ -9,44 +35,704 @@ class DefenseState:
     locked_out: bool
     lockout_seconds_left: int
 
+class _LogRecord:
+    """Exact sliding log: one timestamp per failure, pruned from the left."""
+
+    __slots__ = ("hits", "lockout_until")
+
+    def __init__(self):
+        self.hits = deque()       # failure timestamps, oldest first
+        self.lockout_until = 0.0  # unix ts
+
+    def count(self, now: float, window_sec: int, record: bool) -> int:
+        q = self.hits
+        while q and (now - q[0]) > window_sec:
+            q.popleft()
+        if record:
+            q.append(now)
+        return len(q)
+
+    def active(self, now: float, window_sec: int) -> bool:
+        return bool(self.hits) and (now - self.hits[-1]) <= window_sec
+
+    def last(self, window_sec: int) -> float:
+        """Time of the latest failure (0 if none): MemoryBackend's LRU order."""
+        return self.hits[-1] if self.hits else 0.0
+
+
+_EMPTY_RING = array("H", bytes(2 * 15))
+
+
+class _BucketRecord:
+    """
+    Sliding window approximated by a fixed ring of per-bucket counters:
+    constant memory per key and O(1) amortised per update (a running total
+    avoids summing the ring).
+
+    Tolerance vs. the exact log: the window is split into BUCKETS slices and
+    a failure leaves the count when its whole slice is older than the
+    window, i.e. between window_sec * (1 - 1/BUCKETS) and window_sec after
+    it happened (60s early at most with the default 900s window). Counts
+    never exceed the exact log.
+    """
+
+    BUCKETS = len(_EMPTY_RING)
+
+    __slots__ = ("buckets", "head", "total", "lockout_until")
+
+    def __init__(self):
+        self.buckets = array("H", _EMPTY_RING)  # uint16 counter per bucket
+        self.head = -1      # index (epoch) of the newest bucket
+        self.total = 0
+        self.lockout_until = 0.0
+
+    def count(self, now: float, window_sec: int, record: bool) -> int:
+        n = self.BUCKETS
+        epoch = int(now * n // window_sec)
+        slot = epoch % n
+        b = self.buckets
+        steps = epoch - self.head
+        if steps >= n:
+            b[:] = _EMPTY_RING
+            self.total = 0
+            self.head = epoch
+        elif steps > 0:
+            # clear the buckets we moved past; negative indices wrap the ring
+            for i in range(slot - steps + 1, slot + 1):
+                self.total -= b[i]
+                b[i] = 0
+            self.head = epoch
+        if record and b[slot] < 0xFFFF:
+            b[slot] += 1
+            self.total += 1
+        return self.total
+
+    def active(self, now: float, window_sec: int) -> bool:
+        return self.total > 0 and int(now * self.BUCKETS // window_sec) - self.head < self.BUCKETS
+
+    def last(self, window_sec: int) -> float:
+        """Start of the newest bucket (0 if empty): MemoryBackend's LRU order."""
+        return self.head * window_sec / self.BUCKETS if self.total else 0.0
+
+
+def _live(rec, now: float, window_sec: int) -> bool:
+    return rec.active(now, window_sec) or now < rec.lockout_until
+
+
+def _stronger(rec, cur, now: float, window_sec: int) -> bool:
+    """When restoring over an existing record, keep whichever blocks more."""
+    return (rec.lockout_until, rec.count(now, window_sec, False)) > \
+        (cur.lockout_until, cur.count(now, window_sec, False))
+
+
+WINDOW_ALGORITHMS = {
+    "log": _LogRecord,
+    "buckets": _BucketRecord,
+}
+
+
+class _Shard:
+    """One lock stripe of MemoryBackend: its own LRU dict, lock and counters."""
+
+    __slots__ = ("entries", "lock", "max_keys", "evictions", "expirations")
+
+    def __init__(self, max_keys: int):
+        self.entries = OrderedDict()  # key -> record, least recently failed first
+        self.lock = threading.Lock()
+        self.max_keys = max_keys
+        self.evictions = 0
+        self.expirations = 0
+
+
+class MemoryBackend:
+    """
+    Per-process storage for LoginDefense.
+    Each replica/worker sees only its own counts. Memory is bounded:
+    lookups never create entries, idle entries expire once both the failure
+    window and the lockout have passed, and at most max_keys entries are
+    kept (least recently failed key is evicted first).
+
+    algorithm selects the per-key window record: "log" (exact, one float
+    per failure) or "buckets" (fixed size, approximate; see _BucketRecord).
+
+    Keys are spread over `stripes` shards, each with its own lock, so
+    threaded workers only contend when they touch the same stripe; every
+    observe() is atomic for its key. stripes=1 is a single global lock.
+    """
+
+    def __init__(self, max_keys: int = 100_000, algorithm: str = "log", stripes: int = 16):
+        if algorithm not in WINDOW_ALGORITHMS:
+            raise ValueError(f"Unknown window algorithm: {algorithm!r}")
+        if stripes < 1:
+            raise ValueError("stripes must be >= 1")
+        self.max_keys = max_keys
+        self.algorithm = algorithm
+        self._record_cls = WINDOW_ALGORITHMS[algorithm]
+        per_shard = max(1, -(-max_keys // stripes))
+        self._shards = tuple(_Shard(per_shard) for _ in range(stripes))
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def observe(self, key: str, now: float, record: bool,
+                window_sec: int, lock_after: int, lockout_sec: int):
+        """
+        Prune the window, optionally record one failure, count, and arm the
+        lockout once the count reaches lock_after.
+        Returns (failures, lockout_until, armed); armed is True only for the
+        call that started the lockout.
+        """
+        shard = self._shard(key)
+        with shard.lock:
+            entries = shard.entries
+            rec = entries.get(key)
+            if rec is None:
+                if not record:
+                    return 0, 0.0, False
+                rec = entries[key] = self._record_cls()
+                if len(entries) > shard.max_keys:
+                    entries.popitem(last=False)
+                    shard.evictions += 1
+            elif record:
+                entries.move_to_end(key)
+
+            failures = rec.count(now, window_sec, record)
+
+            armed = failures >= lock_after and now >= rec.lockout_until
+            if armed:
+                rec.lockout_until = now + lockout_sec
+            elif not failures and now >= rec.lockout_until:
+                del entries[key]
+                shard.expirations += 1
+            return failures, rec.lockout_until, armed
+
+    def reset(self, key: str) -> None:
+        shard = self._shard(key)
+        with shard.lock:
+            shard.entries.pop(key, None)
+
+    def sweep(self, now: float, window_sec: int) -> int:
+        """
+        Drop entries with no failures left in the window and no running
+        lockout. Entries are ordered by last failure, so the walk stops at the
+        first one that is still active. Shards are swept one at a time.
+        """
+        total = 0
+        for shard in self._shards:
+            with shard.lock:
+                expired = []
+                for key, rec in shard.entries.items():
+                    if rec.active(now, window_sec):
+                        break
+                    if now >= rec.lockout_until:
+                        expired.append(key)
+                for key in expired:
+                    del shard.entries[key]
+                shard.expirations += len(expired)
+            total += len(expired)
+        return total
+
+    def export(self, now: float, window_sec: int, encode, batch: int = 1024):
+        """
+        Snapshot support: yields lists of encode(key, record) for the live
+        entries. The lock is held for one batch at a time, and records are
+        serialised rather than copied, so a snapshot neither blocks a shard
+        for long nor piles up objects for the garbage collector.
+        """
+        for shard in self._shards:
+            with shard.lock:
+                keys = list(shard.entries)
+            for i in range(0, len(keys), batch):
+                out = []
+                with shard.lock:
+                    for key in keys[i:i + batch]:
+                        rec = shard.entries.get(key)
+                        if rec is not None and _live(rec, now, window_sec):
+                            out.append(encode(key, rec))
+                yield out
+                time.sleep(0)  # let request threads/greenlets in between batches
+
+    def restore(self, items, now: float, window_sec: int) -> int:
+        """
+        Load (key, record) pairs from a snapshot, dropping expired ones. A key
+        that is already tracked keeps the record with the later lockout /
+        higher count, so several snapshots can be merged.
+
+        Snapshot order is not failure order, and sweep() stops at the first
+        active entry, so each shard that received records is re-sorted by
+        last failure before the least recent ones over max_keys are evicted.
+        """
+        restored = 0
+        touched = set()
+        for key, rec in items:
+            if type(rec) is not self._record_cls or not _live(rec, now, window_sec):
+                continue
+            shard = self._shard(key)
+            with shard.lock:
+                cur = shard.entries.get(key)
+                if cur is not None and not _stronger(rec, cur, now, window_sec):
+                    continue
+                shard.entries[key] = rec
+            touched.add(shard)
+            restored += 1
+        for shard in touched:
+            with shard.lock:
+                ordered = sorted(shard.entries.items(), key=lambda kv: kv[1].last(window_sec))
+                excess = max(0, len(ordered) - shard.max_keys)
+                shard.entries = OrderedDict(ordered[excess:])
+                shard.evictions += excess
+        return restored
+
+    def stats(self) -> dict:
+        return {
+            "keys": sum(len(s.entries) for s in self._shards),
+            "max_keys": self.max_keys,
+            "evictions": sum(s.evictions for s in self._shards),
+            "expirations": sum(s.expirations for s in self._shards),
+        }
+
+
+_SHM_MAGIC = b"FDPDEF01"
+_SHM_HEADER = struct.Struct("<8sIIId")  # magic, slots per stripe, stripes, record size, last sweep
+_SHM_STRIPE = struct.Struct("<QQQ")     # keys, evictions, expirations
+# fingerprint, lockout_until, newest bucket epoch, total, 15 bucket counters -> 64 bytes
+_SHM_RECORD = struct.Struct("<QdqI15H6x")
+_SHM_FIELDS = struct.Struct("<QdqI")
+_SHM_RING = slice(_SHM_FIELDS.size, _SHM_FIELDS.size + 2 * len(_EMPTY_RING))
+_SHM_FP = struct.Struct("<Q")
+_SHM_HEAD = struct.Struct("<q")
+_SHM_PROBE = 32          # max slots a key may probe
+_SHM_EMPTY, _SHM_DELETED = 0, 1
+_SHM_INIT_LOCK = 1 << 30  # fcntl byte offsets: stripes use 0..stripes-1
+_SHM_SWEEP_LOCK = _SHM_INIT_LOCK + 1
+
+
+class SharedMemoryBackend:
+    """
+    Pod-local storage shared by every gunicorn worker: a fixed-size
+    open-addressing hash table of 64-byte records in a memory-mapped file
+    (tmpfs under /dev/shm). A client sees the same counts whichever worker
+    serves it, without a network hop.
+
+    The table is split into `stripes` regions. A key hashes to one region
+    and probes linearly inside it (at most 32 slots), so one stripe lock
+    covers every slot the key can touch: a threading.Lock for this
+    worker's threads/greenlets plus an fcntl byte-range lock for the
+    other workers. Records use the fixed-size "buckets" window
+    (_BucketRecord); keys are stored as 64-bit BLAKE2b fingerprints.
+    max_keys sizes the table at 75% load; when a key's probe run is full,
+    its least recently failed record is evicted.
+    """
+
+    def __init__(self, path: str, max_keys: int = 100_000, stripes: int = 16,
+                 sweep_gap_sec: float = 30.0):
+        if stripes < 1:
+            raise ValueError("stripes must be >= 1")
+        per_stripe = 64
+        while per_stripe * stripes * 3 < max_keys * 4:
+            per_stripe *= 2
+        self.path = path
+        self.max_keys = max_keys
+        self.stripes = stripes
+        self.sweep_gap_sec = sweep_gap_sec
+        self._per_stripe = per_stripe
+        self._stripe_bytes = per_stripe * _SHM_RECORD.size
+        header = _SHM_HEADER.size + stripes * _SHM_STRIPE.size
+        self._data = -(-header // 64) * 64
+        size = self._data + stripes * self._stripe_bytes
+
+        self.created = False  # this process laid out the table (and may restore into it)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, _SHM_INIT_LOCK)
+        try:
+            raw = os.pread(self._fd, _SHM_HEADER.size, 0)
+            want = (_SHM_MAGIC, per_stripe, stripes, _SHM_RECORD.size)
+            if os.fstat(self._fd).st_size != size or len(raw) < _SHM_HEADER.size \
+                    or _SHM_HEADER.unpack(raw)[:4] != want:
+                # new file, or a layout from another configuration: start empty
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, _SHM_HEADER.pack(*want, 0.0), 0)
+                self.created = True
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, _SHM_INIT_LOCK)
+        self._mm = mmap.mmap(self._fd, size)
+        self._locks = tuple(threading.Lock() for _ in range(stripes))
+
+    def _acquire(self, stripe: int) -> None:
+        self._locks[stripe].acquire()
+        try:
+            while True:
+                try:
+                    fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe)
+                    break
+                except OSError as exc:
+                    # record locks belong to the process, not the thread: two
+                    # threads of one worker waiting on two stripes look like a
+                    # cycle to the kernel's deadlock check, which is not real
+                    if exc.errno != errno.EDEADLK:
+                        raise
+                    time.sleep(0.0005)
+        except BaseException:
+            self._locks[stripe].release()
+            raise
+
+    def _release(self, stripe: int) -> None:
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe)
+        self._locks[stripe].release()
+
+    @staticmethod
+    def _fingerprint(key) -> int:
+        fp = int.from_bytes(hashlib.blake2b(str(key).encode("utf-8"), digest_size=8).digest(), "little")
+        return fp if fp > _SHM_DELETED else fp + 2
+
+    def _bump(self, stripe: int, keys: int = 0, evictions: int = 0, expirations: int = 0) -> None:
+        off = _SHM_HEADER.size + stripe * _SHM_STRIPE.size
+        k, e, x = _SHM_STRIPE.unpack_from(self._mm, off)
+        _SHM_STRIPE.pack_into(self._mm, off, k + keys, e + evictions, x + expirations)
+
+    def _find(self, stripe: int, fp: int, create: bool):
+        """
+        Returns (offset, found). For create=True and a missing key the offset
+        is a free slot, or the victim to overwrite (its fingerprint is then
+        neither empty nor deleted).
+        """
+        mm = self._mm
+        base = self._data + stripe * self._stripe_bytes
+        mask = self._per_stripe - 1
+        i = (fp >> 16) & mask
+        free = victim = None
+        victim_head = 0
+        for _ in range(min(_SHM_PROBE, self._per_stripe)):
+            off = base + i * _SHM_RECORD.size
+            f = _SHM_FP.unpack_from(mm, off)[0]
+            if f == fp:
+                return off, True
+            if f == _SHM_EMPTY:
+                if free is None:
+                    free = off
+                break
+            if f == _SHM_DELETED:
+                if free is None:
+                    free = off
+            elif create and free is None:
+                head = _SHM_HEAD.unpack_from(mm, off + 16)[0]
+                if victim is None or head < victim_head:
+                    victim, victim_head = off, head
+            i = (i + 1) & mask
+        if not create:
+            return None, False
+        return (free if free is not None else victim), False
+
+    def _load(self, off: int) -> _BucketRecord:
+        rec = _BucketRecord()
+        _, rec.lockout_until, rec.head, rec.total = _SHM_FIELDS.unpack_from(self._mm, off)
+        rec.buckets = array("H", self._mm[off + _SHM_RING.start:off + _SHM_RING.stop])
+        return rec
+
+    def _store(self, off: int, fp: int, rec: _BucketRecord) -> None:
+        _SHM_FIELDS.pack_into(self._mm, off, fp, rec.lockout_until, rec.head, rec.total)
+        self._mm[off + _SHM_RING.start:off + _SHM_RING.stop] = rec.buckets.tobytes()
+
+    def observe(self, key: str, now: float, record: bool,
+                window_sec: int, lock_after: int, lockout_sec: int):
+        fp = self._fingerprint(key)
+        stripe = fp % self.stripes
+        self._acquire(stripe)
+        try:
+            off, found = self._find(stripe, fp, create=record)
+            if found:
+                rec = self._load(off)
+            elif not record:
+                return 0, 0.0, False
+            else:
+                if _SHM_FP.unpack_from(self._mm, off)[0] > _SHM_DELETED:
+                    self._bump(stripe, evictions=1)
+                else:
+                    self._bump(stripe, keys=1)
+                rec = _BucketRecord()
+
+            failures = rec.count(now, window_sec, record)
+
+            armed = failures >= lock_after and now >= rec.lockout_until
+            if armed:
+                rec.lockout_until = now + lockout_sec
+            elif not failures and now >= rec.lockout_until:
+                _SHM_FP.pack_into(self._mm, off, _SHM_DELETED)
+                self._bump(stripe, keys=-1, expirations=1)
+                return failures, rec.lockout_until, False
+            self._store(off, fp, rec)
+            return failures, rec.lockout_until, armed
+        finally:
+            self._release(stripe)
+
+    def reset(self, key: str) -> None:
+        fp = self._fingerprint(key)
+        stripe = fp % self.stripes
+        self._acquire(stripe)
+        try:
+            off, found = self._find(stripe, fp, create=False)
+            if found:
+                _SHM_FP.pack_into(self._mm, off, _SHM_DELETED)
+                self._bump(stripe, keys=-1)
+        finally:
+            self._release(stripe)
+
+    def sweep(self, now: float, window_sec: int) -> int:
+        """
+        Delete idle records. Every worker runs a sweeper; one sweep per
+        sweep_gap_sec is enough for the shared table, so the others skip.
+        Stripes are swept one at a time, yielding in between.
+        """
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, _SHM_SWEEP_LOCK)
+        except OSError:
+            return 0  # another worker is sweeping
+        try:
+            last = _SHM_HEADER.unpack_from(self._mm, 0)[4]
+            if now - last < self.sweep_gap_sec:
+                return 0
+            struct.pack_into("<d", self._mm, _SHM_HEADER.size - 8, now)
+
+            buckets = _BucketRecord.BUCKETS
+            epoch_now = int(now * buckets // window_sec)
+            total = 0
+            for stripe in range(self.stripes):
+                base = self._data + stripe * self._stripe_bytes
+                expired = 0
+                self._acquire(stripe)
+                try:
+                    for off in range(base, base + self._stripe_bytes, _SHM_RECORD.size):
+                        fp, until, head, _ = _SHM_FIELDS.unpack_from(self._mm, off)
+                        if fp <= _SHM_DELETED or now < until:
+                            continue
+                        if epoch_now - head < buckets:
+                            continue  # failures still in the window
+                        _SHM_FP.pack_into(self._mm, off, _SHM_DELETED)
+                        expired += 1
+                    if expired:
+                        self._bump(stripe, keys=-expired, expirations=expired)
+                finally:
+                    self._release(stripe)
+                total += expired
+                time.sleep(0)  # let request threads/greenlets in between stripes
+            return total
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, _SHM_SWEEP_LOCK)
+
+    def export(self, now: float, window_sec: int, encode, batch: int = 1024):
+        """Like MemoryBackend.export, keyed by fingerprint: `batch` slots per lock hold."""
+        step = batch * _SHM_RECORD.size
+        for stripe in range(self.stripes):
+            base = self._data + stripe * self._stripe_bytes
+            for start in range(base, base + self._stripe_bytes, step):
+                out = []
+                self._acquire(stripe)
+                try:
+                    for off in range(start, min(start + step, base + self._stripe_bytes), _SHM_RECORD.size):
+                        fp = _SHM_FP.unpack_from(self._mm, off)[0]
+                        if fp > _SHM_DELETED:
+                            rec = self._load(off)
+                            if _live(rec, now, window_sec):
+                                out.append(encode(fp, rec))
+                finally:
+                    self._release(stripe)
+                yield out
+                time.sleep(0)
+
+    def restore(self, items, now: float, window_sec: int) -> int:
+        """
+        Load (fingerprint, record) pairs from a snapshot, dropping expired ones.
+        Only the worker that created the table restores: the others joined a
+        table that is already live.
+        """
+        if not self.created:
+            return 0
+        restored = 0
+        for fp, rec in items:
+            if not _live(rec, now, window_sec):
+                continue
+            stripe = fp % self.stripes
+            self._acquire(stripe)
+            try:
+                off, found = self._find(stripe, fp, create=True)
+                if found:
+                    if not _stronger(rec, self._load(off), now, window_sec):
+                        continue
+                elif _SHM_FP.unpack_from(self._mm, off)[0] > _SHM_DELETED:
+                    self._bump(stripe, evictions=1)
+                else:
+                    self._bump(stripe, keys=1)
+                self._store(off, fp, rec)
+            finally:
+                self._release(stripe)
+            restored += 1
+        return restored
+
+    def stats(self) -> dict:
+        keys = evictions = expirations = 0
+        for stripe in range(self.stripes):
+            k, e, x = _SHM_STRIPE.unpack_from(self._mm, _SHM_HEADER.size + stripe * _SHM_STRIPE.size)
+            keys, evictions, expirations = keys + k, evictions + e, expirations + x
+        return {
+            "keys": keys,
+            "max_keys": self.max_keys,
+            "evictions": evictions,
+            "expirations": expirations,
+        }
+
+
+# KEYS[1] = sorted set of failure timestamps, KEYS[2] = lockout-until
+# ARGV    = now, record (0/1), window_sec, lock_after, lockout_sec, member
+_OBSERVE_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. (now - window))
+if ARGV[2] == '1' then
+  redis.call('ZADD', KEYS[1], now, ARGV[6])
+  redis.call('EXPIRE', KEYS[1], math.ceil(window))
+end
+local failures = redis.call('ZCARD', KEYS[1])
+local untilts = tonumber(redis.call('GET', KEYS[2]) or '0')
+local armed = 0
+if failures >= tonumber(ARGV[4]) and now >= untilts then
+  local lockout = tonumber(ARGV[5])
+  untilts = now + lockout
+  armed = 1
+  redis.call('SET', KEYS[2], string.format('%.6f', untilts), 'EX', math.ceil(lockout))
+end
+return {failures, string.format('%.6f', untilts), armed}
+"""
+
+class RedisBackend:
+    """
+    Cluster-wide storage shared by all replicas and workers.
+    Record + prune + count + lockout run as one server-side script, so every
+    login costs a single round-trip and concurrent workers never race.
+
+    A Redis outage does not fail logins: on a Redis error the worker fails
+    open to a local MemoryBackend (`fallback`), logs it once, and counts
+    the calls it answered in stats(). Counts are then per worker and
+    lockouts held in Redis are not seen. Redis is tried again after
+    retry_sec.
+    """
+
+    def __init__(self, client, prefix: str = "fdp:defense", fallback=None, retry_sec: float = 5.0):
+        if RedisError is None:
+            raise RuntimeError("DEFENSE_BACKEND=redis requires the 'redis' package")
+        self.client = client
+        self.prefix = prefix
+        self.fallback = fallback if fallback is not None else MemoryBackend()
+        self.retry_sec = retry_sec
+        self._observe = client.register_script(_OBSERVE_LUA)
+        self._down_until = 0.0  # monotonic; Redis is skipped until then
+        self._degraded = False
+        self.errors = 0     # Redis calls that failed
+        self.fallbacks = 0  # observe() calls answered by the fallback
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "fdp:defense", timeout_sec: float = 0.5,
+                 fallback=None) -> "RedisBackend":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("DEFENSE_BACKEND=redis requires the 'redis' package") from e
+        client = redis.Redis.from_url(url, socket_timeout=timeout_sec, socket_connect_timeout=timeout_sec)
+        return cls(client, prefix=prefix, fallback=fallback)
+
+    def _redis_up(self) -> bool:
+        return not self._degraded or time.monotonic() >= self._down_until
+
+    def _failed(self, e: Exception) -> None:
+        self.errors += 1
+        self._down_until = time.monotonic() + self.retry_sec
+        if not self._degraded:
+            self._degraded = True
+            log.warning("defense Redis unavailable (%s); counting failed logins per worker", e)
+
+    def _recovered(self) -> None:
+        if self._degraded:
+            self._degraded = False
+            log.info("defense Redis reachable again")
+
+    def _keys(self, key: str):
+        # Hash tag keeps both keys of one client in the same cluster slot
+        return f"{self.prefix}:{{{key}}}:hits", f"{self.prefix}:{{{key}}}:lock"
+
+    def observe(self, key: str, now: float, record: bool,
+                window_sec: int, lock_after: int, lockout_sec: int):
+        if self._redis_up():
+            member = f"{now:.6f}:{uuid.uuid4().hex[:8]}"
+            try:
+                failures, until, armed = self._observe(
+                    keys=self._keys(key),
+                    args=[repr(now), "1" if record else "0", window_sec, lock_after, lockout_sec, member],
+                )
+            except RedisError as e:
+                self._failed(e)
+            else:
+                self._recovered()
+                return int(failures), float(until), bool(armed)
+        self.fallbacks += 1
+        return self.fallback.observe(key, now, record, window_sec, lock_after, lockout_sec)
+
+    def reset(self, key: str) -> None:
+        self.fallback.reset(key)
+        if self._redis_up():
+            try:
+                self.client.delete(*self._keys(key))
+            except RedisError as e:
+                self._failed(e)
+            else:
+                self._recovered()
+
+    def sweep(self, now: float, window_sec: int) -> int:
+        # Redis expires idle keys by itself (EXPIRE / SET EX); only the fallback needs sweeping
+        return self.fallback.sweep(now, window_sec)
+
+    def stats(self) -> dict:
+        return {
+            "redis_degraded": self._degraded,
+            "redis_errors": self.errors,
+            "redis_fallbacks": self.fallbacks,
+            "keys": self.fallback.stats()["keys"],  # local fallback entries only
+        }
+
+
 class LoginDefense:
     """
-    In-memory (per pod) defense state machine keyed by a stable client key.
-    Uses LoginPolicy as the single source of truth for thresholds.
+    Defense state machine keyed by a stable client key.
+    Uses LoginPolicy as the single source of truth for thresholds; counts
+    live in a pluggable backend (per-process memory or shared Redis).
     """
 
-    def __init__(self, policy, window_sec: int = 900, soft_lockout_sec: int = 300):
+    def __init__(self, policy, window_sec: int = 900, soft_lockout_sec: int = 300, backend=None):
         self.policy = policy
         self.window_sec = window_sec
         self.soft_lockout_sec = soft_lockout_sec
+        self.backend = backend if backend is not None else MemoryBackend()
 
-        self._hits = defaultdict(lambda: deque())  # key -> deque[timestamps]
-        self._lockout_until = {}                   # key -> unix ts
-
-    def _prune(self, key: str) -> None:
+    def _observe(self, key: str, record: bool) -> DefenseState:
         now = time.time()
-        q = self._hits[key]
-        while q and (now - q[0]) > self.window_sec:
-            q.popleft()
-
-    def state(self, key: str) -> DefenseState:
-        now = time.time()
-        self._prune(key)
-
-        failures = len(self._hits[key])
+        # Simulate block/lockout at policy.block_after_failure, e.g. 7th failure
+        failures, until, armed = self.backend.observe(
+            key, now, record,
+            self.window_sec, self.policy.block_after_failure, self.soft_lockout_sec,
+        )
 
-        until = self._lockout_until.get(key, 0)
         locked = now < until
-        left = int(until - now) if locked else 0
+        # never "locked out, 0s left": the client would retry straight into the lockout.
+        # Rounded first: (now + lockout) - now is not exactly lockout in floats, and
+        # Redis stores the deadline to the microsecond, so ceil() alone gives 301s.
+        left = max(1, math.ceil(round(until - now, 3))) if locked else 0
 
         # Captcha starts at (policy.captcha_start_failure), e.g. 5th failure
         captcha_required = failures >= self.policy.captcha_start_failure
 
-        # Simulate block/lockout at policy.block_after_failure, e.g. 7th failure
-        if failures >= self.policy.block_after_failure and not locked:
-            self._lockout_until[key] = now + self.soft_lockout_sec
-            locked = True
-            left = int(self.soft_lockout_sec)
+        if record and failures == self.policy.captcha_start_failure:
+            DEFENSE_TRANSITIONS.inc("captcha")
+        if armed:
+            DEFENSE_TRANSITIONS.inc("lockout")
 
         return DefenseState(
             failures=failures,
@@ -55,12 +741,17 @@ class LoginDefense:
             lockout_seconds_left=left,
         )
 
+    def state(self, key: str) -> DefenseState:
+        return self._observe(key, record=False)
+
     def record_failure(self, key: str) -> DefenseState:
-        self._prune(key)
-        self._hits[key].append(time.time())
-        return self.state(key)
+        return self._observe(key, record=True)
 
     def reset(self, key: str) -> None:
-        self._hits.pop(key, None)
-        self._lockout_until.pop(key, None)
+        self.backend.reset(key)
+
+    def sweep(self) -> int:
+        return self.backend.sweep(time.time(), self.window_sec)
 
+    def stats(self) -> dict:
+        return self.backend.stats()
@@ -0,0 +1,52 @@
+import re
+
+from flask import Flask, render_template
+from markupsafe import Markup, escape
+
+_SLOT = "\x00slot:{}\x00"
+_SLOT_RE = re.compile("\x00slot:(\\w+)\x00")
+
+
+class PageCache:
+    """
+    Renders each registered page once per process (the "shell": layout,
+    branding, static URLs) and afterwards only fills in its dynamic slots.
+
+    A slot is a template variable that is only printed ({{ name }}), never
+    tested or filtered. Slot values are escaped unless they are Markup, so
+    pre-rendered fragments (see partial()) are inserted as-is.
+    """
+
+    def __init__(self, app: Flask, enabled: bool = True):
+        self.app = app
+        self.enabled = enabled
+        self._slots = {}   # template -> slot names
+        self._static = {}  # template -> context that never changes per request
+        self._shells = {}  # template -> tuple(text, slot, text, slot, ..., text)
+
+    def register(self, template: str, slots, **static_ctx) -> None:
+        self._slots[template] = tuple(slots)
+        self._static[template] = static_ctx
+
+    def warm(self) -> None:
+        """Build all shells up front so the first request after start is not slow."""
+        if not self.enabled:
+            return
+        with self.app.test_request_context("/"):
+            for template, slots in self._slots.items():
+                markers = {s: Markup(_SLOT.format(s)) for s in slots}
+                html = render_template(template, **self._static[template], **markers)
+                self._shells[template] = tuple(_SLOT_RE.split(html))
+
+    def partial(self, template: str, **ctx) -> Markup:
+        """Render a small fragment template without the full Flask render path."""
+        return Markup(self.app.jinja_env.get_template(template).render(**ctx))
+
+    def render(self, template: str, **values) -> str:
+        shell = self._shells.get(template)
+        if shell is None:
+            return render_template(template, **self._static.get(template, {}), **values)
+        out = list(shell)
+        for i in range(1, len(out), 2):
+            out[i] = escape(values.get(out[i], ""))
+        return "".join(out)
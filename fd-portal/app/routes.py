@@ -1,42 +1,33 @@
 import secrets
-import random
-from flask import Blueprint, request, session, redirect, url_for, render_template
+from flask import Blueprint, current_app, request, session, redirect, url_for
 
+import admission
+from edge import client_ip
+from keystone import InvalidCredentials, KeystoneUnavailable
+from ratelimit import DefenseState
 
-def _client_key() -> str:
+# State of a browser that has never posted the login form
+_NO_HISTORY = DefenseState(failures=0, captcha_required=False, locked_out=False, lockout_seconds_left=0)
+
+
+def _client_key(create: bool = True):
     """
     Stable per-browser key stored in the session cookie.
     Avoids incorrect counting when client IP is NATed/changes via Octavia/kube-proxy.
+    With create=False a missing key is not minted (returns None), so an
+    anonymous GET leaves the session untouched and sends no Set-Cookie.
     """
-    if "client_id" not in session:
-        session["client_id"] = secrets.token_urlsafe(16)
-    return session["client_id"]
-
-def _client_ip(trust_xff: bool) -> str:
-    """
-    Best-effort client IP for future IP-based blocking/logging.
-    Note: behind Octavia/kube-proxy the true client IP may be lost unless
-    externalTrafficPolicy=Local or X-Forwarded-For is trustworthy.
-    """
-    if trust_xff:
-        xff = request.headers.get("X-Forwarded-For", "")
-        if xff:
-            return xff.split(",")[0].strip()
-    return request.remote_addr or "unknown"
-
-def _ensure_captcha():
-    if "captcha_q" in session and "captcha_a" in session:
-        return
-    a = random.randint(2, 9)
-    b = random.randint(2, 9)
-    session["captcha_q"] = f"What is {a} + {b}?"
-    session["captcha_a"] = str(a + b)
-
-
-def _clear_captcha():
-    session.pop("captcha_q", None)
-    session.pop("captcha_a", None)
-
+    key = session.get("client_id")
+    if key is None and create:
+        key = session["client_id"] = secrets.token_urlsafe(16)
+    return key
+
+def _end_session() -> None:
+    # Keep client_id stable across logout/login cycles
+    client_id = session.get("client_id")
+    session.clear()
+    if client_id:
+        session["client_id"] = client_id
 
 def _ui_for_state(policy, state):
     """
@@ -72,116 +63,175 @@ def _ui_for_state(policy, state):
     return (None, None, require_captcha, None)
 
 
-def build_blueprint(settings, keystone_client, defense):
+def _retry_after(state) -> dict:
+    """Retry-After for a lockout 429 (seconds left, never 0); no header otherwise."""
+    return {"Retry-After": str(state.lockout_seconds_left)} if state.locked_out else {}
+
+
+def _admission_priority(state, hot: bool) -> int:
+    """Clean clients reach Keystone ahead of those already in the captcha phase."""
+    if state.captcha_required or hot:
+        return admission.LOW
+    return admission.NORMAL if state.failures else admission.HIGH
+
+
+def build_blueprint(settings, keystone_client, defense, pages, captchas, lockouts=None, usernames=None,
+                    tokens=None, blocklist=None):
     bp = Blueprint("fd", __name__)
     policy = settings.login_policy
 
+    def _note_lockout(state):
+        if not state.locked_out:
+            return
+        ip = request.environ.get("fdp.client_ip") or client_ip(request.environ, settings.trust_x_forwarded_for)
+        # Let the edge filter answer this client's next login POSTs before Flask
+        if lockouts is not None:
+            lockouts.lock(
+                request.cookies.get(current_app.config["SESSION_COOKIE_NAME"]),
+                ip,
+                state.lockout_seconds_left,
+            )
+        # ... and the kernel drop them before TLS
+        if blocklist is not None:
+            blocklist.block(ip, state.lockout_seconds_left)
+
+    def _login_page(error, warning, warning_class, captcha_required):
+        alert = ""
+        if error or warning:
+            alert = pages.partial(
+                "_login_alert.html", error=error, warning=warning, warning_class=warning_class
+            )
+        captcha = ""
+        if captcha_required:
+            # fresh signed challenge per page, bound to this browser's client_id;
+            # nothing is stored in the session
+            question, token = captchas.issue(session.get("client_id") or "")
+            captcha = pages.partial(
+                "_login_captcha.html",
+                captcha_required=True,
+                captcha_question=question,
+                captcha_token=token,
+            )
+        return pages.render("login.html", alert_html=alert, captcha_html=captcha)
+
     @bp.get("/")
     def home():
         if not session.get("logged_in"):
             return redirect(url_for("fd.login"))
-        return render_template(
-            "home.html",
-            username=session.get("username"),
-            horizon_url=settings.horizon_url,
-            skyline_url=settings.skyline_url,
-        )
+        sealed = session.get("ks_token")
+        if tokens is not None and sealed and not tokens.valid(sealed, session.get("ks_expires", 0.0)):
+            # Keystone token expired or revoked: the portal session ends with it
+            _end_session()
+            return redirect(url_for("fd.login"))
+        return pages.render("home.html", username=session.get("username"))
 
     @bp.route("/login", methods=["GET", "POST"])
     def login():
-        key = _client_key()
-        st = defense.state(key)
-        ip = _client_ip(settings.trust_x_forwarded_for)
+        key = _client_key(create=request.method == "POST")
+        st = defense.state(key) if key else _NO_HISTORY
 
         warn, warn_class, require_captcha, locked_status = _ui_for_state(policy, st)
-        if require_captcha:
-            _ensure_captcha()
 
         if request.method == "GET":
-            return render_template(
-                "login.html",
+            return _login_page(
                 error=None,
                 warning=warn,
                 warning_class=warn_class,
                 captcha_required=require_captcha,
-                captcha_question=session.get("captcha_q"),
             )
 
         # POST
         if st.locked_out:
-            return render_template(
-                "login.html",
+            _note_lockout(st)
+            return _login_page(
                 error=None,
                 warning=warn,
                 warning_class=warn_class or "danger",
                 captcha_required=True,
-                captcha_question=session.get("captcha_q"),
-            ), (locked_status or 429)
+            ), (locked_status or 429), _retry_after(st)
+
+        username = request.form.get("username", "").strip()
+        password = request.form.get("password", "")
+
+        # A username under distributed attack needs a captcha from every client
+        hot = usernames is not None and bool(username) and usernames.is_hot(username)
+        if hot and not require_captcha:
+            require_captcha = True
+            if "captcha_token" not in request.form:
+                # the client has not been shown a challenge yet: not a failed attempt
+                return _login_page(
+                    error=policy.msg_captcha_required,
+                    warning=warn,
+                    warning_class=warn_class,
+                    captcha_required=True,
+                ), 401
 
         # Captcha validation if required
         if require_captcha:
             user_captcha = request.form.get("captcha", "").strip()
-            expected = session.get("captcha_a", "")
-            if not user_captcha or user_captcha != expected:
+            token = request.form.get("captcha_token", "")
+            if not user_captcha or not captchas.verify(token, user_captcha, key):
                 st2 = defense.record_failure(key)
-                _ensure_captcha()
+                _note_lockout(st2)
                 w2, wc2, req2, locked2 = _ui_for_state(policy, st2)
-                return render_template(
-                    "login.html",
+                return _login_page(
                     error="Incorrect captcha.",
                     warning=w2,
                     warning_class=wc2 or "danger",
-                    captcha_required=req2 and not st2.locked_out,
-                    captcha_question=session.get("captcha_q"),
-                ), (locked2 or 401)
-
-        username = request.form.get("username", "").strip()
-        password = request.form.get("password", "")
+                    captcha_required=(req2 or hot) and not st2.locked_out,
+                ), (locked2 or 401), _retry_after(st2)
 
         if not username or not password:
-            return render_template(
-                "login.html",
+            return _login_page(
                 error="Missing username/password",
                 warning=warn,
                 warning_class=warn_class,
                 captcha_required=require_captcha,
-                captcha_question=session.get("captcha_q"),
             ), 400
 
         # Keystone auth
         try:
-            keystone_client.validate_password(username, password)
-        except Exception:
+            with admission.priority(_admission_priority(st, hot)):
+                ks_token = keystone_client.validate_password(username, password)
+        except KeystoneUnavailable as e:
+            # Fast-fail: Keystone was not asked, so this is not a failed attempt
+            return _login_page(
+                error=policy.msg_unavailable,
+                warning=warn,
+                warning_class=warn_class,
+                captcha_required=require_captcha,
+            ), 503, {"Retry-After": str(e.retry_after)}
+        except Exception as e:
             st2 = defense.record_failure(key)
-            if st2.captcha_required:
-                _ensure_captcha()
+            _note_lockout(st2)
+            if usernames is not None and isinstance(e, InvalidCredentials):
+                hot = usernames.record_failure(username) >= usernames.threshold
             w2, wc2, req2, locked2 = _ui_for_state(policy, st2)
 
-            return render_template(
-                "login.html",
+            return _login_page(
                 error=policy.msg_invalid_generic,   # "Invalid credentials."
                 warning=w2,
                 warning_class=wc2,
-                captcha_required=req2 and not st2.locked_out,
-                captcha_question=session.get("captcha_q"),
-            ), (locked2 or 401)
+                captcha_required=(req2 or hot) and not st2.locked_out,
+            ), (locked2 or 401), _retry_after(st2)
 
         # SUCCESS
         defense.reset(key)
-        _clear_captcha()
 
         # Do NOT session.clear() (it would delete client_id and break counting consistency)
         session["logged_in"] = True
         session["username"] = username
+        if tokens is not None and ks_token is not None:
+            session["ks_token"] = tokens.seal(ks_token)
+            session["ks_expires"] = ks_token.expires_at
         return redirect(url_for("fd.home"))
 
     @bp.post("/logout")
     def logout():
-        # Keep client_id stable across logout/login cycles
-        client_id = session.get("client_id")
-        session.clear()
-        if client_id:
-            session["client_id"] = client_id
+        sealed = session.get("ks_token")
+        if tokens is not None and sealed:
+            tokens.revoke(sealed)
+        _end_session()
         return redirect(url_for("fd.login"))
 
     return bp
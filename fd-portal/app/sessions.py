@@ -0,0 +1,202 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+
+
+class LazySession(SessionMixin):
+    """
+    Server-side session whose data is fetched from the store on first
+    access only. Requests that never touch `session` (assets, metrics,
+    anonymous redirects) cost no lookup; `modified` is set by writes alone.
+    """
+
+    def __init__(self, store, sid=None):
+        self.store = store
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self._data = None
+
+    def _load(self) -> dict:
+        self.accessed = True
+        if self._data is None:
+            data = self.store.load(self.sid) if self.sid else None
+            self._data = data if data is not None else {}
+        return self._data
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __contains__(self, key):
+        return key in self._load()
+
+    def get(self, key, default=None):
+        return self._load().get(key, default)
+
+    def clear(self):
+        data = self._load()
+        if data:
+            data.clear()
+            self.modified = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Keeps session data in a store; the cookie only carries a signed, opaque
+    session id. Unmodified sessions are never written and get no Set-Cookie.
+    Every write moves the data to a fresh id (and drops the old one), so an
+    id seen before login is useless afterwards.
+    """
+
+    def __init__(self, store, secret: bytes):
+        self.store = store
+        self._signer = Signer(secret, salt="fd-portal session id")
+
+    def open_session(self, app, request):
+        raw = request.cookies.get(self.get_cookie_name(app))
+        sid = None
+        if raw:
+            try:
+                sid = self._signer.unsign(raw).decode("ascii")
+            except BadSignature:
+                sid = None
+        return LazySession(self.store, sid)
+
+    def save_session(self, app, session, response):
+        if session.accessed:
+            response.vary.add("Cookie")
+        if not session.modified:
+            return
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.sid:
+            self.store.delete(session.sid)
+        if not session:
+            if session.sid:
+                response.delete_cookie(
+                    name, domain=domain, path=path, secure=secure,
+                    samesite=samesite, httponly=httponly,
+                )
+            return
+
+        sid = secrets.token_urlsafe(32)
+        self.store.save(sid, dict(session))
+        response.set_cookie(
+            name,
+            self._signer.sign(sid).decode("ascii"),
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite,
+        )
+
+
+class MemorySessionStore:
+    """
+    Per-process LRU store. Sessions live in one worker only, so use it with
+    a single worker (e.g. one gevent worker per pod) or switch to Redis.
+    Expired entries are dropped when read or pushed out by the LRU bound.
+    """
+
+    def __init__(self, ttl_sec: int = 43200, max_entries: int = 100_000):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # sid -> (expires, data), least recently used first
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def load(self, sid: str):
+        with self._lock:
+            item = self._entries.get(sid)
+            if item is None:
+                return None
+            expires, data = item
+            if expires < time.time():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+        # callers mutate the dict they get; the stored copy changes on save() only
+        return dict(data)
+
+    def save(self, sid: str, data: dict) -> None:
+        with self._lock:
+            self._entries[sid] = (time.time() + self.ttl_sec, data)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+        }
+
+
+class RedisSessionStore:
+    """Shared store for all workers and replicas; Redis expires idle sessions."""
+
+    def __init__(self, client, ttl_sec: int = 43200, prefix: str = "fdp:session"):
+        self.client = client
+        self.ttl_sec = ttl_sec
+        self.prefix = prefix
+        self._serializer = TaggedJSONSerializer()
+
+    @classmethod
+    def from_url(cls, url: str, ttl_sec: int = 43200, prefix: str = "fdp:session") -> "RedisSessionStore":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SESSION_BACKEND=redis requires the 'redis' package") from e
+        return cls(redis.Redis.from_url(url), ttl_sec=ttl_sec, prefix=prefix)
+
+    def load(self, sid: str):
+        raw = self.client.get(f"{self.prefix}:{sid}")
+        if raw is None:
+            return None
+        try:
+            return self._serializer.loads(raw)
+        except ValueError:
+            return None
+
+    def save(self, sid: str, data: dict) -> None:
+        self.client.set(f"{self.prefix}:{sid}", self._serializer.dumps(data), ex=self.ttl_sec)
+
+    def delete(self, sid: str) -> None:
+        self.client.delete(f"{self.prefix}:{sid}")
+
+    def stats(self) -> dict:
+        return {}
@@ -0,0 +1,171 @@
+import hashlib
+import hmac
+import os
+import secrets
+import struct
+import sys
+import threading
+import time
+from array import array
+
+
+def username_label(secret: bytes, username: str) -> str:
+    """
+    Metric label for a username: a truncated keyed hash of its case-folded
+    form. Workers and replicas sharing the secret agree on it, so a series
+    can be followed and summed, but a scrape does not reveal which accounts
+    are under attack (nor can labels be matched against a wordlist).
+    """
+    key = hmac.new(secret, b"fd-portal username label v1", hashlib.sha256).digest()
+    return hashlib.blake2b(username.casefold().encode("utf-8"), digest_size=6, key=key).hexdigest()
+
+
+class UsernameSketch:
+    """
+    Failed logins per username over a sliding window, in fixed memory, to
+    spot credential stuffing that rotates IPs and cookies but keeps hitting
+    the same accounts.
+
+    Counts live in a Count-Min sketch (depth rows x width uint32 counters,
+    conservative update). Two sketches rotate every window_sec, so an
+    estimate covers between one and two windows. The raw sketch minimum
+    never undercounts, but its collision noise grows with the number of
+    failures in the window (up to e/width x failures w.p. 1 - e^-depth), so
+    estimates subtract the mean collision load, failures / width. A flood
+    of distinct usernames then raises the bar for "hot" instead of making
+    every username hot. A top_k candidate table tracks the heaviest
+    usernames for metrics; it is the only per-username state.
+
+    Usernames are case-folded and hashed with a per-process key. A worker
+    forked from a preloaded master draws its own key, and starts from an
+    empty sketch, on first use.
+    """
+
+    def __init__(self, window_sec: int = 900, threshold: int = 20,
+                 width: int = 1 << 16, depth: int = 4, top_k: int = 10):
+        if width < 1 or width & (width - 1):
+            raise ValueError("width must be a power of two")
+        if not 1 <= depth <= 16:
+            raise ValueError("depth must be between 1 and 16")
+        self.window_sec = window_sec
+        self.threshold = threshold
+        self.width = width
+        self.depth = depth
+        self.top_k = top_k
+
+        self._pid = None
+        self._key = None
+        self._unpack = struct.Struct(f"<{depth}I").unpack
+        self._offsets = tuple(row * width for row in range(depth))
+        self._cur = self._empty()
+        self._prev = self._empty()
+        self._totals = [0, 0]  # failures recorded in cur, prev
+        self._epoch = int(time.time() // window_sec)
+        self._top = {}  # username -> estimate, at most top_k entries
+        self._lock = threading.Lock()
+
+    def _empty(self) -> array:
+        return array("I", bytes(4 * self.width * self.depth))
+
+    def _hash_key(self) -> bytes:
+        pid = os.getpid()
+        if self._pid != pid:  # first call in this (forked) process
+            with self._lock:
+                if self._pid != pid:
+                    # counts and candidates hashed under the old key mean nothing now
+                    self._key = secrets.token_bytes(16)
+                    self._cur = self._empty()
+                    self._prev = self._empty()
+                    self._totals = [0, 0]
+                    self._top = {}
+                    self._pid = pid
+        return self._key
+
+    def _cells(self, username: str):
+        digest = hashlib.blake2b(
+            username.encode("utf-8"), digest_size=4 * self.depth, key=self._hash_key()
+        ).digest()
+        mask = self.width - 1
+        return [off + (h & mask) for off, h in zip(self._offsets, self._unpack(digest))]
+
+    def _rotate(self, now: float) -> None:
+        epoch = int(now // self.window_sec)
+        if epoch == self._epoch:
+            return
+        adjacent = epoch == self._epoch + 1
+        self._prev = self._cur if adjacent else self._empty()
+        self._cur = self._empty()
+        self._totals = [0, self._totals[0] if adjacent else 0]
+        self._epoch = epoch
+        top = {}
+        for name in self._top:
+            est = self._estimate(self._cells(name))
+            if est:
+                top[name] = est
+        self._top = top
+
+    def _estimate(self, cells) -> int:
+        cur, prev = self._cur, self._prev
+        raw = min(cur[c] for c in cells) + min(prev[c] for c in cells)
+        return max(0, raw - (self._totals[0] + self._totals[1]) // self.width)
+
+    def record_failure(self, username: str, now: float = None) -> int:
+        """Count one failed login; returns the new estimate."""
+        name = username.casefold()
+        cells = self._cells(name)
+        now = time.time() if now is None else now
+        with self._lock:
+            self._rotate(now)
+            cur = self._cur
+            low = min(cur[c] for c in cells)
+            if low < 0xFFFFFFFF:
+                # conservative update: only the counters at the minimum grow
+                for c in cells:
+                    if cur[c] == low:
+                        cur[c] = low + 1
+            self._totals[0] += 1
+            est = self._estimate(cells)
+
+            top = self._top
+            if not est:
+                return est
+            if name in top or len(top) < self.top_k:
+                top[name] = est
+            else:
+                weakest = min(top, key=top.get)
+                if est > top[weakest]:
+                    del top[weakest]
+                    top[name] = est
+            return est
+
+    def count(self, username: str, now: float = None) -> int:
+        cells = self._cells(username.casefold())
+        with self._lock:
+            self._rotate(time.time() if now is None else now)
+            return self._estimate(cells)
+
+    def is_hot(self, username: str) -> bool:
+        """True once the username's failures in the window reach threshold."""
+        return self.count(username) >= self.threshold
+
+    def top(self):
+        """[(username, estimated failures), ...], heaviest first."""
+        self._hash_key()  # before the lock: _rotate() re-hashes the candidates
+        with self._lock:
+            self._rotate(time.time())
+            return sorted(self._top.items(), key=lambda kv: kv[1], reverse=True)
+
+    def stats(self) -> dict:
+        top = self.top()
+        return {
+            "memory_bytes": 2 * 4 * self.width * self.depth,
+            "hot_usernames": sum(1 for _, n in top if n >= self.threshold),
+            "top_estimate": top[0][1] if top else 0,
+        }
+
+
+if __name__ == "__main__":
+    # Operator helper: which fdp_username_failures series is this account?
+    if len(sys.argv) != 3 or sys.argv[1] != "label":
+        sys.exit("usage: FLASK_SECRET=... python sketch.py label <username>")
+    print(username_label(os.environ.get("FLASK_SECRET", "CHANGE_ME_LONG_RANDOM").encode("utf-8"), sys.argv[2]))
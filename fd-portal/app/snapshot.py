@@ -0,0 +1,202 @@
+import functools
+import gc
+import glob
+import logging
+import os
+import socket
+import struct
+import time
+from array import array
+from collections import deque
+
+from ratelimit import SharedMemoryBackend, _BucketRecord, _LogRecord
+
+log = logging.getLogger(__name__)
+
+_MAGIC = b"FDPSNAP1"
+_HEADER = struct.Struct("<8s8sIdI")  # magic, kind, window_sec, taken_at, records
+_KEY = struct.Struct("<H")           # utf-8 key length (memory backends)
+_FP = struct.Struct("<Q")            # key fingerprint (shared backend)
+_LOG = struct.Struct("<dH")          # lockout_until, number of failure ages (float32) that follow
+_RING = 2 * _BucketRecord.BUCKETS
+_BUCKETS = struct.Struct(f"<dqI{_RING}s")  # lockout_until, newest bucket epoch, total, ring
+
+
+def _kind(backend) -> str:
+    if isinstance(backend, SharedMemoryBackend):
+        return "shared"
+    return getattr(backend, "algorithm", "")
+
+
+class DefenseSnapshots:
+    """
+    Periodic snapshots of LoginDefense state to a compact binary file, and a
+    warm restore at startup, so a rollout or pod restart does not hand
+    locked-out clients a fresh budget.
+
+    - save() runs from a background task. The backend serialises its live
+      records in small batches under its stripe locks, yielding in between;
+      the file is written outside the locks and replaced atomically
+      (write, fsync, rename).
+    - Per-worker backends write one file per worker (<path>.<host>.<pid>);
+      the shared backend writes <path>.shared, at most once per
+      min_interval_sec across the pod's workers.
+    - restore() merges every matching file under the path (same backend
+      kind and window), keeping the stronger record per key and dropping
+      expired ones. Files older than window + lockout hold nothing live and
+      are deleted by save().
+
+    The path must be on a volume that outlives the pod for state to survive
+    a rollout; a ReadWriteMany volume shared by all pods also merges their
+    budgets on restore.
+    """
+
+    def __init__(self, defense, path: str, min_interval_sec: float = 0.0):
+        self.defense = defense
+        self.backend = defense.backend
+        self.path = path
+        self.min_interval_sec = min_interval_sec
+        self.kind = _kind(self.backend)
+        if self.kind not in ("log", "buckets", "shared") or not hasattr(self.backend, "export"):
+            raise ValueError("DEFENSE_SNAPSHOT_PATH needs DEFENSE_BACKEND=memory or shared")
+
+        self.saves = 0
+        self.saved_keys = 0
+        self.save_sec = 0.0
+        self.restored_keys = 0
+        self.restore_sec = 0.0
+
+    def _target(self) -> str:
+        if self.kind == "shared":
+            return f"{self.path}.shared"
+        return f"{self.path}.{socket.gethostname()}.{os.getpid()}"
+
+    def _files(self):
+        return [p for p in glob.glob(glob.escape(self.path) + ".*") if ".tmp-" not in p]
+
+    def _encode(self, key, rec, now: float) -> bytes:
+        if self.kind == "shared":
+            head = _FP.pack(key)
+        else:
+            raw = key.encode("utf-8")
+            head = _KEY.pack(len(raw)) + raw
+        if self.kind == "log":
+            ages = array("f", [now - t for t in rec.hits][-0xFFFF:])
+            return head + _LOG.pack(rec.lockout_until, len(ages)) + ages.tobytes()
+        return head + _BUCKETS.pack(rec.lockout_until, rec.head, rec.total, rec.buckets.tobytes())
+
+    def save(self) -> int:
+        """Write a snapshot; returns the number of records written."""
+        now = time.time()
+        target = self._target()
+        if self.min_interval_sec:
+            try:
+                if now - os.stat(target).st_mtime < self.min_interval_sec:
+                    return 0  # another worker just snapshotted the shared table
+            except FileNotFoundError:
+                pass
+
+        started = time.perf_counter()
+        window = self.defense.window_sec
+        tmp = f"{self.path}.tmp-{socket.gethostname()}.{os.getpid()}"
+        count = 0
+        try:
+            with open(tmp, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, self.kind.encode("ascii"), window, now, 0))
+                encode = functools.partial(self._encode, now=now)
+                for batch in self.backend.export(now, window, encode):
+                    f.write(b"".join(batch))
+                    count += len(batch)
+                f.seek(0)
+                f.write(_HEADER.pack(_MAGIC, self.kind.encode("ascii"), window, now, count))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, target)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self._prune(now)
+
+        self.saves += 1
+        self.saved_keys = count
+        self.save_sec = time.perf_counter() - started
+        return count
+
+    def _prune(self, now: float) -> None:
+        horizon = self.defense.window_sec + self.defense.soft_lockout_sec
+        for name in self._files():
+            try:
+                if now - os.stat(name).st_mtime > horizon:
+                    os.unlink(name)
+            except FileNotFoundError:
+                pass
+
+    def _records(self, name: str, data: bytes):
+        magic, kind, window, taken_at, count = _HEADER.unpack_from(data, 0)
+        kind = kind.rstrip(b"\0").decode("ascii")
+        if magic != _MAGIC or kind != self.kind or window != self.defense.window_sec:
+            log.warning("skipping defense snapshot %s (%s, window %ss)", name, kind, window)
+            return
+        mv = memoryview(data)
+        off = _HEADER.size
+        for _ in range(count):
+            if kind == "shared":
+                key = _FP.unpack_from(data, off)[0]
+                off += _FP.size
+            else:
+                n = _KEY.unpack_from(data, off)[0]
+                off += _KEY.size
+                key = str(mv[off:off + n], "utf-8")
+                off += n
+            if kind == "log":
+                rec = _LogRecord()
+                rec.lockout_until, n = _LOG.unpack_from(data, off)
+                off += _LOG.size
+                ages = array("f")
+                ages.frombytes(mv[off:off + 4 * n])
+                rec.hits = deque(taken_at - age for age in ages)
+                off += 4 * n
+            else:
+                rec = _BucketRecord()
+                rec.lockout_until, rec.head, rec.total, ring = _BUCKETS.unpack_from(data, off)
+                rec.buckets = array("H", ring)
+                off += _BUCKETS.size
+            yield key, rec
+
+    def restore(self) -> int:
+        """Load every snapshot under the path; returns the records kept."""
+        started = time.perf_counter()
+        now = time.time()
+        restored = 0
+        # startup only: records hold no cycles, and collections triggered by
+        # a million new objects would cost a quarter of the restore time
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for name in sorted(self._files()):
+                try:
+                    with open(name, "rb") as f:
+                        data = f.read()
+                    restored += self.backend.restore(self._records(name, data), now, self.defense.window_sec)
+                except (OSError, ValueError, struct.error):
+                    log.warning("could not restore defense snapshot %s", name, exc_info=True)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        self.restored_keys = restored
+        self.restore_sec = time.perf_counter() - started
+        if restored:
+            log.info("restored %d defense entries in %.2fs", restored, self.restore_sec)
+        return restored
+
+    def stats(self) -> dict:
+        return {
+            "saves": self.saves,
+            "saved_keys": self.saved_keys,
+            "save_seconds": self.save_sec,
+            "restored_keys": self.restored_keys,
+            "restore_seconds": self.restore_sec,
+        }
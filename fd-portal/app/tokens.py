@@ -0,0 +1,126 @@
+import base64
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # optional: only needed with KEYSTONE_TOKEN_REUSE
+    Fernet = InvalidToken = None
+
+log = logging.getLogger(__name__)
+
+
+class TokenVault:
+    """
+    Keeps the Keystone token of a successful login instead of discarding
+    it, as the basis for a Horizon/Skyline (WebSSO) handoff.
+
+    - seal(): the token is encrypted with Fernet under a key derived from
+      the app secret and then stored in the server-side session. Plaintext
+      tokens are never stored and never sent to the browser.
+    - valid(): checks whether a portal session is still backed by a live
+      token without re-hashing a password. Expiry is checked locally.
+      Keystone is asked (GET /auth/tokens, no password) at most once per
+      revalidate_sec per token, and the verdicts are cached per worker.
+      If Keystone cannot be reached, the session is kept and the check is
+      retried shortly.
+    - revoke(): logout revokes the token at Keystone (best effort).
+    """
+
+    def __init__(self, client, secret: bytes, revalidate_sec: int = 300,
+                 expiry_skew_sec: int = 60, max_entries: int = 100_000):
+        if Fernet is None:
+            raise RuntimeError("KEYSTONE_TOKEN_REUSE requires the 'cryptography' package")
+        key = hmac.new(secret, b"fd-portal keystone token v1", hashlib.sha256).digest()
+        self._fernet = Fernet(base64.urlsafe_b64encode(key))
+        self.client = client
+        self.revalidate_sec = revalidate_sec
+        self.expiry_skew_sec = expiry_skew_sec
+        self.max_entries = max_entries
+
+        self._next_check = OrderedDict()  # sealed token -> unix ts, least recently checked first
+        self._lock = threading.Lock()
+
+        self.hits = 0         # answered from the cache
+        self.validations = 0  # GET /auth/tokens calls
+        self.rejected = 0     # expired or revoked
+        self.errors = 0       # Keystone unreachable during a check
+
+    def seal(self, token) -> str:
+        return self._fernet.encrypt(token.token.encode("utf-8")).decode("ascii")
+
+    def unseal(self, sealed: str):
+        """Plaintext token for a handoff; None if it does not decrypt."""
+        try:
+            return self._fernet.decrypt(sealed.encode("ascii")).decode("utf-8")
+        except (InvalidToken, ValueError):
+            return None
+
+    def _remember(self, sealed: str, until: float) -> None:
+        with self._lock:
+            self._next_check[sealed] = until
+            self._next_check.move_to_end(sealed)
+            while len(self._next_check) > self.max_entries:
+                self._next_check.popitem(last=False)
+
+    def _forget(self, sealed: str) -> None:
+        with self._lock:
+            self._next_check.pop(sealed, None)
+
+    def valid(self, sealed: str, expires_at: float) -> bool:
+        now = time.time()
+        if expires_at and now >= expires_at - self.expiry_skew_sec:
+            self._forget(sealed)
+            self.rejected += 1
+            return False
+        with self._lock:
+            next_check = self._next_check.get(sealed)
+        if next_check is not None and now < next_check:
+            self.hits += 1
+            return True
+
+        token = self.unseal(sealed)
+        if token is None:
+            self.rejected += 1
+            return False
+        self.validations += 1
+        try:
+            info = self.client.validate_token(token)
+        except Exception:
+            log.warning("Keystone token validation failed", exc_info=True)
+            self.errors += 1
+            self._remember(sealed, now + min(30, self.revalidate_sec))
+            return True
+        if info is None:
+            self._forget(sealed)
+            self.rejected += 1
+            return False
+
+        until = now + self.revalidate_sec
+        if info.expires_at:
+            until = min(until, info.expires_at - self.expiry_skew_sec)
+        self._remember(sealed, until)
+        return True
+
+    def revoke(self, sealed: str) -> None:
+        self._forget(sealed)
+        token = self.unseal(sealed)
+        if token is None:
+            return
+        try:
+            self.client.revoke_token(token)
+        except Exception:
+            log.warning("Keystone token revocation failed", exc_info=True)
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._next_check),
+            "hits": self.hits,
+            "validations": self.validations,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
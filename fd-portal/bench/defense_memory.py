@@ -0,0 +1,72 @@
+"""
+Memory bound of the per-worker LoginDefense store (MemoryBackend).
+
+    python bench/defense_memory.py --lookups 10000000 --failures 2000000
+
+Two replays against one LoginDefense with DEFENSE_MAX_KEYS = --max-keys:
+
+  lookups   state() for --lookups distinct clients that never failed
+            (anonymous GET /login): nothing may be stored;
+  failures  record_failure() for --failures distinct clients: the store
+            must stop at --max-keys and evict the rest.
+
+For each, it prints the keys held, evictions, the RSS growth and the peak
+RSS growth of this process (from /proc/self/status) and the rate.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from policy.login_policy import LoginPolicy  # noqa: E402
+from ratelimit import LoginDefense, MemoryBackend  # noqa: E402
+
+
+def _status_kib(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def _replay(defense, n: int, fn) -> dict:
+    rss0, hwm0 = _status_kib("VmRSS"), _status_kib("VmHWM")
+    started = time.perf_counter()
+    for i in range(n):
+        fn(f"c:{i:016x}")
+    elapsed = time.perf_counter() - started
+    stats = defense.stats()
+    return {
+        "calls": n,
+        "keys": stats["keys"],
+        "evictions": stats["evictions"],
+        "rss_growth_mib": (_status_kib("VmRSS") - rss0) / 1024,
+        "peak_rss_growth_mib": (_status_kib("VmHWM") - hwm0) / 1024,
+        "calls_per_sec": n / elapsed if elapsed else 0.0,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lookups", type=int, default=10_000_000)
+    ap.add_argument("--failures", type=int, default=2_000_000)
+    ap.add_argument("--max-keys", type=int, default=100_000)
+    ap.add_argument("--algorithm", default="log", help="window record: log or buckets")
+    args = ap.parse_args()
+
+    defense = LoginDefense(LoginPolicy(), 900, 300, MemoryBackend(max_keys=args.max_keys, algorithm=args.algorithm))
+    out = {
+        "max_keys": args.max_keys,
+        "algorithm": args.algorithm,
+        "lookups": _replay(defense, args.lookups, defense.state),
+        "failures": _replay(defense, args.failures, defense.record_failure),
+    }
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Correctness and cost of app/ratelimit.SharedMemoryBackend.
+
+    python bench/defense_shared.py --workers 4 --ops 200000
+
+exact:  --workers processes hammer the same table concurrently, recording
+        failures for a small set of hot keys (contention on every stripe)
+        plus a tail of per-worker keys. Afterwards every count must equal
+        the number of failures recorded for that key across all workers.
+single: observe() cost in one process for MemoryBackend ("log" and
+        "buckets") and SharedMemoryBackend, with --keys distinct keys.
+multi:  aggregate observe() throughput of --workers processes, each with
+        its own per-process MemoryBackend (what gunicorn workers do today)
+        vs one shared table.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from ratelimit import MemoryBackend, SharedMemoryBackend  # noqa: E402
+
+WINDOW = 900
+NEVER = 10**9      # lock_after that never triggers
+NOW = 1_700_000_000.0
+
+
+def _hammer(path, max_keys, worker, hot, ops, start):
+    backend = SharedMemoryBackend(path, max_keys=max_keys)
+    start.wait()
+    for i in range(ops):
+        key = f"hot-{i % hot}" if i % 2 else f"w{worker}-{i % 1000}"
+        backend.observe(key, NOW, True, WINDOW, NEVER, 300)
+
+
+def exact(path, workers, ops, hot, max_keys):
+    start = mp.Barrier(workers)
+    procs = [mp.Process(target=_hammer, args=(path, max_keys, w, hot, ops, start)) for w in range(workers)]
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - t0
+
+    backend = SharedMemoryBackend(path, max_keys=max_keys)
+    expected = {}
+    for w in range(workers):
+        for i in range(ops):
+            key = f"hot-{i % hot}" if i % 2 else f"w{w}-{i % 1000}"
+            expected[key] = expected.get(key, 0) + 1
+    wrong = sum(
+        1 for key, n in expected.items()
+        if backend.observe(key, NOW, False, WINDOW, NEVER, 300)[0] != n
+    )
+    return {
+        "workers": workers,
+        "observes": workers * ops,
+        "keys": len(expected),
+        "wrong_counts": wrong,
+        "observes_per_sec": workers * ops / elapsed,
+        "stats": backend.stats(),
+    }
+
+
+def _timed(backend, keys, ops):
+    names = [f"client-{i}" for i in range(keys)]
+    t0 = time.perf_counter()
+    for i in range(ops):
+        backend.observe(names[i % keys], NOW + i * 1e-4, True, WINDOW, NEVER, 300)
+    return time.perf_counter() - t0
+
+
+def single(path, keys, ops, max_keys):
+    out = {}
+    for name, make in (
+        ("memory_log", lambda: MemoryBackend(max_keys=max_keys, algorithm="log")),
+        ("memory_buckets", lambda: MemoryBackend(max_keys=max_keys, algorithm="buckets")),
+        ("shared", lambda: SharedMemoryBackend(path, max_keys=max_keys)),
+    ):
+        backend = make()
+        _timed(backend, keys, keys)  # warm: every key exists
+        out[name] = {"observe_us": _timed(backend, keys, ops) / ops * 1e6}
+    return out
+
+
+def _throughput(kind, path, max_keys, keys, ops, start, out):
+    if kind == "shared":
+        backend = SharedMemoryBackend(path, max_keys=max_keys)
+    else:
+        backend = MemoryBackend(max_keys=max_keys, algorithm="buckets")
+    start.wait()
+    out.put(_timed(backend, keys, ops))
+
+
+def multi(path, workers, keys, ops, max_keys):
+    res = {}
+    for kind in ("memory_buckets", "shared"):
+        start, out = mp.Barrier(workers), mp.Queue()
+        procs = [mp.Process(target=_throughput, args=(kind, path, max_keys, keys, ops, start, out))
+                 for _ in range(workers)]
+        for p in procs:
+            p.start()
+        slowest = max(out.get() for _ in procs)
+        for p in procs:
+            p.join()
+        res[kind] = {"observes_per_sec": workers * ops / slowest}
+    return res
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--ops", type=int, default=200_000, help="observe() calls per worker")
+    ap.add_argument("--hot", type=int, default=8, help="keys shared by every worker")
+    ap.add_argument("--keys", type=int, default=50_000)
+    ap.add_argument("--max-keys", type=int, default=100_000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(dir="/dev/shm" if os.path.isdir("/dev/shm") else None) as tmp:
+        results = {
+            "cpus": os.cpu_count(),
+            "exact": exact(os.path.join(tmp, "exact"), args.workers, args.ops, args.hot, args.max_keys),
+            "single": single(os.path.join(tmp, "single"), args.keys, args.ops, args.max_keys),
+            "multi": multi(os.path.join(tmp, "multi"), args.workers, args.keys, args.ops, args.max_keys),
+        }
+    print(json.dumps(results, indent=2))
+    if results["exact"]["wrong_counts"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
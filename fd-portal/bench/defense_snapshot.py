@@ -0,0 +1,115 @@
+"""
+Snapshot/restore cost of app/snapshot.DefenseSnapshots.
+
+    python bench/defense_snapshot.py --keys 1000000
+
+For each backend ("log" and "buckets" memory backends, the shared table)
+the script fills --keys clients with 1..--max-failures failures, then
+measures:
+
+  - save(): wall time, file size, and the worst observe() latency seen by a
+    request thread running alongside it (the stall the snapshot causes);
+  - restore() into an empty backend: wall time and records kept;
+  - that a sample of restored clients has the same DefenseState.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from ratelimit import LoginDefense, MemoryBackend, SharedMemoryBackend  # noqa: E402
+from snapshot import DefenseSnapshots  # noqa: E402
+
+
+class Policy:
+    captcha_start_failure = 4
+    block_after_failure = 7
+
+
+def _backend(kind, shm_path, keys):
+    if kind == "shared":
+        if os.path.exists(shm_path):
+            os.unlink(shm_path)
+        return SharedMemoryBackend(shm_path, max_keys=keys)
+    return MemoryBackend(max_keys=2 * keys, algorithm=kind)  # room for uneven shards: no evictions
+
+
+def _fill(defense, keys, max_failures):
+    backend, now = defense.backend, time.time()
+    for i in range(keys):
+        key = f"c:{i:016x}"
+        for _ in range(1 + i % max_failures):
+            backend.observe(key, now, True, defense.window_sec, Policy.block_after_failure, defense.soft_lockout_sec)
+
+
+def _during(fn, defense):
+    """Run fn() in a thread while the caller keeps serving observe() calls."""
+    worst, calls, done = 0.0, 0, threading.Event()
+    result = {}
+
+    def run():
+        result["value"] = fn()
+        done.set()
+
+    threading.Thread(target=run).start()
+    while not done.is_set():
+        t0 = time.perf_counter()
+        defense.state(f"c:{calls % 1000:016x}")
+        worst = max(worst, time.perf_counter() - t0)
+        calls += 1
+    return result["value"], worst, calls
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--keys", type=int, default=1_000_000)
+    ap.add_argument("--max-failures", type=int, default=8)
+    ap.add_argument("--kinds", default="buckets,log,shared")
+    ap.add_argument("--dir", default=None, help="snapshot directory (default: a temp dir)")
+    args = ap.parse_args()
+
+    out = {"keys": args.keys}
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        shm = os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tmp, f"fdp-bench-{os.getpid()}")
+        for kind in args.kinds.split(","):
+            prefix = os.path.join(tmp, kind)
+            src = LoginDefense(Policy(), 900, 300, _backend(kind, shm, args.keys))
+            _fill(src, args.keys, args.max_failures)
+
+            snaps = DefenseSnapshots(src, prefix)
+            saved, worst, calls = _during(snaps.save, src)
+            save_sec = snaps.save_sec
+            size = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp) if f.startswith(kind + "."))
+            del src, snaps
+
+            dst = LoginDefense(Policy(), 900, 300, _backend(kind, shm, args.keys))
+            restore = DefenseSnapshots(dst, prefix)
+            restored = restore.restore()
+            mismatched = sum(
+                1 for i in range(0, args.keys, max(1, args.keys // 1000))
+                if dst.state(f"c:{i:016x}").failures != 1 + i % args.max_failures
+            )
+            out[kind] = {
+                "saved": saved,
+                "save_sec": save_sec,
+                "file_mb": size / 2**20,
+                "bytes_per_key": size / max(saved, 1),
+                "worst_request_stall_ms_during_save": worst * 1e3,
+                "requests_during_save": calls,
+                "restored": restored,
+                "restore_sec": restore.restore_sec,
+                "sample_mismatches": mismatched,
+            }
+            del dst, restore
+        if os.path.exists(shm):
+            os.unlink(shm)
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+One global lock vs striped locks in MemoryBackend (DEFENSE_LOCK_STRIPES).
+
+    python bench/defense_stripes.py --threads 8 --calls 200000
+
+--threads threads each make --calls observe() calls over their own
+distinct keys (a record, then a lookup, as a failed login does). The same
+run is repeated --repeat times for every --stripes value; 1 is the global
+lock. Prints the best observe() rate of each.
+
+Under CPython's GIL, threads rarely run observe() at the same time, so
+stripes cannot add throughput here; what they change is who waits behind
+a held lock (a sweeping shard, a slow key). Under gevent a worker runs one
+greenlet at a time and the lock count does not matter.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from ratelimit import MemoryBackend  # noqa: E402
+
+WINDOW, LOCKOUT = 900, 300
+
+
+def run(stripes: int, threads: int, calls: int, keys: int) -> float:
+    backend = MemoryBackend(max_keys=threads * keys, stripes=stripes)
+    names = [[f"t{i}:c{k}" for k in range(keys)] for i in range(threads)]
+    now = time.time()
+    go = threading.Barrier(threads + 1)
+
+    def worker(i: int) -> None:
+        mine = names[i]
+        go.wait()
+        for j in range(calls // 2):
+            key = mine[j % keys]
+            backend.observe(key, now, True, WINDOW, 10**9, LOCKOUT)
+            backend.observe(key, now, False, WINDOW, 10**9, LOCKOUT)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    go.wait()
+    started = time.perf_counter()
+    for t in pool:
+        t.join()
+    return threads * (calls // 2) * 2 / (time.perf_counter() - started)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--calls", type=int, default=200_000, help="observe() calls per thread")
+    ap.add_argument("--keys", type=int, default=10_000, help="distinct keys per thread")
+    ap.add_argument("--stripes", default="1,16")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    out = {"threads": args.threads, "calls_per_thread": args.calls}
+    for stripes in map(int, args.stripes.split(",")):
+        best = max(run(stripes, args.threads, args.calls, args.keys) for _ in range(args.repeat))
+        out[f"stripes={stripes}"] = {"obs_per_sec": round(best)}
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Cost and accuracy of the LoginDefense window records (DEFENSE_WINDOW_ALGO).
+
+    python bench/defense_window.py --keys 100000
+
+For "log" (exact deque of timestamps) and "buckets" (fixed 15-slot ring):
+
+  bytes_per_key  tracemalloc growth of a MemoryBackend holding --keys
+                 clients with 1, 5 and 50 failures each (record, key
+                 string and dict slot included);
+  obs_per_sec    observe() calls per second, alternating record and lookup
+                 over those keys;
+  agreement      over --traces random client histories (2-12 failures
+                 spread over two windows, so many cross the window edge):
+                 the share of histories in which "buckets" makes the same
+                 captcha/lockout decision as the exact log at every step,
+                 and the share of single decisions that match.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from policy.login_policy import LoginPolicy  # noqa: E402
+from ratelimit import MemoryBackend  # noqa: E402
+
+WINDOW, LOCKOUT = 900, 300
+POLICY = LoginPolicy()
+
+
+def bytes_per_key(algorithm: str, keys: int, failures: int) -> float:
+    names = [f"c:{i:016x}" for i in range(keys)]  # allocated before tracing starts
+    now = time.time()
+    tracemalloc.start()
+    backend = MemoryBackend(max_keys=keys, algorithm=algorithm, stripes=1)
+    base = tracemalloc.get_traced_memory()[0]
+    for name in names:
+        for j in range(failures):
+            backend.observe(name, now + j * 1e-3, True, WINDOW, 10**9, LOCKOUT)
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    # the key strings existed before tracing; count them as the store keeps them alive
+    return used / keys + sum(sys.getsizeof(n) for n in names[:1000]) / 1000
+
+
+def obs_per_sec(algorithm: str, keys: int, calls: int) -> float:
+    backend = MemoryBackend(max_keys=keys, algorithm=algorithm)
+    names = [f"c:{i:016x}" for i in range(keys)]
+    now = time.time()
+    started = time.perf_counter()
+    for i in range(calls):
+        backend.observe(names[i % keys], now + i * 1e-4, bool(i & 1), WINDOW, 10**9, LOCKOUT)
+    return calls / (time.perf_counter() - started)
+
+
+def _decisions(backend, times):
+    out = []
+    for t in times:
+        failures, until = backend.observe("k", t, True, WINDOW, POLICY.block_after_failure, LOCKOUT)[:2]
+        out.append((failures >= POLICY.captcha_start_failure, t < until))
+    return out
+
+
+def agreement(traces: int, seed: int):
+    """(share of traces, share of single decisions) where buckets matches log."""
+    rng = random.Random(seed)
+    same = steps = same_steps = 0
+    for _ in range(traces):
+        t0 = 1_700_000_000 + rng.random() * WINDOW
+        times = sorted(t0 + rng.random() * 2 * WINDOW for _ in range(rng.randint(2, 12)))
+        exact = _decisions(MemoryBackend(algorithm="log"), times)
+        approx = _decisions(MemoryBackend(algorithm="buckets"), times)
+        same += exact == approx
+        steps += len(exact)
+        same_steps += sum(a == b for a, b in zip(exact, approx))
+    return same / traces, same_steps / steps
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--keys", type=int, default=100_000)
+    ap.add_argument("--calls", type=int, default=1_000_000)
+    ap.add_argument("--traces", type=int, default=20_000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    out = {"keys": args.keys}
+    for algorithm in ("log", "buckets"):
+        out[algorithm] = {
+            "bytes_per_key": {n: round(bytes_per_key(algorithm, args.keys, n)) for n in (1, 5, 50)},
+            "obs_per_sec": round(obs_per_sec(algorithm, args.keys, args.calls)),
+        }
+    traces, steps = agreement(args.traces, args.seed)
+    out["buckets"]["agreement_with_log"] = {"traces": traces, "decisions": steps}
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Local Keystone stand-in for benchmarks.
+
+    python bench/fake_keystone.py --port 18500 --latency-ms 80 --error-rate 0.01
+
+POST /v3/auth/tokens : 201 + X-Subject-Token when the password is "good"
+                       (any username), 401 otherwise. The latency stands
+                       in for Keystone's password hashing.
+GET  /v3/auth/tokens : 200 for a live token, 404 after DELETE.
+DELETE               : revokes the token, 204.
+
+--error-rate answers that share of requests with --error-status (503 by
+default) to exercise the circuit breaker.
+"""
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GOOD_PASSWORD = "good"
+_EXPIRES = "2099-01-01T00:00:00.000000Z"
+
+
+def make_handler(latency: float, jitter: float, error_rate: float, error_status: int):
+    revoked = set()
+    lock = threading.Lock()
+    counter = iter(range(1, 1 << 62))
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # headers and body go out as separate writes; avoid Nagle + delayed ACK stalls
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status: int, body: dict = None, headers=()):
+            out = json.dumps(body).encode() if body is not None else b""
+            self.send_response(status)
+            for k, v in headers:
+                self.send_header(k, v)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def _injected_error(self) -> bool:
+            if error_rate and random.random() < error_rate:
+                self._reply(error_status, {"error": {"code": error_status}})
+                return True
+            return False
+
+        def do_POST(self):
+            n = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(n) or b"{}")
+            if latency or jitter:
+                time.sleep(latency + random.random() * jitter)
+            if self._injected_error():
+                return
+            try:
+                password = body["auth"]["identity"]["password"]["user"]["password"]
+            except (KeyError, TypeError):
+                return self._reply(400, {"error": {"code": 400}})
+            if password != GOOD_PASSWORD:
+                return self._reply(401, {"error": {"code": 401}})
+            with lock:
+                token = f"fake-{next(counter)}"
+            self._reply(
+                201,
+                {"token": {"expires_at": _EXPIRES, "user": {"id": "fake-user"}}},
+                [("X-Subject-Token", token)],
+            )
+
+        def do_GET(self):
+            if self._injected_error():
+                return
+            token = self.headers.get("X-Subject-Token", "")
+            with lock:
+                live = token.startswith("fake-") and token not in revoked
+            if not live:
+                return self._reply(404, {"error": {"code": 404}})
+            self._reply(200, {"token": {"expires_at": _EXPIRES, "user": {"id": "fake-user"}}})
+
+        def do_DELETE(self):
+            with lock:
+                revoked.add(self.headers.get("X-Subject-Token", ""))
+            self._reply(204)
+
+    return Handler
+
+
+def serve(port: int, latency: float = 0.0, jitter: float = 0.0,
+          error_rate: float = 0.0, error_status: int = 503,
+          host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(
+        (host, port), make_handler(latency, jitter, error_rate, error_status)
+    )
+    server.daemon_threads = True
+    return server
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=18500)
+    ap.add_argument("--bind", default="127.0.0.1", help="0.0.0.0 to serve a portal running in a container")
+    ap.add_argument("--latency-ms", type=float, default=80.0)
+    ap.add_argument("--jitter-ms", type=float, default=20.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-status", type=int, default=503)
+    args = ap.parse_args()
+    server = serve(args.port, args.latency_ms / 1000, args.jitter_ms / 1000,
+                   args.error_rate, args.error_status, args.bind)
+    print(f"fake keystone on http://{args.bind}:{args.port}/v3", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Throughput of the legacy entry point's GET /login (app_legacy.py).
+
+    python bench/legacy_login.py --requests 5000
+    python bench/legacy_login.py --before 8460f9b^   # compare with an older app_legacy.py
+
+Each app_legacy.py is loaded in a fresh process and GET /login is timed
+through the Flask test client: best of --repeat runs of --requests each,
+in us/req, the matching rate of one process, and the page size in bytes.
+With --before REV the app_legacy.py of that git revision is measured the
+same way (extracted with `git show`), next to the one in the tree.
+
+The test client skips the network and gunicorn, so these are the app's
+own costs, not a server's latency.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from metrics_overhead import APP_DIR, CHILD_ENV
+
+LEGACY = os.path.join(APP_DIR, "app_legacy.py")
+
+
+def _child(path: str, requests: int, repeat: int) -> None:
+    os.chdir(APP_DIR)
+    spec = importlib.util.spec_from_file_location("app_legacy", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    client = module.app.test_client()
+    for _ in range(200):
+        resp = client.get("/login")
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get("/login")
+        best = min(best, (time.perf_counter() - started) / requests)
+    print(json.dumps({"us_per_req": best * 1e6, "page_bytes": len(resp.get_data())}))
+
+
+def login_us(path: str, requests: int, repeat: int) -> dict:
+    env = dict(os.environ, **CHILD_ENV)
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", path,
+         "--requests", str(requests), "--repeat", str(repeat)],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    res = json.loads(out.splitlines()[-1])
+    us = res["us_per_req"]
+    return {"us_per_req": round(us, 1), "rps_one_process": round(1e6 / us), "page_bytes": res["page_bytes"]}
+
+
+def _at_revision(rev: str, tmp: str) -> str:
+    top = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=APP_DIR,
+                         check=True, capture_output=True, text=True).stdout.strip()
+    rel = os.path.relpath(os.path.realpath(LEGACY), top)
+    src = subprocess.run(["git", "show", f"{rev}:{rel}"], cwd=top, check=True, capture_output=True).stdout
+    path = os.path.join(tmp, "app_legacy.py")
+    with open(path, "wb") as f:
+        f.write(src)
+    return path
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=5_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--before", metavar="REV", help="also measure app_legacy.py at this git revision")
+    ap.add_argument("--child", metavar="PATH", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        _child(args.child, args.requests, args.repeat)
+        return
+
+    out = {"requests": args.requests, "get_login": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.before:
+            out["get_login"]["before"] = login_us(_at_revision(args.before, tmp), args.requests, args.repeat)
+        out["get_login"]["after"] = login_us(LEGACY, args.requests, args.repeat)
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
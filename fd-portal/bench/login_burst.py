@@ -0,0 +1,109 @@
+"""
+One burst of concurrent failed logins against a slow Keystone: how many
+logins a worker profile keeps in flight while Keystone is slow to answer.
+
+    python bench/login_burst.py --worker-class sync
+    python bench/login_burst.py --worker-class gevent
+
+Starts bench/fake_keystone.py (--keystone-latency-ms, 500 by default) and
+gunicorn with --workers of --worker-class, then sends --logins POST /login
+requests at once, each from a new browser with its own username and a
+wrong password. Prints the wall time of the burst, p50/p99 latency, status
+counts ("error": no answer within the client's 30s timeout) and how many
+logins were waiting on Keystone at once on average.
+
+The layers added after the gevent profile (admission control, negative
+cache) bound or absorb such a burst by design. Pass --env
+KEYSTONE_ADMISSION=false to measure the worker class alone, as the
+profile was first measured. For sustained load, use bench/run.py.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from run import APP_DIR, BENCH_ENV, HERE, Browser, _free_port, _percentile, _wait_http
+
+
+def burst(host: str, port: int, logins: int, latency: float) -> dict:
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    go = threading.Barrier(logins + 1)
+
+    def one(i: int) -> None:
+        b = Browser(host, port)
+        go.wait()
+        t0 = time.perf_counter()
+        try:
+            status, _ = b.request("POST", "/login", {"username": f"burst-{i}", "password": "wrong"})
+        except OSError:
+            status = "error"
+        elapsed = time.perf_counter() - t0
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    threads = [threading.Thread(target=one, args=(i,), daemon=True) for i in range(logins)]
+    for t in threads:
+        t.start()
+    go.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "logins": logins,
+        "wall_sec": wall,
+        "p50_sec": _percentile(latencies, 0.50),
+        "p99_sec": _percentile(latencies, 0.99),
+        "statuses": statuses,
+        # average logins waiting on Keystone at once: what the pod really held
+        "keystone_concurrency": logins * latency / wall if wall else 0.0,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--worker-class", default="gevent")
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--logins", type=int, default=200)
+    ap.add_argument("--keystone-latency-ms", type=float, default=500.0)
+    ap.add_argument("--env", action="append", default=[], help="KEY=VALUE for the portal (repeatable)")
+    args = ap.parse_args()
+
+    ks_port, port = _free_port(), _free_port()
+    keystone = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "fake_keystone.py"), "--port", str(ks_port),
+         "--latency-ms", str(args.keystone_latency_ms), "--jitter-ms", "0"],
+        stdout=subprocess.DEVNULL,
+    )
+    env = {k: v for k, v in os.environ.items() if k != "GUNICORN_CMD_ARGS"}
+    env.update(BENCH_ENV)
+    env["KEYSTONE_URL"] = f"http://127.0.0.1:{ks_port}/v3"
+    env.update(kv.split("=", 1) for kv in args.env)
+    gunicorn = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--chdir", APP_DIR, "-b", f"127.0.0.1:{port}",
+         "--worker-class", args.worker_class, "--workers", str(args.workers),
+         "--worker-connections", "1000", "app:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_http("127.0.0.1", ks_port, "/")
+        _wait_http("127.0.0.1", port, "/readyz")
+        res = burst("127.0.0.1", port, args.logins, args.keystone_latency_ms / 1000)
+    finally:
+        gunicorn.terminate()
+        gunicorn.wait(timeout=30)
+        keystone.terminate()
+        keystone.wait(timeout=10)
+    res.update(worker_class=args.worker_class, workers=args.workers, env=args.env)
+    print(json.dumps(res, indent=2))
+
+
+if __name__ == "__main__":
+    main()
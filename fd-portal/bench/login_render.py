@@ -0,0 +1,72 @@
+"""
+Cost of the GET /login page with and without the page shell cache
+(RENDER_CACHE).
+
+    python bench/login_render.py --requests 20000
+
+render:   the render step alone, in us per page, inside a request context:
+          PageCache.render() of login.html from its cached shell vs the
+          full render_template() (RENDER_CACHE=false), for a plain page and
+          for one with the alert fragment (a captcha or lockout warning).
+request:  GET /login end to end through the Flask test client, in fresh
+          processes with RENDER_CACHE=true and =false (see
+          bench/metrics_overhead.py), in us/req and the matching rate of
+          one process.
+"""
+import argparse
+import json
+import os
+import timeit
+
+from metrics_overhead import APP_DIR, CHILD_ENV, request_us
+
+ALERT = {"error": "", "warning": "Too many failed attempts. Please complete the captcha.", "warning_class": "danger"}
+
+
+def render_us(enabled: bool, alert: bool, calls: int) -> float:
+    os.environ.update(CHILD_ENV)
+    os.chdir(APP_DIR)
+    from app import app
+    from render_cache import PageCache
+
+    pages = PageCache(app, enabled=enabled)
+    pages.register("login.html", ("alert_html", "captcha_html"))
+    pages.warm()
+
+    def page():
+        html = pages.partial("_login_alert.html", **ALERT) if alert else ""
+        return pages.render("login.html", alert_html=html, captcha_html="")
+
+    with app.test_request_context("/login"):
+        page()
+        return min(timeit.repeat(page, number=calls, repeat=3)) / calls * 1e6
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=20_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--rounds", type=int, default=3, help="processes per setting")
+    ap.add_argument("--calls", type=int, default=20_000, help="render calls")
+    args = ap.parse_args()
+
+    out = {"render_us": {}, "get_login_us": {}}
+    for enabled in (True, False):
+        name = "cache" if enabled else "render_template"
+        out["render_us"][name] = {
+            "plain": round(render_us(enabled, False, args.calls), 1),
+            "alert": round(render_us(enabled, True, args.calls), 1),
+        }
+    best = {True: float("inf"), False: float("inf")}
+    for _ in range(args.rounds):
+        for enabled in best:
+            us = request_us({"RENDER_CACHE": str(enabled).lower()}, args.requests, args.repeat)
+            best[enabled] = min(best[enabled], us)
+    for enabled, us in best.items():
+        name = "cache" if enabled else "render_template"
+        out["get_login_us"][name] = {"us_per_req": round(us, 1), "rps_one_process": round(1e6 / us)}
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
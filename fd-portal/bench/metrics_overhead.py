@@ -0,0 +1,97 @@
+"""
+Per-request cost of the Prometheus instrumentation (METRICS_ENABLED).
+
+    python bench/metrics_overhead.py --requests 20000
+
+request:  GET /login through the Flask test client, in a fresh process per
+          setting (Settings are read at import) with METRICS_ENABLED=false
+          and =true, best of --repeat runs of --requests each, in us/req.
+          The two settings alternate for --rounds processes each and the
+          best of each is kept: the spread between processes is as large
+          as the difference. That difference is what the request hooks cost.
+observe:  one fdp_http_request_duration_seconds observe() on its own, in
+          us per call.
+
+The test client skips the network and gunicorn, so the request numbers
+are the app's own cost, not a server's latency.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, "..", "app")
+sys.path.insert(0, APP_DIR)
+
+CHILD_ENV = {
+    "SESSION_COOKIE_SECURE": "false",
+    "FLASK_SECRET": "bench-only-secret-0123456789abcdef0123456789abcdef",
+    "EDGE_IP_LIMIT": "0",
+    "EDGE_PREFIX_LIMIT": "0",
+    "METRICS_PORT": "0",
+}
+
+
+def _child(requests: int, repeat: int) -> None:
+    os.chdir(APP_DIR)
+    from app import app
+
+    client = app.test_client()
+    for _ in range(200):
+        client.get("/login")
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get("/login")
+        best = min(best, (time.perf_counter() - started) / requests)
+    print(json.dumps({"us_per_req": best * 1e6}))
+
+
+def request_us(settings: dict, requests: int, repeat: int) -> float:
+    """us per GET /login in a fresh process with the portal `settings` (env)."""
+    env = dict(os.environ, **CHILD_ENV, **settings)
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", "--requests", str(requests), "--repeat", str(repeat)],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.splitlines()[-1])["us_per_req"]
+
+
+def observe_us(calls: int) -> float:
+    from metrics import HTTP_LATENCY
+
+    per_call = timeit.timeit(lambda: HTTP_LATENCY.observe(0.0004, "/login", "GET"), number=calls) / calls
+    return per_call * 1e6
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=20_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--rounds", type=int, default=5, help="processes per setting")
+    ap.add_argument("--calls", type=int, default=1_000_000, help="observe() calls")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        _child(args.requests, args.repeat)
+        return
+
+    off = on = float("inf")
+    for _ in range(args.rounds):
+        off = min(off, request_us({"METRICS_ENABLED": "false"}, args.requests, args.repeat))
+        on = min(on, request_us({"METRICS_ENABLED": "true"}, args.requests, args.repeat))
+    out = {
+        "requests": args.requests,
+        "get_login_us": {"metrics_off": round(off, 1), "metrics_on": round(on, 1), "overhead": round(on - off, 1)},
+        "observe_us": round(observe_us(args.calls), 2),
+    }
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
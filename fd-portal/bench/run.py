@@ -0,0 +1,431 @@
+"""
+Portal load test against a local Keystone stand-in.
+
+    python bench/run.py run --tag 014 --worker-class gevent --workers 2
+    python bench/run.py run --tag 014-sync --worker-class sync --workers 2
+    python bench/run.py run --tag 025-gthread --config --env GUNICORN_WORKER_CLASS=gthread
+    python bench/run.py compare bench/results/013.json bench/results/014.json
+
+`run` starts bench/fake_keystone.py and `gunicorn app:app` from ../app.
+It then drives each scenario for --duration seconds with --concurrency
+client threads and writes bench/results/<tag>.json. That file holds RPS,
+p50/p99 latency, status counts and RSS/PSS per gunicorn process (PSS
+splits pages shared copy-on-write between the processes that map them, so
+the pod total is the sum of PSS, not of RSS). With --config, gunicorn
+is started with app/gunicorn.conf.py as in the container, and
+--worker-class/--workers only override it when given. With
+--target it drives an already running portal instead, e.g. a container
+of an older image tag pointed at this fake Keystone with --keystone-bind
+0.0.0.0. RSS is not measured then.
+
+`compare` prints per-scenario deltas between two result files. It exits
+with status 1 when RPS drops or p99 grows by more than --tolerance.
+
+Scenarios:
+  anon_get          GET /login, new browser every time
+  login_ok          POST /login with valid credentials, new browser
+  login_fail_storm  POST /login, random usernames/passwords, new browser
+  captcha           GET /login from browsers already in the captcha phase
+  lockout           POST /login from browsers already locked out
+
+The load generator runs on the same host as gunicorn and competes with it
+for CPU. Compare results taken on the same machine only.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode, urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, "..", "app")
+
+# Every virtual browser connects from 127.0.0.1: keep the per-IP edge
+# limits out of the way unless a run sets them explicitly.
+BENCH_ENV = {
+    "SESSION_COOKIE_SECURE": "false",
+    "FLASK_SECRET": "bench-only-secret-0123456789abcdef0123456789abcdef",
+    "EDGE_IP_LIMIT": "0",
+    "EDGE_PREFIX_LIMIT": "0",
+}
+
+
+class Browser:
+    """Keep-alive HTTP client with a one-jar cookie store."""
+
+    def __init__(self, host: str, port: int):
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.cookies = {}
+        # own username per browser: one shared name would turn "hot" in the
+        # username sketch and force captchas on every client
+        self.username = f"bench-{random.randrange(10**9)}"
+
+    def forget(self) -> None:
+        self.cookies.clear()
+
+    def request(self, method: str, path: str, form: dict = None):
+        headers = {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            # server closed the keep-alive connection (sync workers): retry once
+            self.conn.close()
+            self.conn.request(method, path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+        data = resp.read()
+        for raw in resp.headers.get_all("Set-Cookie") or ():
+            name, _, rest = raw.partition("=")
+            value = rest.split(";", 1)[0]
+            if value and "expires=thu, 01 jan 1970" not in raw.lower():
+                self.cookies[name] = value
+            else:
+                self.cookies.pop(name, None)
+        return resp.status, data
+
+
+def _bad_login(b: Browser):
+    return b.request("POST", "/login", {"username": b.username, "password": "wrong"})
+
+
+def _reach(b: Browser, done, attempts: int = 60) -> None:
+    """Fail logins until done(status, body) holds 5 times in a row (every worker saw it)."""
+    streak = 0
+    for _ in range(attempts):
+        status, body = _bad_login(b)
+        streak = streak + 1 if done(status, body) else 0
+        if streak >= 5:
+            return
+    raise RuntimeError("scenario setup did not reach the expected state")
+
+
+def _anon_get(b: Browser):
+    b.forget()
+    return b.request("GET", "/login")[0]
+
+
+def _login_ok(b: Browser):
+    b.forget()
+    return b.request("POST", "/login", {"username": b.username, "password": "good"})[0]
+
+
+def _fail_storm(b: Browser):
+    b.forget()
+    form = {"username": f"user{random.randrange(10**6)}", "password": f"pw{random.randrange(10**9)}"}
+    return b.request("POST", "/login", form)[0]
+
+
+def _captcha_setup(b: Browser):
+    # the page carries a captcha once the browser is in the captcha phase
+    def in_captcha(status, body):
+        return b"captcha_token" in b.request("GET", "/login")[1]
+    _reach(b, in_captcha)
+
+
+def _captcha_get(b: Browser):
+    return b.request("GET", "/login")[0]
+
+
+def _lockout_setup(b: Browser):
+    _reach(b, lambda status, body: status == 429)
+
+
+def _lockout_post(b: Browser):
+    return _bad_login(b)[0]
+
+
+# name -> (setup or None, one request, expected statuses)
+SCENARIOS = {
+    "anon_get": (None, _anon_get, {200}),
+    "login_ok": (None, _login_ok, {302}),
+    "login_fail_storm": (None, _fail_storm, {401}),
+    "captcha": (_captcha_setup, _captcha_get, {200}),
+    "lockout": (_lockout_setup, _lockout_post, {429}),
+}
+
+
+def _percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_scenario(host: str, port: int, name: str, concurrency: int, duration: float) -> dict:
+    setup, request, expected = SCENARIOS[name]
+    latencies = [[] for _ in range(concurrency)]
+    statuses = [{} for _ in range(concurrency)]
+    errors = [0] * concurrency
+    clock = {}
+
+    def _start():
+        # runs once, when every client is set up
+        clock["started"] = time.perf_counter()
+        clock["deadline"] = clock["started"] + duration
+
+    ready = threading.Barrier(concurrency + 1, action=_start)
+
+    def worker(i: int) -> None:
+        b = Browser(host, port)
+        try:
+            if setup is not None:
+                setup(b)
+        except Exception:
+            errors[i] += 1
+            ready.wait()
+            return
+        ready.wait()
+        deadline = clock["deadline"]
+        lat, st = latencies[i], statuses[i]
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= deadline:
+                break
+            try:
+                status = request(b)
+            except (http.client.HTTPException, OSError):
+                errors[i] += 1
+                b = Browser(host, port)
+                continue
+            lat.append(time.perf_counter() - t0)
+            st[status] = st.get(status, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    ready.wait()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - clock["started"]
+
+    all_lat = sorted(x for lat in latencies for x in lat)
+    counts = {}
+    for st in statuses:
+        for k, v in st.items():
+            counts[str(k)] = counts.get(str(k), 0) + v
+    unexpected = sum(v for k, v in counts.items() if int(k) not in expected)
+    return {
+        "requests": len(all_lat),
+        "rps": len(all_lat) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(all_lat, 0.50) * 1000,
+        "p99_ms": _percentile(all_lat, 0.99) * 1000,
+        "max_ms": (all_lat[-1] * 1000) if all_lat else 0.0,
+        "statuses": counts,
+        "unexpected": unexpected,
+        "errors": sum(errors),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_http(host: str, port: int, path: str, timeout: float = 30.0) -> None:
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request("GET", path)
+            if conn.getresponse().status < 500:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{host}:{port}{path} did not come up")
+
+
+def _children(pid: int):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def _rss_kib(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _pss_kib(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def cmd_run(args) -> None:
+    ks_port = args.keystone_port or _free_port()
+    keystone = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "fake_keystone.py"),
+         "--port", str(ks_port), "--bind", args.keystone_bind,
+         "--latency-ms", str(args.keystone_latency_ms),
+         "--jitter-ms", str(args.keystone_jitter_ms),
+         "--error-rate", str(args.keystone_error_rate)],
+        stdout=subprocess.DEVNULL,
+    )
+    gunicorn = None
+    try:
+        _wait_http("127.0.0.1", ks_port, "/")
+        if args.target:
+            u = urlparse(args.target)
+            host, port = u.hostname, u.port or 80
+        else:
+            host, port = "127.0.0.1", _free_port()
+            env = {k: v for k, v in os.environ.items() if k != "GUNICORN_CMD_ARGS"}
+            env.update(BENCH_ENV)
+            env["KEYSTONE_URL"] = f"http://127.0.0.1:{ks_port}/v3"
+            env.update(kv.split("=", 1) for kv in args.env)
+            cmd = [sys.executable, "-m", "gunicorn", "--chdir", APP_DIR, "-b", f"{host}:{port}"]
+            if args.config:
+                env.setdefault("TLS_PEM_FILE", "")
+                env.setdefault("GUNICORN_ACCESS_LOG", "")  # like the plain command line
+                cmd += ["-c", os.path.join(APP_DIR, "gunicorn.conf.py")]
+                if args.worker_class:
+                    env["GUNICORN_WORKER_CLASS"] = args.worker_class
+                if args.workers:
+                    env["GUNICORN_WORKERS"] = str(args.workers)
+            else:
+                cmd += ["--worker-class", args.worker_class or "gevent", "--workers", str(args.workers or 2)]
+            cmd += [*args.gunicorn_arg, "app:app"]
+            log = open(os.path.join(args.out_dir, f"{args.tag}.gunicorn.log"), "w")
+            gunicorn = subprocess.Popen(cmd, env=env, stdout=log, stderr=log)
+        _wait_http(host, port, "/readyz")
+
+        results = {}
+        for name in args.scenarios.split(","):
+            print(f"{name} ...", flush=True)
+            res = run_scenario(host, port, name, args.concurrency, args.duration)
+            if gunicorn is not None:
+                workers = _children(gunicorn.pid)
+                res["rss_kib_master"] = _rss_kib(gunicorn.pid)
+                res["rss_kib_workers"] = [_rss_kib(p) for p in workers]
+                res["pss_kib_master"] = _pss_kib(gunicorn.pid)
+                res["pss_kib_workers"] = [_pss_kib(p) for p in workers]
+                res["pss_kib_pod"] = res["pss_kib_master"] + sum(res["pss_kib_workers"])
+            results[name] = res
+            print(f"  {res['rps']:8.1f} rps  p50 {res['p50_ms']:7.2f} ms  p99 {res['p99_ms']:7.2f} ms"
+                  f"  unexpected {res['unexpected']}  errors {res['errors']}", flush=True)
+    finally:
+        if gunicorn is not None:
+            gunicorn.terminate()
+            gunicorn.wait(timeout=30)
+        keystone.terminate()
+        keystone.wait(timeout=10)
+
+    out = {
+        "tag": args.tag,
+        "git_rev": _git_rev(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {
+            "target": args.target or "local gunicorn",
+            "gunicorn_conf": bool(args.config) and not args.target,
+            # None with --config: see the env overrides and rss_kib_workers
+            "worker_class": None if args.target else args.worker_class or (None if args.config else "gevent"),
+            "workers": None if args.target else args.workers or (None if args.config else 2),
+            "concurrency": args.concurrency,
+            "duration_sec": args.duration,
+            "keystone_latency_ms": args.keystone_latency_ms,
+            "keystone_error_rate": args.keystone_error_rate,
+            "env": args.env,
+            "cpus": os.cpu_count(),
+        },
+        "scenarios": results,
+    }
+    path = os.path.join(args.out_dir, f"{args.tag}.json")
+    with open(path, "w") as f:
+        json.dump(out, f, indent=2)
+    print(f"wrote {path}")
+
+
+def cmd_compare(args) -> None:
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressed = False
+    print(f"{'scenario':<18} {'rps ' + old['tag']:>14} {'rps ' + new['tag']:>14} {'d%':>7}"
+          f" {'p99 ' + old['tag']:>14} {'p99 ' + new['tag']:>14} {'d%':>7}")
+    for name, n in new["scenarios"].items():
+        o = old["scenarios"].get(name)
+        if o is None:
+            continue
+        d_rps = (n["rps"] - o["rps"]) / o["rps"] * 100 if o["rps"] else 0.0
+        d_p99 = (n["p99_ms"] - o["p99_ms"]) / o["p99_ms"] * 100 if o["p99_ms"] else 0.0
+        bad = d_rps < -args.tolerance or d_p99 > args.tolerance
+        regressed |= bad
+        print(f"{name:<18} {o['rps']:14.1f} {n['rps']:14.1f} {d_rps:7.1f}"
+              f" {o['p99_ms']:14.2f} {n['p99_ms']:14.2f} {d_p99:7.1f}{'  REGRESSION' if bad else ''}")
+    sys.exit(1 if regressed else 0)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run")
+    r.add_argument("--tag", default="local", help="result name, e.g. an image tag like 013")
+    r.add_argument("--target", default="", help="drive a running portal (http://host:port) instead of gunicorn")
+    r.add_argument("--config", action="store_true", help="start gunicorn with app/gunicorn.conf.py")
+    r.add_argument("--worker-class", default=None, help="default: gevent, or the config's choice with --config")
+    r.add_argument("--workers", type=int, default=None, help="default: 2, or the config's choice with --config")
+    r.add_argument("--gunicorn-arg", action="append", default=[], help="extra gunicorn flag (repeatable)")
+    r.add_argument("--env", action="append", default=[], help="KEY=VALUE for the portal (repeatable)")
+    r.add_argument("--scenarios", default=",".join(SCENARIOS))
+    r.add_argument("--concurrency", type=int, default=16)
+    r.add_argument("--duration", type=float, default=15.0)
+    r.add_argument("--keystone-port", type=int, default=0)
+    r.add_argument("--keystone-bind", default="127.0.0.1")
+    r.add_argument("--keystone-latency-ms", type=float, default=80.0)
+    r.add_argument("--keystone-jitter-ms", type=float, default=20.0)
+    r.add_argument("--keystone-error-rate", type=float, default=0.0)
+    r.add_argument("--out-dir", default=os.path.join(HERE, "results"))
+    r.set_defaults(fn=cmd_run)
+
+    c = sub.add_parser("compare")
+    c.add_argument("old")
+    c.add_argument("new")
+    c.add_argument("--tolerance", type=float, default=10.0, help="allowed change in percent")
+    c.set_defaults(fn=cmd_compare)
+
+    args = ap.parse_args()
+    if args.cmd == "run":
+        os.makedirs(args.out_dir, exist_ok=True)
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
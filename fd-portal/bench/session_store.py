@@ -0,0 +1,106 @@
+"""
+Per-request cost of the session backends (SESSION_BACKEND).
+
+    python bench/session_store.py --requests 5000
+
+For each of cookie (Flask's signed cookie), memory and redis (fakeredis,
+so no network round trip), a fresh process times through the Flask test
+client, in us/req (best of --repeat runs of --requests each):
+
+anon_get_login:     GET /login from a browser without a cookie;
+session_get_login:  GET /login from a browser that has a session (one
+                    failed login), so the session is loaded;
+logged_in_get_home: GET / after a successful login;
+login_post:         POST /login from a new browser with an empty password
+                    (the 400 path): mints client_id and writes the session,
+                    without Keystone or LoginDefense in the way.
+
+Keystone is replaced in-process ("good" is the only valid password). Each
+result also says whether the request got a Set-Cookie.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from metrics_overhead import APP_DIR, CHILD_ENV
+
+BASE = "https://localhost"
+BACKENDS = ("cookie", "memory", "redis")
+
+
+def _child(requests: int, repeat: int) -> None:
+    os.chdir(APP_DIR)
+    from keystone import InvalidCredentials, KeystoneClient, KeystoneToken
+    from sessions import RedisSessionStore
+
+    def validate(self, username, password):
+        if password != "good":
+            raise InvalidCredentials("Invalid credentials")
+        return KeystoneToken(token="bench", expires_at=time.time() + 3600)
+
+    KeystoneClient.validate_password = validate
+    if os.environ.get("SESSION_BACKEND") == "redis":
+        import fakeredis
+
+        RedisSessionStore.from_url = classmethod(lambda cls, url, ttl_sec=43200: cls(fakeredis.FakeRedis(), ttl_sec))
+    from app import app
+
+    def browser(password=None):
+        client = app.test_client()
+        if password is not None:
+            client.post("/login", data={"username": "alice", "password": password}, base_url=BASE)
+        return client
+
+    fresh = app.test_client(use_cookies=False)
+    scenarios = {
+        "anon_get_login": (lambda c: c.get("/login", base_url=BASE), browser()),
+        "session_get_login": (lambda c: c.get("/login", base_url=BASE), browser("wrong")),
+        "logged_in_get_home": (lambda c: c.get("/", base_url=BASE), browser("good")),
+        "login_post": (lambda c: c.post("/login", data={"username": "alice", "password": ""}, base_url=BASE), fresh),
+    }
+    out = {}
+    for name, (request, client) in scenarios.items():
+        for _ in range(200):
+            resp = request(client)
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(requests):
+                request(client)
+            best = min(best, (time.perf_counter() - started) / requests)
+        out[name] = {"us_per_req": round(best * 1e6, 1), "status": resp.status_code,
+                     "set_cookie": "Set-Cookie" in resp.headers}
+    print(json.dumps(out))
+
+
+def backend_us(backend: str, requests: int, repeat: int) -> dict:
+    env = dict(os.environ, **CHILD_ENV, SESSION_BACKEND=backend)
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", "--requests", str(requests), "--repeat", str(repeat)],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=5_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--backend", action="append", choices=BACKENDS, help="default: all")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        _child(args.requests, args.repeat)
+        return
+
+    out = {"requests": args.requests}
+    for backend in args.backend or BACKENDS:
+        out[backend] = backend_us(backend, args.requests, args.repeat)
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app is a flat set of modules run from app/ (gunicorn --chdir / WORKDIR)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
@@ -0,0 +1,236 @@
+import functools
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import HIGH, LOW, NORMAL, AdmissionControl
+from config import Settings
+from keystone import InvalidCredentials, KeystoneClient, KeystoneToken, KeystoneUnavailable
+
+
+class GatedKeystone:
+    """Records who got in; every call blocks until `release` is set."""
+
+    def __init__(self):
+        self.order = []
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def validate_password(self, username, password):
+        with self._lock:
+            self.order.append(username)
+        self.release.wait(5)
+        return KeystoneToken(token=username, expires_at=0.0)
+
+
+def _call(ctl, username, level=NORMAL, errors=None):
+    def run():
+        with admission.priority(level):
+            try:
+                ctl.validate_password(username, "pw")
+            except KeystoneUnavailable as e:
+                if errors is not None:
+                    errors[username] = e
+
+    t = threading.Thread(target=run)
+    t.start()
+    return t
+
+
+def _until(cond):
+    deadline = time.monotonic() + 5
+    while not cond():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def _holding(keystone, **kwargs):
+    """A one-slot controller whose slot is taken by a call parked in Keystone."""
+    ctl = AdmissionControl(keystone, limit=1, adaptive=False, **kwargs)
+    holder = _call(ctl, "holder")
+    _until(lambda: keystone.order == ["holder"])
+    return ctl, holder
+
+
+def _queue(ctl, *calls, errors=None):
+    threads = []
+    for username, level in calls:
+        threads.append(_call(ctl, username, level, errors))
+        _until(lambda: ctl.stats()["queued"] == len(threads))
+    return threads
+
+
+def test_high_priority_is_granted_first():
+    keystone = GatedKeystone()
+    ctl, holder = _holding(keystone)
+    threads = _queue(ctl, ("low", LOW), ("normal", NORMAL), ("high", HIGH), ("high-2", HIGH))
+
+    keystone.release.set()
+    for t in [holder, *threads]:
+        t.join()
+    # best priority first, FIFO within a priority
+    assert keystone.order == ["holder", "high", "high-2", "normal", "low"]
+    stats = ctl.stats()
+    assert (stats["admitted"], stats["waited"], stats["in_flight"]) == (5, 4, 0)
+
+
+def test_low_priority_is_shed_first():
+    keystone = GatedKeystone()
+    ctl, holder = _holding(keystone, queue_size=2)
+    errors = {}
+    threads = _queue(ctl, ("low", LOW), ("normal", NORMAL), errors=errors)
+
+    # full queue: a HIGH call pushes out the LOW waiter...
+    threads.append(_call(ctl, "high", HIGH, errors))
+    _until(lambda: "low" in errors and ctl.stats()["queued"] == 2)
+    # ...and nothing is left below LOW, so another LOW call is rejected at once
+    late = _call(ctl, "late", LOW, errors)
+    late.join()
+    assert set(errors) == {"low", "late"}
+    assert errors["late"].retry_after >= 1
+
+    keystone.release.set()
+    for t in [holder, *threads]:
+        t.join()
+    assert keystone.order == ["holder", "high", "normal"]
+    stats = ctl.stats()
+    assert (stats["shed"], stats["rejected"], stats["in_flight"], stats["queued"]) == (1, 1, 0, 0)
+
+
+def test_timeout_racing_a_grant_leaks_no_slot(monkeypatch):
+    class LateEvent(threading.Event):
+        # the wait runs out just as the slot is handed over
+        def wait(self, timeout=None):
+            super().wait(5)
+            return False
+
+    class LateWaiter(admission._Waiter):
+        __slots__ = ()
+
+        def __init__(self, prio, seq):
+            super().__init__(prio, seq)
+            self.event = LateEvent()
+
+    monkeypatch.setattr(admission, "_Waiter", LateWaiter)
+    keystone = GatedKeystone()
+    ctl, holder = _holding(keystone, queue_timeout_sec=0.01)
+    threads = _queue(ctl, ("raced", NORMAL))
+
+    keystone.release.set()
+    for t in [holder, *threads]:
+        t.join()
+    # the granted slot is used (and given back), not counted as a timeout
+    assert keystone.order == ["holder", "raced"]
+    stats = ctl.stats()
+    assert (stats["timeouts"], stats["admitted"], stats["in_flight"]) == (0, 2, 0)
+
+
+def test_timed_out_waiter_is_not_granted_later():
+    keystone = GatedKeystone()
+    ctl, holder = _holding(keystone, queue_timeout_sec=0.01)
+    errors = {}
+    _call(ctl, "slow", NORMAL, errors).join()
+    assert "timeout" in str(errors["slow"])
+
+    keystone.release.set()
+    holder.join()
+    stats = ctl.stats()
+    assert (stats["timeouts"], stats["in_flight"], stats["queued"]) == (1, 0, 0)
+    assert keystone.order == ["holder"]
+
+
+def test_full_queue_is_a_503_with_retry_after(monkeypatch):
+    keystone = GatedKeystone()
+
+    def gated(self, username, password):
+        return keystone.validate_password(username, password)
+
+    monkeypatch.setattr(KeystoneClient, "validate_password", gated)
+    import app as app_module
+    monkeypatch.setattr(app_module, "Settings", functools.partial(
+        Settings, keystone_concurrency_limit=1, keystone_concurrency_adaptive=False, keystone_queue_size=0))
+    client = app_module.create_app().test_client()
+
+    def post(username):
+        return client.post("/login", data={"username": username, "password": "pw"}, base_url="https://localhost")
+
+    holder = threading.Thread(target=post, args=("alice",))
+    holder.start()
+    _until(lambda: keystone.order == ["alice"])
+    resp = post("bob")
+    keystone.release.set()
+    holder.join()
+
+    assert resp.status_code == 503
+    assert int(resp.headers["Retry-After"]) >= 1
+    assert keystone.order == ["alice"]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+class TimedKeystone:
+    """Each call takes `latency` fake seconds and then does `outcome`."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.latency = 0.1
+        self.outcome = None
+
+    def validate_password(self, username, password):
+        self.clock.now += self.latency
+        if self.outcome is not None:
+            raise self.outcome
+        return KeystoneToken(token="t", expires_at=0.0)
+
+
+def test_aimd_limit(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission, "time", clock)
+    keystone = TimedKeystone(clock)
+    ctl = AdmissionControl(keystone, limit=1, min_limit=1, max_limit=10, latency_target_sec=1.0, backoff=0.5)
+
+    def call():
+        try:
+            ctl.validate_password("alice", "pw")
+        except Exception:
+            pass
+        return ctl.stats()["limit"]
+
+    # additive increase (+1/limit) while the limit is in use: one call fills limit 1 and 2
+    assert call() == 2.0
+    assert call() == 2.5
+    # a single call no longer fills half of 2.5: the limit stops growing
+    assert call() == 2.5
+
+    # a 401 is a healthy answer
+    keystone.outcome = InvalidCredentials("Invalid credentials")
+    assert call() == 2.5
+    # multiplicative decrease on slow calls and upstream failures
+    keystone.outcome, keystone.latency = None, 1.5
+    assert call() == 1.25
+    keystone.outcome, keystone.latency = ConnectionError("reset"), 0.1
+    assert call() == 1.0  # floored at min_limit
+    # a breaker fast-fail says nothing about Keystone latency
+    keystone.outcome = KeystoneUnavailable("Keystone circuit open")
+    assert call() == 1.0
+    assert ctl.stats()["in_flight"] == 0
+
+
+@pytest.mark.parametrize("adaptive", [True, False])
+def test_limit_stays_within_bounds(adaptive):
+    keystone = TimedKeystone(FakeClock())
+    ctl = AdmissionControl(keystone, limit=50, min_limit=2, max_limit=4, adaptive=adaptive)
+    assert ctl.stats()["limit"] == 4
+    keystone.outcome = ConnectionError("reset")
+    for _ in range(20):
+        with pytest.raises(ConnectionError):
+            ctl.validate_password("alice", "pw")
+    assert ctl.stats()["limit"] == (2 if adaptive else 4)
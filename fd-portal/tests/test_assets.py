@@ -0,0 +1,71 @@
+import pytest
+from flask import Flask
+
+from assets import Asset, AssetPipeline
+
+BOTH = Asset("css/main.abc.css", "text/css", "abc", b"plain", gzip=b"gz", br=b"br")
+GZIP_ONLY = Asset("css/gz.abc.css", "text/css", "abc", b"plain", gzip=b"gz")
+BR_ONLY = Asset("css/br.abc.css", "text/css", "abc", b"plain", br=b"br")
+NONE = Asset("img/logo.abc.png", "image/png", "abc", b"png")
+
+
+@pytest.fixture
+def client(tmp_path):
+    pipeline = AssetPipeline(str(tmp_path))
+    for asset in (BOTH, GZIP_ONLY, BR_ONLY, NONE):
+        pipeline._by_url[asset.url_path] = asset
+    app = Flask(__name__)
+    pipeline.install(app)
+    return app.test_client()
+
+
+def _get(client, asset, accept=None):
+    headers = {"Accept-Encoding": accept} if accept is not None else {}
+    return client.get(f"/assets/{asset.url_path}", headers=headers)
+
+
+@pytest.mark.parametrize("accept, encoding", [
+    ("gzip, deflate, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("gzip;q=0.9, br;q=0.5", "gzip"),
+    ("gzip;q=0.5, br;q=0.8", "br"),
+    ("gzip;q=0.5, br;q=0.5", "br"),
+    ("*", "br"),
+    ("*;q=0.5, br;q=0", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("identity", None),
+    ("", None),
+    (None, None),
+])
+def test_q_values_pick_the_encoding(client, accept, encoding):
+    resp = _get(client, BOTH, accept)
+    assert resp.headers.get("Content-Encoding") == encoding
+    assert resp.get_data() == {"br": b"br", "gzip": b"gz", None: b"plain"}[encoding]
+    assert resp.headers["Vary"] == "Accept-Encoding"
+
+
+def test_missing_variant_is_never_sent(client):
+    assert _get(client, GZIP_ONLY, "br").headers.get("Content-Encoding") is None
+    assert _get(client, BR_ONLY, "gzip").headers.get("Content-Encoding") is None
+    assert _get(client, BR_ONLY, "gzip, br").headers["Content-Encoding"] == "br"
+
+
+@pytest.mark.parametrize("asset", [BOTH, GZIP_ONLY, BR_ONLY])
+def test_vary_whenever_a_compressed_variant_exists(client, asset):
+    for accept in ("gzip, br", ""):
+        assert _get(client, asset, accept).headers["Vary"] == "Accept-Encoding"
+
+
+def test_no_vary_without_variants(client):
+    resp = _get(client, NONE, "gzip, br")
+    assert "Vary" not in resp.headers
+    assert resp.get_data() == b"png"
+
+
+def test_etag_per_encoding(client):
+    first = _get(client, BOTH, "br;q=0, gzip")
+    assert first.headers["ETag"] == '"abc-gzip"'
+    again = client.get(f"/assets/{BOTH.url_path}",
+                       headers={"Accept-Encoding": "br;q=0, gzip", "If-None-Match": '"abc-gzip"'})
+    assert again.status_code == 304
+    assert _get(client, BOTH, "").headers["ETag"] == '"abc"'
@@ -0,0 +1,182 @@
+import functools
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from blocklist import Blocklist, BlocklistFiles
+from config import Settings
+from edge import PrefixTable
+from keystone import InvalidCredentials, KeystoneClient
+from policy.login_policy import LoginPolicy
+
+LOCKOUT = 300
+
+
+def _files(tmp_path):
+    bl = Blocklist()
+    return bl, BlocklistFiles(bl, str(tmp_path), lockout_sec=LOCKOUT)
+
+
+def _age(path, seconds):
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def _dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def test_prune_keeps_foreign_and_live_files(tmp_path):
+    bl, files = _files(tmp_path)
+    host = socket.gethostname()
+    foreign = tmp_path / "agent.state"
+    live = tmp_path / f"{host}.1.feed"          # pid 1 is alive on this host
+    gone = tmp_path / f"{host}.{_dead_pid()}.nft"
+    for path in (foreign, live, gone):
+        path.write_text("x")
+        _age(path, 2 * LOCKOUT)
+
+    bl.block("203.0.113.7", 60)
+    assert files.export()
+    assert foreign.exists() and live.exists()
+    assert not gone.exists()
+    assert os.path.exists(f"{files._base()}.nft")
+
+
+def test_idle_worker_touches_its_files(tmp_path):
+    bl, files = _files(tmp_path)
+    bl.block("203.0.113.7", 60)
+    files.export()
+    feed = f"{files._base()}.feed"
+    _age(feed, LOCKOUT)
+    files._touched -= LOCKOUT  # as if the last write was a lockout ago
+    assert not files.export()
+    assert time.time() - os.stat(feed).st_mtime < 5
+
+
+def test_recreated_feed_starts_with_reset(tmp_path):
+    bl, files = _files(tmp_path)
+    bl.block("203.0.113.7", 60)
+    files.export()
+    feed = f"{files._base()}.feed"
+    os.unlink(feed)
+    bl.block("198.51.100.9", 60)
+    files.export()
+    with open(feed) as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0]["op"] == "reset"
+    assert sorted(item["cidr"] for item in lines[1:]) == ["198.51.100.9", "203.0.113.7"]
+
+
+NOW = 1_700_000_000.0
+EMPTY_NFT = """\
+# fd-portal login blocklist; apply with: nft -f <file>
+table inet fdportal {
+\tset blocked_v4 {
+\t\ttype ipv4_addr
+\t\tflags interval, timeout
+\t}
+\tset blocked_v6 {
+\t\ttype ipv6_addr
+\t\tflags interval, timeout
+\t}
+}
+"""
+
+
+def test_render_empty_set():
+    bl = Blocklist()
+    # an empty element list is an nft syntax error: no "add element" line at all
+    assert bl.render_nft(NOW) == EMPTY_NFT
+    assert bl.render_ipset(NOW) == (
+        "create fdportal-v4 hash:net family inet timeout 300\n"
+        "create fdportal-v6 hash:net family inet6 timeout 300\n"
+    )
+
+
+def test_render_entries():
+    bl = Blocklist(ipv4_prefix=32, ipv6_prefix=64)
+    bl.block("2001:db8:0:1::7", 120, NOW)
+    bl.block("203.0.113.7", 300, NOW)
+    bl.block("198.51.100.9", 60.5, NOW)
+    assert bl.render_nft(NOW + 0.5) == EMPTY_NFT + (
+        "add element inet fdportal blocked_v4 { 198.51.100.9 timeout 60s, 203.0.113.7 timeout 300s }\n"
+        "add element inet fdportal blocked_v6 { 2001:db8:0:1::/64 timeout 120s }\n"
+    )
+    assert bl.render_ipset(NOW + 0.5, name="fdp", default_timeout=300) == (
+        "create fdp-v4 hash:net family inet timeout 300\n"
+        "create fdp-v6 hash:net family inet6 timeout 300\n"
+        "add fdp-v4 198.51.100.9 timeout 60\n"
+        "add fdp-v4 203.0.113.7 timeout 300\n"
+        "add fdp-v6 2001:db8:0:1::/64 timeout 120\n"
+    )
+    # expired entries are left out
+    assert bl.render_nft(NOW + 200) == EMPTY_NFT + (
+        "add element inet fdportal blocked_v4 { 203.0.113.7 timeout 100s }\n"
+    )
+
+
+def test_prefixes_are_widened():
+    bl = Blocklist(ipv4_prefix=24, ipv6_prefix=64)
+    assert bl.block("2001:db8:0:1::7", 60, NOW)
+    assert not bl.block("2001:db8:0:1:ffff:ffff:ffff:ffff", 60, NOW)  # same /64, no longer
+    assert bl.block("2001:db8:0:2::7", 60, NOW)
+    assert bl.block("203.0.113.7", 60, NOW)
+    assert not bl.block("::ffff:203.0.113.200", 60, NOW)  # IPv4-mapped: the same /24
+    assert [cidr for cidr, _ in bl.entries(NOW)] == ["203.0.113.0/24", "2001:db8:0:1::/64", "2001:db8:0:2::/64"]
+
+
+def test_allow_list_is_never_blocked():
+    bl = Blocklist(ipv4_prefix=24, allow=PrefixTable(["203.0.113.7", "2001:db8::/32"]))
+    assert not bl.block("203.0.113.7", 60, NOW)
+    assert not bl.block("2001:db8::1", 60, NOW)
+    assert not bl.block("not-an-ip", 60, NOW)
+    # a neighbour in the same /24 is blocked
+    assert bl.block("203.0.113.8", 60, NOW)
+    assert bl.entries(NOW) == [("203.0.113.0/24", 60)]
+
+
+def test_changes_after_feed_overflow():
+    bl = Blocklist(feed_size=3)
+    for i in range(1, 6):
+        bl.block(f"203.0.113.{i}", 60, NOW)
+    # the feed holds seq 3..5: a consumer at seq 2 can catch up, one at seq 1 cannot
+    assert [seq for seq, _, _ in bl.changes(2, NOW)] == [3, 4, 5]
+    assert bl.changes(1, NOW) is None
+    assert bl.changes(0, NOW) is None
+    assert bl.changes(5, NOW) == []
+    # extending a lockout is a change; a shorter repeat is not
+    assert bl.block("203.0.113.5", 120, NOW)
+    assert not bl.block("203.0.113.5", 30, NOW)
+    assert bl.changes(5, NOW) == [(6, "203.0.113.5", 120)]
+
+
+def test_exported_ttls_follow_the_soft_lockout(monkeypatch, tmp_path):
+    def invalid(self, username, password):
+        raise InvalidCredentials("Invalid credentials")
+
+    monkeypatch.setattr(KeystoneClient, "validate_password", invalid)
+    import app as app_module
+    monkeypatch.setattr(app_module, "Settings", functools.partial(Settings, blocklist_dir=str(tmp_path)))
+    app = app_module.create_app()
+    lockout = Settings().defense_soft_lockout_sec
+    client = app.test_client()
+    for _ in range(LoginPolicy().block_after_failure):
+        resp = client.post("/login", data={"username": "alice", "password": "wrong"},
+                           base_url="https://localhost", environ_base={"REMOTE_ADDR": "203.0.113.7"})
+    assert resp.status_code == 429
+
+    export = next(task.fn for task in app.extensions["fd_tasks"] if task.name == "blocklist-export")
+    export()
+    base = os.path.join(str(tmp_path), f"{socket.gethostname()}.{os.getpid()}")
+    with open(f"{base}.ipset") as f:
+        lines = f.read().splitlines()
+    assert lines[0] == f"create fdportal-v4 hash:net family inet timeout {lockout}"
+    name, cidr, _, ttl = lines[2].split()[1:]
+    assert (name, cidr) == ("fdportal-v4", "203.0.113.7")
+    assert lockout - 2 <= int(ttl) <= lockout
@@ -0,0 +1,151 @@
+import pytest
+
+import breaker
+from breaker import CircuitBreaker
+from keystone import InvalidCredentials, KeystoneToken, KeystoneUnavailable
+
+CLOSED, OPEN, HALF_OPEN = CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeKeystone:
+    """Each call takes `latency` fake seconds, then raises `outcome` or returns a token."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.latency = 0.1
+        self.outcome = None
+        self.calls = 0
+
+    def validate_password(self, username, password):
+        self.calls += 1
+        self.clock.now += self.latency
+        if self.outcome is not None:
+            raise self.outcome
+        return KeystoneToken(token="t", expires_at=0.0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(breaker, "time", clock)
+    return clock
+
+
+def _breaker(clock, **kwargs):
+    keystone = FakeKeystone(clock)
+    opts = dict(error_rate=0.5, slow_call_sec=1.0, min_calls=4, window=10, open_sec=30.0, half_open_probes=2)
+    opts.update(kwargs)
+    return CircuitBreaker(keystone, **opts), keystone
+
+
+def _call(cb):
+    try:
+        cb.validate_password("alice", "pw")
+    except (InvalidCredentials, KeystoneUnavailable, ConnectionError):
+        pass
+
+
+def _trip(cb, keystone):
+    keystone.outcome = ConnectionError("reset")
+    for _ in range(cb.min_calls):
+        _call(cb)
+    keystone.outcome = None
+    assert cb.state == OPEN
+
+
+def test_opens_on_error_rate(clock):
+    cb, keystone = _breaker(clock)
+    for _ in range(2):
+        _call(cb)
+    keystone.outcome = ConnectionError("reset")
+    _call(cb)
+    assert cb.state == CLOSED  # 1 bad out of 3: under min_calls
+    _call(cb)
+    assert cb.state == OPEN    # 2 out of 4
+    assert cb.stats()["trips"] == 1
+
+
+def test_opens_on_slow_calls(clock):
+    cb, keystone = _breaker(clock)
+    keystone.latency = 1.5
+    for _ in range(3):
+        _call(cb)
+    assert cb.state == CLOSED
+    _call(cb)
+    assert cb.state == OPEN
+
+
+def test_invalid_credentials_do_not_trip(clock):
+    cb, keystone = _breaker(clock)
+    keystone.outcome = InvalidCredentials("Invalid credentials")
+    for _ in range(20):
+        with pytest.raises(InvalidCredentials):
+            cb.validate_password("alice", "wrong")
+    assert cb.state == CLOSED
+    assert cb.stats()["window_error_rate"] == 0.0
+    # ...unless Keystone was slow to say so
+    keystone.latency = 1.5
+    for _ in range(10):
+        _call(cb)
+    assert cb.state == OPEN
+
+
+def test_open_fails_fast_then_half_opens(clock):
+    cb, keystone = _breaker(clock)
+    _trip(cb, keystone)
+    calls = keystone.calls
+    clock.now += 10
+    with pytest.raises(KeystoneUnavailable) as exc:
+        cb.validate_password("alice", "pw")
+    assert exc.value.retry_after == 20
+    assert keystone.calls == calls
+    assert cb.stats()["rejected"] == 1
+
+    clock.now += 20
+    assert cb.state == HALF_OPEN
+
+
+def test_half_open_successes_close(clock):
+    cb, keystone = _breaker(clock)
+    _trip(cb, keystone)
+    clock.now += 30
+    _call(cb)
+    assert cb.state == HALF_OPEN
+    _call(cb)
+    assert cb.state == CLOSED
+    assert cb.stats()["window_calls"] == 0  # the window starts over
+
+
+def test_half_open_failure_reopens(clock):
+    cb, keystone = _breaker(clock)
+    _trip(cb, keystone)
+    clock.now += 30
+    _call(cb)
+    keystone.outcome = ConnectionError("reset")
+    _call(cb)
+    assert cb.state == OPEN
+    assert cb.stats()["trips"] == 2
+    # the cooldown starts again from the failed probe
+    clock.now += 29
+    assert cb.state == OPEN
+    clock.now += 1
+    assert cb.state == HALF_OPEN
+
+
+def test_half_open_admits_only_the_probes(clock):
+    cb, keystone = _breaker(clock)
+    _trip(cb, keystone)
+    clock.now += 30
+    # two probes in flight (admitted, not finished yet): a third call fails fast
+    assert cb._admit() and cb._admit()
+    with pytest.raises(KeystoneUnavailable) as exc:
+        cb.validate_password("alice", "pw")
+    assert exc.value.retry_after == 1
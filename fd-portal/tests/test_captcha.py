@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from captcha import CaptchaTokens
+from ratelimit import MemoryBackend, RedisBackend, SharedMemoryBackend
+
+
+class Fixed:
+    def generate(self):
+        return "What is 2 + 2?", "4"
+
+
+def _backends(tmp_path):
+    yield "memory", lambda: MemoryBackend()
+    shared = str(tmp_path / "defense")
+    yield "shared", lambda: SharedMemoryBackend(shared, max_keys=1000)
+    try:
+        import fakeredis
+    except ImportError:
+        return
+    server = fakeredis.FakeServer()
+    yield "redis", lambda: RedisBackend(fakeredis.FakeRedis(server=server))
+
+
+def _workers(make):
+    # two workers (or replicas): same secret, each with its own backend handle
+    backend = make()
+    if isinstance(backend, MemoryBackend):
+        return CaptchaTokens(b"secret", generator=Fixed(), replay=backend), \
+            CaptchaTokens(b"secret", generator=Fixed(), replay=backend)
+    return CaptchaTokens(b"secret", generator=Fixed(), replay=backend), \
+        CaptchaTokens(b"secret", generator=Fixed(), replay=make())
+
+
+@pytest.mark.parametrize("name", ["memory", "shared", "redis"])
+def test_token_is_burned_for_every_worker(name, tmp_path):
+    makers = dict(_backends(tmp_path))
+    if name not in makers:
+        pytest.skip("fakeredis not installed")
+    a, b = _workers(makers[name])
+    _, token = a.issue("client-1")
+    assert a.verify(token, "4", "client-1")
+    assert not a.verify(token, "4", "client-1")
+    assert not b.verify(token, "4", "client-1")
+
+
+def test_wrong_answer_burns_the_token():
+    tokens = CaptchaTokens(b"secret", generator=Fixed())
+    _, token = tokens.issue("client-1")
+    assert not tokens.verify(token, "5", "client-1")
+    assert not tokens.verify(token, "4", "client-1")
+
+
+def test_token_is_bound_to_the_client():
+    tokens = CaptchaTokens(b"secret", generator=Fixed())
+    _, token = tokens.issue("client-1")
+    assert not tokens.verify(token, "4", "client-2")
+    # a refused signature does not burn the nonce for its real owner
+    assert tokens.verify(token, "4", "client-1")
+
+
+@pytest.mark.parametrize("algorithm", ["log", "buckets", "shared"])
+def test_burned_nonces_expire_and_are_swept(algorithm, tmp_path):
+    if algorithm == "shared":
+        replay = SharedMemoryBackend(str(tmp_path / "captcha"), max_keys=1000, sweep_gap_sec=0)
+    else:
+        replay = MemoryBackend(algorithm=algorithm)
+    tokens = CaptchaTokens(b"secret", ttl_sec=300, generator=Fixed(), replay=replay)
+    issued = [tokens.issue("client-1")[1] for _ in range(50)]
+    for token in issued:
+        assert tokens.verify(token, "4", "client-1")
+    assert replay.stats()["keys"] == 50
+
+    now = time.time()
+    assert tokens.sweep(now + 60) == 0  # tokens still valid: nonces stay burned
+    assert tokens.sweep(now + 302) == 50
+    assert replay.stats()["keys"] == 0
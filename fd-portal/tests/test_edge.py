@@ -0,0 +1,116 @@
+import pytest
+from werkzeug.test import Client
+
+from edge import EdgeFilter, LockoutIndex, PrefixTable, client_ip, parse_ip
+
+
+def _ok(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [environ["fdp.client_ip"].encode()]
+
+
+def _client(**kwargs):
+    return Client(EdgeFilter(_ok, **kwargs), use_cookies=False)
+
+
+def _post(client, addr, xff=None, path="/login"):
+    headers = {"X-Forwarded-For": xff} if xff else {}
+    return client.post(path, headers=headers, environ_base={"REMOTE_ADDR": addr})
+
+
+def test_prefix_table_matches_v4_and_v6():
+    table = PrefixTable.parse("192.0.2.0/24, 198.51.100.7 2001:db8::/32\n10.0.0.0/8")
+    assert len(table) == 4
+    for addr in ("192.0.2.1", "192.0.2.255", "198.51.100.7", "10.200.1.1", "2001:db8:1::1"):
+        assert parse_ip(addr) in table
+    for addr in ("192.0.3.1", "198.51.100.8", "11.0.0.1", "2001:db9::1", "::1"):
+        assert parse_ip(addr) not in table
+    # a v4 block never matches v6 addresses with the same number
+    assert (128, parse_ip("192.0.2.1")[1]) not in table
+
+
+def test_ipv4_mapped_ipv6():
+    assert parse_ip("::ffff:192.0.2.1") == parse_ip("192.0.2.1")
+    table = PrefixTable(["::ffff:192.0.2.0/120"])
+    assert parse_ip("192.0.2.9") in table
+    assert parse_ip("::ffff:192.0.2.9") in table
+    assert parse_ip("192.0.3.9") not in table
+    assert parse_ip("not-an-ip") is None
+
+
+def test_deny_and_allow():
+    client = _client(allow=PrefixTable(["192.0.2.0/24"]), deny=PrefixTable(["192.0.2.0/28", "198.51.100.0/24"]),
+                     ip_limit=1, trust_xff=False)
+    resp = client.get("/", environ_base={"REMOTE_ADDR": "198.51.100.5"})
+    assert resp.status_code == 403
+    # the allow list wins over the deny list and skips the limits
+    for _ in range(5):
+        assert _post(client, "192.0.2.1").status_code == 200
+    assert _post(client, "::ffff:198.51.100.5").status_code == 403
+
+
+def test_per_ip_limit():
+    client = _client(ip_limit=3, prefix_limit=0, window_sec=60, trust_xff=False)
+    for _ in range(3):
+        assert _post(client, "203.0.113.7").status_code == 200
+    resp = _post(client, "203.0.113.7")
+    assert resp.status_code == 429
+    assert 1 <= int(resp.headers["Retry-After"]) <= 60
+    assert resp.headers["Cache-Control"] == "no-store"
+    # neighbours, other paths and other methods are not limited
+    assert _post(client, "203.0.113.8").status_code == 200
+    assert _post(client, "203.0.113.7", path="/").status_code == 200
+    assert client.get("/login", environ_base={"REMOTE_ADDR": "203.0.113.7"}).status_code == 200
+
+
+@pytest.mark.parametrize("prefix, inside, outside", [
+    ("203.0.113.{}", "203.0.113.250", "203.0.114.1"),
+    ("2001:db8:0:1::{}", "2001:db8:0:1:ffff::1", "2001:db8:0:2::1"),
+])
+def test_per_prefix_limit(prefix, inside, outside):
+    client = _client(ip_limit=2, prefix_limit=5, trust_xff=False)
+    for i in range(1, 6):
+        assert _post(client, prefix.format(i)).status_code == 200
+    resp = _post(client, inside)
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) >= 1
+    assert _post(client, outside).status_code == 200
+
+
+def test_rejected_ip_does_not_burn_the_prefix():
+    client = _client(ip_limit=1, prefix_limit=3, trust_xff=False)
+    for _ in range(10):
+        _post(client, "203.0.113.7")
+    assert _post(client, "203.0.113.8").status_code == 200
+
+
+def test_x_forwarded_for():
+    environ = {"REMOTE_ADDR": "10.0.0.2", "HTTP_X_FORWARDED_FOR": "192.0.2.66, 203.0.113.7"}
+    # only the entry our proxy appended counts; the left one is client-supplied
+    assert client_ip(environ, trust_xff=True) == "203.0.113.7"
+    assert client_ip(environ, trust_xff=False) == "10.0.0.2"
+    assert client_ip({"REMOTE_ADDR": "10.0.0.2"}, trust_xff=True) == "10.0.0.2"
+
+    trusted = _client(ip_limit=1, prefix_limit=0, trust_xff=True)
+    assert _post(trusted, "10.0.0.2", xff="203.0.113.7").status_code == 200
+    assert _post(trusted, "10.0.0.2", xff="203.0.113.7").status_code == 429
+    # spoofing a left-most entry does not change the limited address
+    assert _post(trusted, "10.0.0.2", xff="192.0.2.1, 203.0.113.7").status_code == 429
+    assert _post(trusted, "10.0.0.2", xff="203.0.113.8").status_code == 200
+
+    direct = _client(ip_limit=1, prefix_limit=0, trust_xff=False)
+    assert _post(direct, "10.0.0.2", xff="203.0.113.7").get_data() == b"10.0.0.2"
+    # without trust every proxied client shares the proxy's budget
+    assert _post(direct, "10.0.0.2", xff="203.0.113.8").status_code == 429
+
+
+def test_lockout_index_short_circuits():
+    lockouts = LockoutIndex(by_ip=True)
+    client = _client(lockouts=lockouts, trust_xff=False)
+    lockouts.lock("abc", "203.0.113.7", 30)
+    resp = client.post("/login", headers={"Cookie": "theme=x; session=abc"},
+                       environ_base={"REMOTE_ADDR": "198.51.100.1"})
+    assert resp.status_code == 429
+    assert 1 <= int(resp.headers["Retry-After"]) <= 30
+    assert _post(client, "203.0.113.7").status_code == 429
+    assert _post(client, "203.0.113.8").status_code == 200
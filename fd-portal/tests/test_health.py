@@ -0,0 +1,43 @@
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from breaker import CircuitBreaker
+from health import HealthMiddleware, Readiness, breaker_check
+
+
+class DownKeystone:
+    def validate_password(self, username, password):
+        raise ConnectionError("keystone down")
+
+
+def _app(environ, start_response):
+    return Response("portal")(environ, start_response)
+
+
+def _open_breaker():
+    breaker = CircuitBreaker(DownKeystone(), min_calls=2, window=2)
+    for _ in range(2):
+        try:
+            breaker.validate_password("alice", "pw")
+        except ConnectionError:
+            pass
+    assert breaker.state == breaker.OPEN
+    return breaker
+
+
+def test_ready_while_breaker_open_reports_state():
+    readiness = Readiness([breaker_check(_open_breaker())])
+    readiness.refresh()
+    resp = Client(HealthMiddleware(_app, readiness)).get("/readyz")
+    assert resp.status_code == 200
+    assert resp.get_data(as_text=True) == "ready: keystone breaker open\n"
+    assert readiness.stats() == {"ready": 1}
+
+
+def test_not_ready_on_failing_check():
+    readiness = Readiness([lambda: (True, "keystone breaker closed"), lambda: (False, "warming up")])
+    readiness.refresh()
+    resp = Client(HealthMiddleware(_app, readiness)).get("/readyz")
+    assert resp.status_code == 503
+    assert resp.get_data(as_text=True) == "not ready: warming up\n"
+    assert readiness.stats() == {"ready": 0}
@@ -0,0 +1,97 @@
+import multiprocessing
+import threading
+
+import pytest
+
+from keystone import InvalidCredentials, KeystoneToken
+from keystone_cache import NegativeCache
+
+
+class SlowKeystone:
+    """Answers after `release` is set; "good" is the only valid password."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def validate_password(self, username, password):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        self.release.wait(5)
+        if password != "good":
+            raise InvalidCredentials("Invalid credentials")
+        return KeystoneToken(token=f"token-{n}", expires_at=0.0)
+
+
+def _concurrent(cache, password, n=8):
+    results = [None] * n
+
+    def login(i):
+        try:
+            results[i] = cache.validate_password("alice", password)
+        except InvalidCredentials as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=login, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results
+
+
+def _finish(keystone, threads):
+    # let every thread join the flight before Keystone answers
+    while keystone.calls < 1:
+        pass
+    keystone.release.set()
+    for t in threads:
+        t.join()
+
+
+def test_concurrent_failures_share_one_call():
+    keystone = SlowKeystone()
+    cache = NegativeCache(keystone)
+    threads, results = _concurrent(cache, "wrong")
+    _finish(keystone, threads)
+    assert all(isinstance(r, InvalidCredentials) for r in results)
+    assert keystone.calls == 1
+    with pytest.raises(InvalidCredentials):
+        cache.validate_password("alice", "wrong")  # now from the cache
+    assert keystone.calls == 1
+
+
+def test_concurrent_successes_get_their_own_tokens():
+    keystone = SlowKeystone()
+    cache = NegativeCache(keystone)
+    threads, results = _concurrent(cache, "good")
+    _finish(keystone, threads)
+    tokens = [r.token for r in results]
+    assert len(set(tokens)) == len(tokens)  # logging one session out cannot revoke another's token
+    assert keystone.calls == len(tokens)
+
+
+def _in_child(fn):
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=lambda: queue.put(fn()))
+    proc.start()
+    result = queue.get(timeout=10)
+    proc.join(10)
+    return result
+
+
+def test_forked_worker_draws_its_own_key():
+    keystone = SlowKeystone()
+    keystone.release.set()
+    cache = NegativeCache(keystone)
+    with pytest.raises(InvalidCredentials):
+        cache.validate_password("alice", "wrong")
+    digest = cache._digest("alice", "wrong")
+
+    # as a worker forked from a preloaded master: another key, nothing inherited
+    child_digest, child_entries = _in_child(lambda: (cache._digest("alice", "wrong"), cache.stats()["entries"]))
+    assert child_digest != digest
+    assert child_entries == 0
+    assert cache._digest("alice", "wrong") == digest
+    assert cache.stats()["entries"] == 1
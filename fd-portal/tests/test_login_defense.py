@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+from policy.login_policy import LoginPolicy
+from ratelimit import DEFENSE_TRANSITIONS, LoginDefense, MemoryBackend, SharedMemoryBackend
+
+POLICY = LoginPolicy()
+
+
+def _transitions(phase: str) -> float:
+    return DEFENSE_TRANSITIONS._values.get((phase,), 0)
+
+
+BACKENDS = {
+    "log": lambda tmp_path: MemoryBackend(algorithm="log"),
+    "buckets": lambda tmp_path: MemoryBackend(algorithm="buckets"),
+    "shared": lambda tmp_path: SharedMemoryBackend(str(tmp_path / "defense"), max_keys=1000),
+}
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_lockout_transition_counted_once(backend, tmp_path):
+    defense = LoginDefense(POLICY, backend=BACKENDS[backend](tmp_path))
+    before = _transitions("lockout")
+    for _ in range(POLICY.block_after_failure):
+        st = defense.record_failure("client")
+    assert st.locked_out
+    # reads right after the lockout (a fast GET /login) do not count it again
+    for _ in range(3):
+        assert defense.state("client").locked_out
+    defense.record_failure("client")
+    assert _transitions("lockout") == before + 1
+
+
+def test_lockout_seconds_left_never_zero_while_locked():
+    defense = LoginDefense(POLICY, soft_lockout_sec=0.3, backend=MemoryBackend())
+    for _ in range(POLICY.block_after_failure):
+        st = defense.record_failure("client")
+    assert st.locked_out and st.lockout_seconds_left == 1
+    time.sleep(0.2)
+    st = defense.state("client")
+    assert st.locked_out and st.lockout_seconds_left == 1
@@ -0,0 +1,36 @@
+from flask import Flask
+
+import metrics
+
+
+def _client(port):
+    app = Flask(__name__)
+    metrics.install(app)
+    app.add_url_rule("/login", "login", lambda: "login page")
+    app.wsgi_app = metrics.MetricsEndpoint(app.wsgi_app, port=port)
+    return app.test_client()
+
+
+def test_metrics_only_on_internal_listener():
+    client = _client(9100)
+    client.get("/login")
+    # public listener: an ordinary 404, nothing rendered
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", environ_overrides={"SERVER_PORT": "8000"}).status_code == 404
+
+    resp = client.get("/metrics", environ_overrides={"SERVER_PORT": "9100"})
+    assert resp.status_code == 200
+    assert b"fdp_http_requests_total" in resp.data
+    assert resp.headers["Cache-Control"] == "no-store"
+
+
+def test_internal_listener_serves_nothing_else():
+    client = _client(9100)
+    assert client.get("/login").status_code == 200
+    assert client.get("/login", environ_overrides={"SERVER_PORT": "9100"}).status_code == 404
+
+
+def test_port_zero_serves_metrics_everywhere():
+    client = _client(0)
+    assert client.get("/metrics").status_code == 200
+    assert client.get("/login").status_code == 200
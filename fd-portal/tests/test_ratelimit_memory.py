@@ -0,0 +1,83 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from ratelimit import MemoryBackend
+
+WINDOW, LOCKOUT = 900, 300
+
+
+@pytest.fixture
+def busy_switching():
+    # switch threads as often as possible so unlocked read-modify-writes would interleave
+    old = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(old)
+
+
+def _hammer(backend, keys, threads: int, per_thread: int, lock_after: int = 10**9):
+    now = time.time()
+    results = []
+
+    def run(i: int) -> None:
+        out = []
+        for j in range(per_thread):
+            out.append(backend.observe(keys[(i + j) % len(keys)], now, True, WINDOW, lock_after, LOCKOUT))
+        results.append(out)
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return now, results
+
+
+@pytest.mark.parametrize("algorithm", ["log", "buckets"])
+@pytest.mark.parametrize("stripes", [1, 16])
+def test_concurrent_failures_on_one_key_are_exact(busy_switching, algorithm, stripes):
+    backend = MemoryBackend(algorithm=algorithm, stripes=stripes)
+    now, results = _hammer(backend, ["hot"], threads=32, per_thread=2000)
+    failures = sorted(f for out in results for f, _, _ in out)
+    # every call saw its own count: 1..N, each exactly once
+    assert failures == list(range(1, 32 * 2000 + 1))
+    assert backend.observe("hot", now, False, WINDOW, 10**9, LOCKOUT)[0] == 32 * 2000
+
+
+@pytest.mark.parametrize("algorithm", ["log", "buckets"])
+def test_concurrent_failures_over_many_keys_are_exact(busy_switching, algorithm):
+    backend = MemoryBackend(algorithm=algorithm, stripes=16)
+    keys = [f"c:{i}" for i in range(64)]
+    now, _ = _hammer(backend, keys, threads=16, per_thread=640)
+    counts = [backend.observe(k, now, False, WINDOW, 10**9, LOCKOUT)[0] for k in keys]
+    assert counts == [16 * 640 // len(keys)] * len(keys)
+    assert backend.stats()["keys"] == len(keys)
+
+
+def test_lockout_is_armed_once(busy_switching):
+    backend = MemoryBackend(stripes=4)
+    _, results = _hammer(backend, ["hot"], threads=16, per_thread=50, lock_after=7)
+    untils = {until for out in results for f, until, _ in out if f >= 7}
+    assert len(untils) == 1  # later failures see the running lockout, never re-arm it
+    assert sum(armed for out in results for _, _, armed in out) == 1
+
+
+def test_sweep_runs_beside_writers(busy_switching):
+    backend = MemoryBackend(stripes=8)
+    stop = threading.Event()
+
+    def sweeper() -> None:
+        while not stop.is_set():
+            backend.sweep(time.time(), WINDOW)
+
+    t = threading.Thread(target=sweeper)
+    t.start()
+    try:
+        now, _ = _hammer(backend, [f"c:{i}" for i in range(32)], threads=8, per_thread=400)
+    finally:
+        stop.set()
+        t.join()
+    assert sum(backend.observe(f"c:{i}", now, False, WINDOW, 10**9, LOCKOUT)[0] for i in range(32)) == 8 * 400
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from policy.login_policy import LoginPolicy  # noqa: E402
+from ratelimit import LoginDefense, MemoryBackend, RedisBackend  # noqa: E402
+
+POLICY = LoginPolicy()
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def _defense(server, **kwargs):
+    # one client (connection pool) per simulated worker or replica
+    backend = RedisBackend(fakeredis.FakeRedis(server=server), **kwargs)
+    return LoginDefense(POLICY, window_sec=900, soft_lockout_sec=300, backend=backend)
+
+
+def test_counts_are_shared(server):
+    a, b = _defense(server), _defense(server)
+    for i in range(1, POLICY.captcha_start_failure + 1):
+        worker = a if i % 2 else b
+        assert worker.record_failure("client").failures == i
+    assert a.state("client") == b.state("client")
+    assert a.state("client").captcha_required
+
+
+def test_lockout_is_shared(server):
+    a, b = _defense(server), _defense(server)
+    for _ in range(POLICY.block_after_failure - 1):
+        a.record_failure("client")
+    assert not b.state("client").locked_out
+    st = b.record_failure("client")
+    assert st.locked_out
+    assert 299 <= st.lockout_seconds_left <= 300
+    assert a.state("client").locked_out
+
+
+def test_lockout_armed_once(server):
+    a, b = _defense(server), _defense(server)
+    armed = []
+    for i in range(POLICY.block_after_failure + 3):
+        backend = (a if i % 2 else b).backend
+        armed.append(backend.observe("client", 1e9 + i, True, 900, POLICY.block_after_failure, 300)[2])
+    assert armed.count(True) == 1 and armed.index(True) == POLICY.block_after_failure - 1
+
+
+def test_concurrent_failures_are_exact(server):
+    workers = [_defense(server) for _ in range(4)]
+    per_thread, threads = 50, []
+    for w in workers:
+        for _ in range(2):
+            threads.append(threading.Thread(
+                target=lambda w=w: [w.record_failure("hot") for _ in range(per_thread)]
+            ))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    expected = len(threads) * per_thread
+    assert all(w.state("hot").failures == expected for w in workers)
+
+
+def test_reset_clears_every_worker(server):
+    a, b = _defense(server), _defense(server)
+    for _ in range(3):
+        a.record_failure("client")
+    b.reset("client")
+    assert a.state("client").failures == 0
+
+
+def test_outage_fails_open_to_local_counts(server):
+    defense = _defense(server, fallback=MemoryBackend(), retry_sec=0)
+    defense.record_failure("client")
+    server.connected = False
+
+    assert defense.record_failure("client").failures == 1  # local count starts over
+    assert defense.state("client").failures == 1
+    stats = defense.stats()
+    assert stats["redis_degraded"] and stats["redis_fallbacks"] == 2 and stats["redis_errors"] == 2
+
+    server.connected = True
+    assert defense.record_failure("client").failures == 2  # back on the shared count
+    assert not defense.stats()["redis_degraded"]
+
+
+def test_outage_skips_redis_until_retry(server):
+    defense = _defense(server, retry_sec=60)
+    server.connected = False
+    defense.record_failure("client")
+    server.connected = True
+    # still inside retry_sec: served locally without trying Redis
+    assert defense.record_failure("client").failures == 2
+    assert defense.stats()["redis_errors"] == 1
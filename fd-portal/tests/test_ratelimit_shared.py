@@ -0,0 +1,85 @@
+import multiprocessing
+import threading
+
+import pytest
+
+from ratelimit import SharedMemoryBackend
+
+NOW = 1_700_000_000.0
+WINDOW = 900
+NEVER = 10**9  # lock_after that never triggers
+HOT = 8
+
+
+def _key(worker: int, i: int) -> str:
+    # odd calls hit keys every worker shares, even ones the worker's own
+    return f"hot-{i % HOT}" if i % 2 else f"w{worker}-{i % 100}"
+
+
+def _hammer(path, stripes, worker, ops, threads, start):
+    backend = SharedMemoryBackend(path, max_keys=10_000, stripes=stripes)
+
+    def run(t):
+        for i in range(t, ops, threads):
+            backend.observe(_key(worker, i), NOW, True, WINDOW, NEVER, 300)
+
+    start.wait()
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for th in pool:
+        th.start()
+    for th in pool:
+        th.join()
+
+
+@pytest.mark.parametrize("stripes", [1, 16])
+def test_exact_counts_across_processes(stripes, tmp_path):
+    """Forked workers (two threads each) on one table lose no update; stripes=1 is one contended lock."""
+    path = str(tmp_path / "defense")
+    SharedMemoryBackend(path, max_keys=10_000, stripes=stripes)
+    workers, ops = 4, 2000
+    ctx = multiprocessing.get_context("fork")
+    start = ctx.Barrier(workers)
+    procs = [ctx.Process(target=_hammer, args=(path, stripes, w, ops, 2, start)) for w in range(workers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+
+    expected = {}
+    for w in range(workers):
+        for i in range(ops):
+            expected[_key(w, i)] = expected.get(_key(w, i), 0) + 1
+    backend = SharedMemoryBackend(path, max_keys=10_000, stripes=stripes)
+    counts = {key: backend.observe(key, NOW, False, WINDOW, NEVER, 300)[0] for key in expected}
+    assert counts == expected
+    assert backend.stats()["keys"] == len(expected)
+
+
+def test_full_table_evicts(tmp_path):
+    backend = SharedMemoryBackend(str(tmp_path / "defense"), max_keys=16, stripes=1)
+    for i in range(1000):
+        backend.observe(f"client-{i}", NOW + i, True, WINDOW, NEVER, 300)
+    stats = backend.stats()
+    assert 0 < stats["keys"] <= 64  # one stripe of 64 slots
+    assert stats["keys"] + stats["evictions"] == 1000
+    # the newest key always finds a slot
+    assert backend.observe("client-999", NOW + 999, False, WINDOW, NEVER, 300)[0] == 1
+
+
+def test_reopen_keeps_table_unless_layout_changes(tmp_path):
+    path = str(tmp_path / "defense")
+    first = SharedMemoryBackend(path, max_keys=1000)
+    assert first.created
+    for _ in range(3):
+        first.observe("client", NOW, True, WINDOW, 3, 300)
+
+    # a worker joining the live table (or a restarted one) sees the same state
+    again = SharedMemoryBackend(path, max_keys=1000)
+    assert not again.created
+    assert again.observe("client", NOW, False, WINDOW, 3, 300)[:2] == (3, NOW + 300)
+
+    # another configuration starts from an empty table
+    resized = SharedMemoryBackend(path, max_keys=100_000)
+    assert resized.created
+    assert resized.observe("client", NOW, False, WINDOW, 3, 300)[0] == 0
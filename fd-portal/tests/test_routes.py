@@ -0,0 +1,39 @@
+import pytest
+
+from keystone import InvalidCredentials, KeystoneClient
+from policy.login_policy import LoginPolicy
+from sketch import username_label
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def invalid(self, username, password):
+        raise InvalidCredentials("Invalid credentials")
+
+    monkeypatch.setattr(KeystoneClient, "validate_password", invalid)
+    from app import create_app
+    return create_app().test_client()
+
+
+def _post(client):
+    return client.post("/login", data={"username": "alice", "password": "wrong"}, base_url="https://localhost")
+
+
+def test_lockout_429_carries_retry_after(client):
+    for _ in range(LoginPolicy().block_after_failure - 1):
+        resp = _post(client)
+        assert resp.status_code == 401
+        assert "Retry-After" not in resp.headers
+    # the failure that starts the lockout, then a POST while locked out
+    for _ in range(2):
+        resp = _post(client)
+        assert resp.status_code == 429
+        assert 1 <= int(resp.headers["Retry-After"]) <= 300
+
+
+def test_scrape_shows_no_usernames(client):
+    _post(client)
+    body = client.get("/metrics", environ_overrides={"SERVER_PORT": "9100"}).get_data(as_text=True)
+    assert "alice" not in body
+    label = username_label(client.application.secret_key.encode("utf-8"), "ALICE")
+    assert f'fdp_username_failures{{username_hash="{label}"}} 1' in body
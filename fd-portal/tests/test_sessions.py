@@ -0,0 +1,115 @@
+import functools
+import time
+
+import pytest
+
+from config import Settings
+from keystone import InvalidCredentials, KeystoneClient, KeystoneToken
+from sessions import MemorySessionStore
+
+BASE = "https://localhost"
+
+
+class CountingStore(MemorySessionStore):
+    """MemorySessionStore that logs every call the session interface makes."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def load(self, sid):
+        self.calls.append(("load", sid))
+        return super().load(sid)
+
+    def save(self, sid, data):
+        self.calls.append(("save", sid))
+        super().save(sid, data)
+
+    def delete(self, sid):
+        self.calls.append(("delete", sid))
+        super().delete(sid)
+
+
+@pytest.fixture
+def portal(monkeypatch):
+    def validate(self, username, password):
+        if password != "good":
+            raise InvalidCredentials("Invalid credentials")
+        return KeystoneToken(token="t", expires_at=time.time() + 3600)
+
+    monkeypatch.setattr(KeystoneClient, "validate_password", validate)
+    import app as app_module
+    store = CountingStore()
+    monkeypatch.setattr(app_module, "Settings", functools.partial(Settings, session_backend="memory"))
+    monkeypatch.setattr(app_module, "_session_store", lambda settings: store)
+    return app_module.create_app().test_client(), store
+
+
+def _sid(client, store):
+    cookie = client.get_cookie("session")
+    if cookie is None:
+        return None
+    return client.application.session_interface._signer.unsign(cookie.value).decode("ascii")
+
+
+def _login(client, password):
+    return client.post("/login", data={"username": "alice", "password": password}, base_url=BASE)
+
+
+def test_anonymous_get_writes_nothing(portal):
+    client, store = portal
+    for path in ("/login", "/"):
+        resp = client.get(path, base_url=BASE)
+        assert resp.status_code in (200, 302)
+        assert "Set-Cookie" not in resp.headers
+    # no cookie: nothing to load, and an untouched session is never saved
+    assert store.calls == []
+    assert store.stats()["entries"] == 0
+
+
+def test_session_is_loaded_only_when_a_route_reads_it(portal):
+    client, store = portal
+    _login(client, "wrong")
+    sid = _sid(client, store)
+    store.calls.clear()
+
+    assert client.get("/no-such-page", base_url=BASE).status_code == 404
+    assert store.calls == []
+    resp = client.get("/login", base_url=BASE)
+    assert store.calls == [("load", sid)]
+    assert "Set-Cookie" not in resp.headers
+    assert "Cookie" in resp.headers["Vary"]
+
+
+def test_login_rotates_the_session_id(portal):
+    client, store = portal
+    assert _login(client, "wrong").status_code == 401
+    before = _sid(client, store)
+    client_id = store.load(before)["client_id"]
+
+    assert _login(client, "good").status_code == 302
+    after = _sid(client, store)
+    assert after != before
+    assert store.load(before) is None  # the pre-login id is dropped
+    assert store.load(after) == {"client_id": client_id, "logged_in": True, "username": "alice"}
+
+    assert client.get("/", base_url=BASE).status_code == 200
+    # a copy of the pre-login cookie does not carry the login
+    thief = client.application.test_client()
+    thief.set_cookie("session", client.application.session_interface._signer.sign(before).decode("ascii"),
+                     domain="localhost")
+    assert thief.get("/", base_url=BASE).status_code == 302
+
+
+def test_client_id_survives_logout(portal):
+    client, store = portal
+    _login(client, "good")
+    logged_in = _sid(client, store)
+    client_id = store.load(logged_in)["client_id"]
+
+    assert client.post("/logout", base_url=BASE).status_code == 302
+    after = _sid(client, store)
+    assert after != logged_in
+    assert store.load(logged_in) is None
+    assert store.load(after) == {"client_id": client_id}
+    assert client.get("/", base_url=BASE).status_code == 302
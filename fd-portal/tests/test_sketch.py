@@ -0,0 +1,35 @@
+import multiprocessing
+
+from sketch import UsernameSketch
+
+NOW = 1_700_000_000.0
+
+
+def test_counts_are_case_insensitive():
+    sketch = UsernameSketch(window_sec=900, threshold=3, width=1 << 10)
+    for name in ("alice", "Alice", "ALICE"):
+        sketch.record_failure(name, NOW)
+    assert sketch.count("aLiCe", NOW) == 3
+    assert sketch.count("bob", NOW) == 0
+
+
+def test_forked_worker_draws_its_own_key():
+    sketch = UsernameSketch(window_sec=900, width=1 << 10)
+    for _ in range(5):
+        sketch.record_failure("alice", NOW)
+    cells = sketch._cells("alice")
+
+    def child():
+        return sketch._cells("alice"), sketch.count("alice", NOW), sketch.top()
+
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=lambda: queue.put(child()))
+    proc.start()
+    child_cells, child_count, child_top = queue.get(timeout=10)
+    proc.join(10)
+
+    # as a worker forked from a preloaded master: another key, an empty sketch
+    assert child_cells != cells
+    assert (child_count, child_top) == (0, [])
+    assert sketch.count("alice", NOW) == 5
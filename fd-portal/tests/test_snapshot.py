@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from policy.login_policy import LoginPolicy
+from ratelimit import LoginDefense, MemoryBackend, SharedMemoryBackend, _LogRecord
+from snapshot import DefenseSnapshots
+
+POLICY = LoginPolicy()
+
+
+def _backend(kind, tmp_path, name):
+    if kind == "shared":
+        return SharedMemoryBackend(str(tmp_path / name), max_keys=1000)
+    return MemoryBackend(algorithm=kind)
+
+
+def _defense(kind, tmp_path, name, window_sec=900):
+    return LoginDefense(POLICY, window_sec=window_sec, soft_lockout_sec=300,
+                        backend=_backend(kind, tmp_path, name))
+
+
+@pytest.mark.parametrize("kind", ["log", "buckets", "shared"])
+def test_round_trip_keeps_state(kind, tmp_path):
+    snap = str(tmp_path / "snap")
+    before = _defense(kind, tmp_path, "before")
+    for _ in range(POLICY.block_after_failure):
+        before.record_failure("locked")
+    for _ in range(POLICY.captcha_start_failure):
+        before.record_failure("captcha")
+    before.record_failure("one")
+    assert DefenseSnapshots(before, snap).save() == 3
+
+    after = _defense(kind, tmp_path, "after")
+    assert DefenseSnapshots(after, snap).restore() == 3
+    for key in ("locked", "captcha", "one", "never-seen"):
+        got, want = after.state(key), before.state(key)
+        assert (got.failures, got.captcha_required, got.locked_out) == \
+            (want.failures, want.captcha_required, want.locked_out)
+        assert abs(got.lockout_seconds_left - want.lockout_seconds_left) <= 1
+
+
+def test_corrupt_snapshot_is_skipped(tmp_path):
+    snap = str(tmp_path / "snap")
+    (tmp_path / "snap.garbage").write_bytes(b"not a snapshot")
+    before = _defense("log", tmp_path, "before")
+    before.record_failure("client")
+    snapshots = DefenseSnapshots(before, snap)
+    snapshots.save()
+    with open(snapshots._target(), "rb") as f:
+        data = f.read()
+    (tmp_path / "snap.truncated").write_bytes(data[:-3])
+
+    after = _defense("log", tmp_path, "after")
+    # the intact file restores; the garbage and the truncated copy do not break startup
+    assert DefenseSnapshots(after, snap).restore() >= 1
+    assert after.state("client").failures == 1
+
+
+def test_stale_snapshot_is_rejected(tmp_path):
+    snap = str(tmp_path / "snap")
+    before = _defense("log", tmp_path, "before")
+    before.record_failure("client")
+    DefenseSnapshots(before, snap).save()
+
+    # another DEFENSE_WINDOW_SEC: the counts would mean something else
+    other = _defense("log", tmp_path, "other", window_sec=600)
+    assert DefenseSnapshots(other, snap).restore() == 0
+    # another backend kind
+    buckets = _defense("buckets", tmp_path, "buckets")
+    assert DefenseSnapshots(buckets, snap).restore() == 0
+
+
+def test_expired_records_are_not_restored():
+    now = time.time()
+    old = _LogRecord()
+    old.hits.append(now - 1000)
+    assert MemoryBackend().restore([("client", old)], now, 900) == 0
+
+
+def test_sweep_after_restore_reaches_keys_behind_active_ones():
+    now = time.time()
+    active, old = _LogRecord(), _LogRecord()
+    active.hits.append(now - 10)
+    old.hits.append(now - 800)
+    backend = MemoryBackend(stripes=1)
+    # snapshot order puts the recently failed key first
+    assert backend.restore([("active", active), ("old", old)], now, 900) == 2
+    assert backend.sweep(now + 200, 900) == 1
+    assert backend.stats()["keys"] == 1
@@ -0,0 +1,124 @@
+import time
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+from keystone import KeystoneToken  # noqa: E402
+from tokens import TokenVault  # noqa: E402
+
+
+class FakeKeystone:
+    """Knows the tokens in `live`; counts validate/revoke calls."""
+
+    def __init__(self):
+        self.live = {}  # token -> expires_at
+        self.validated = 0
+        self.revoked = []
+        self.down = False
+
+    def validate_token(self, token):
+        self.validated += 1
+        if self.down:
+            raise ConnectionError("Keystone unreachable")
+        if token not in self.live:
+            return None
+        return KeystoneToken(token=token, expires_at=self.live[token])
+
+    def revoke_token(self, token):
+        if self.down:
+            raise ConnectionError("Keystone unreachable")
+        self.revoked.append(token)
+        self.live.pop(token, None)
+
+
+def _vault(secret=b"secret", **kwargs):
+    keystone = FakeKeystone()
+    return TokenVault(keystone, secret, **kwargs), keystone
+
+
+def _login(vault, keystone, token="gAAAA-keystone-token", ttl=3600):
+    expires_at = time.time() + ttl
+    keystone.live[token] = expires_at
+    return vault.seal(KeystoneToken(token=token, expires_at=expires_at)), expires_at
+
+
+def test_seal_round_trip():
+    vault, keystone = _vault()
+    sealed, _ = _login(vault, keystone)
+    assert "keystone-token" not in sealed
+    assert vault.unseal(sealed) == "gAAAA-keystone-token"
+    # a second worker with the same app secret can open it
+    assert TokenVault(keystone, b"secret").unseal(sealed) == "gAAAA-keystone-token"
+
+
+def test_tampered_or_rotated_key_is_rejected():
+    vault, keystone = _vault()
+    sealed, expires_at = _login(vault, keystone)
+    tampered = sealed[:-6] + ("A" if sealed[-6] != "A" else "B") + sealed[-5:]
+    rotated = TokenVault(keystone, b"another secret")
+    for v, s in ((vault, tampered), (vault, "not a token"), (rotated, sealed)):
+        assert v.unseal(s) is None
+        assert not v.valid(s, expires_at)
+    assert keystone.validated == 0  # nothing undecryptable reaches Keystone
+    assert vault.stats()["rejected"] == 2
+
+
+def test_valid_checks_keystone_once_per_interval():
+    vault, keystone = _vault(revalidate_sec=300)
+    sealed, expires_at = _login(vault, keystone)
+    for _ in range(5):
+        assert vault.valid(sealed, expires_at)
+    assert keystone.validated == 1
+    assert vault.stats()["hits"] == 4
+
+
+def test_not_valid_after_expires_at():
+    vault, keystone = _vault(expiry_skew_sec=60)
+    sealed, expires_at = _login(vault, keystone, ttl=3600)
+    assert vault.valid(sealed, expires_at)
+    # inside the skew before expires_at: no Keystone call, the session ends
+    assert not vault.valid(sealed, time.time() + 30)
+    assert not vault.valid(sealed, time.time() - 1)
+    assert keystone.validated == 1
+    assert vault.stats()["cached"] == 0
+
+
+def test_revalidation_is_capped_by_token_expiry():
+    vault, keystone = _vault(revalidate_sec=3600, expiry_skew_sec=60)
+    sealed, expires_at = _login(vault, keystone, ttl=120)
+    assert vault.valid(sealed, 0.0)  # Keystone did not say when at login
+    assert vault._next_check[sealed] <= expires_at - 60
+
+
+def test_token_revoked_upstream_is_not_valid():
+    vault, keystone = _vault()
+    sealed, _ = _login(vault, keystone)
+    keystone.live.clear()
+    assert not vault.valid(sealed, 0.0)
+
+
+def test_unreachable_keystone_keeps_the_session():
+    vault, keystone = _vault(revalidate_sec=300)
+    sealed, expires_at = _login(vault, keystone)
+    keystone.down = True
+    assert vault.valid(sealed, expires_at)
+    assert vault.stats()["errors"] == 1
+    # retried within 30s, not after a full revalidate_sec
+    assert vault._next_check[sealed] <= time.time() + 30
+
+
+def test_revoke():
+    vault, keystone = _vault()
+    sealed, expires_at = _login(vault, keystone)
+    assert vault.valid(sealed, expires_at)
+    vault.revoke(sealed)
+    assert keystone.revoked == ["gAAAA-keystone-token"]
+    assert vault.stats()["cached"] == 0
+    assert not vault.valid(sealed, expires_at)
+
+    # best effort: an unreachable Keystone or an undecryptable value does not raise
+    other, _ = _login(vault, keystone, token="other")
+    keystone.down = True
+    vault.revoke(other)
+    vault.revoke("not a token")